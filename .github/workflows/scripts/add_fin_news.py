@@ -1,66 +1,124 @@
+import ast
 import pathlib
 import textwrap
 
-ROOT = pathlib.Path(__file__).resolve().parents[2]
+# .github/workflows/scripts/add_fin_news.py -> repository root
+ROOT = pathlib.Path(__file__).resolve().parents[3]
 APP_DIR = ROOT / "fin-news"
 
 def write_file(path: pathlib.Path, content: str):
     path.parent.mkdir(parents=True, exist_ok=True)
     path.write_text(textwrap.dedent(content).lstrip(), encoding="utf-8")
 
+def check_common_imports(app_path: pathlib.Path):
+    """Fail unless every ``from common.x import y`` in the app resolves.
+
+    The app puts its own ``parents[1]`` on ``sys.path``, so that is where
+    ``common`` has to live. Modules are parsed rather than imported, so the
+    check runs without the apps' third-party dependencies installed.
+    """
+    search_root = app_path.resolve().parents[1]
+    missing = []
+    for node in ast.walk(ast.parse(app_path.read_text(encoding="utf-8"))):
+        if not (isinstance(node, ast.ImportFrom) and (node.module or "").startswith("common.")):
+            continue
+        module_path = search_root.joinpath(*node.module.split(".")).with_suffix(".py")
+        if not module_path.is_file():
+            missing.append(node.module)
+            continue
+        defined = set()
+        for stmt in ast.parse(module_path.read_text(encoding="utf-8")).body:
+            if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                defined.add(stmt.name)
+            elif isinstance(stmt, (ast.Assign, ast.AnnAssign)):
+                targets = stmt.targets if isinstance(stmt, ast.Assign) else [stmt.target]
+                defined.update(t.id for t in targets if isinstance(t, ast.Name))
+            elif isinstance(stmt, (ast.Import, ast.ImportFrom)):
+                defined.update((a.asname or a.name).split(".")[0] for a in stmt.names)
+        missing.extend(f"{node.module}.{a.name}" for a in node.names if a.name not in defined)
+    if missing:
+        raise SystemExit(f"{app_path} cannot import {', '.join(missing)} from {search_root}")
+
 def main():
     # app.py
-    app_py = r"""
+    app_py = r'''
     import os
+    import sys
+    from pathlib import Path
+    from typing import List, Literal, Union
+
     import streamlit as st
-    from openai import OpenAI
+    from pydantic import BaseModel
+
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+    from common.llm_gateway import chat_completion, completion_text
+    from common.structured_output import StructuredOutputError, parse_response, response_format, validates_as
+    from common.telemetry import render_diagnostics
 
     PERPLEXITY_MODEL = "sonar-pro"
 
-    def get_client():
+    class NewsItem(BaseModel):
+        headline: str
+        source: str = "N/A"
+        impact: Literal["positive", "negative", "neutral"] = "neutral"
+        commentary: str = ""
+
+    class SectorFeed(BaseModel):
+        """The sector news feed the LLM must return."""
+        sector_summary: List[str]
+        bullish_drivers: List[str]
+        bearish_risks: List[str]
+        key_news_items: List[NewsItem] = []
+        macro_view: str = ""
+        educational_disclaimer: str = ""
+
+    def get_api_key() -> str:
         api_key = os.environ.get("PERPLEXITY_API_KEY")
         if not api_key:
             st.error("PERPLEXITY_API_KEY not set in environment / Streamlit secrets.")
             st.stop()
-        return OpenAI(
-            api_key=api_key,
-            base_url="https://api.perplexity.ai"
-        )
+        return api_key
 
     def build_sector_prompt(sector: str, horizon: str, depth: str) -> str:
         return f"""
-You are an AI financial research assistant for Indian markets.
-
-Task:
-1. Read the latest credible news and macro data for the **{sector}** sector.
-2. Produce a concise **sector news feed + analysis** for an educational fintech app.
-3. Time horizon: {horizon}.
-4. Depth: {depth}.
-
-Output JSON with the following keys ONLY:
-- "sector_summary": 3-5 bullet points summarizing current conditions.
-- "bullish_drivers": 3-5 bullet points.
-- "bearish_risks": 3-5 bullet points.
-- "key_news_items": list of objects:
+    You are an AI financial research assistant for Indian markets.
+
+    Task:
+    1. Read the latest credible news and macro data for the **{sector}** sector.
+    2. Produce a concise **sector news feed + analysis** for an educational fintech app.
+    3. Time horizon: {horizon}.
+    4. Depth: {depth}.
+
+    Output JSON with the following keys ONLY:
+    - "sector_summary": 3-5 bullet points summarizing current conditions.
+    - "bullish_drivers": 3-5 bullet points.
+    - "bearish_risks": 3-5 bullet points.
+    - "key_news_items": list of objects:
     - "headline"
     - "source"
     - "impact" ("positive"/"negative"/"neutral")
     - "commentary" (1-2 lines).
-- "macro_view": 2-3 lines on macro / policy context affecting this sector.
-- "educational_disclaimer": 1-2 line disclaimer that this is NOT investment advice.
-
-Constraints:
-- Focus on Indian context (NSE/BSE, RBI/SEBI, Indian macro) where relevant.
-- No stock-specific recommendations; stay at sector level.
-- Keep all numbers approximate, avoid guaranteed forecasts.
-- Return **valid JSON** only, no markdown or backticks.
-"""
-
-    def call_llm(client: OpenAI, prompt: str) -> dict:
-        response = client.chat.completions.create(
+    - "macro_view": 2-3 lines on macro / policy context affecting this sector.
+    - "educational_disclaimer": 1-2 line disclaimer that this is NOT investment advice.
+
+    Constraints:
+    - Focus on Indian context (NSE/BSE, RBI/SEBI, Indian macro) where relevant.
+    - No stock-specific recommendations; stay at sector level.
+    - Keep all numbers approximate, avoid guaranteed forecasts.
+    - Return **valid JSON** only, no markdown or backticks.
+    """
+
+    def call_llm(api_key: str, prompt: str) -> Union[SectorFeed, str]:
+        """Return the validated feed, or the raw reply if it does not match the schema."""
+        response = chat_completion(
             model=PERPLEXITY_MODEL,
+            app="fin-news",
+            api_key=api_key,
             temperature=0.3,
             max_tokens=800,
+            response_format=response_format(SectorFeed),
+            cacheable=validates_as(SectorFeed),
             messages=[
                 {
                     "role": "system",
@@ -73,47 +131,46 @@ Constraints:
                 {"role": "user", "content": prompt},
             ],
         )
-        import json
-        content = response.choices[0].message.content
+        content = completion_text(response)
         try:
-            return json.loads(content)
-        except json.JSONDecodeError:
-            return {"raw_response": content}
+            return parse_response(content, SectorFeed, "fin-news", PERPLEXITY_MODEL, api_key=api_key)
+        except StructuredOutputError:
+            return content
 
-    def render_news_output(data: dict):
-        if "raw_response" in data:
+    def render_news_output(data: Union[SectorFeed, str]):
+        if isinstance(data, str):
             st.subheader("AI Response (raw)")
-            st.write(data["raw_response"])
+            st.write(data)
             return
 
         st.subheader("Sector summary")
-        for item in data.get("sector_summary", []):
+        for item in data.sector_summary:
             st.markdown(f"- {item}")
 
         col1, col2 = st.columns(2)
         with col1:
             st.subheader("Bullish drivers")
-            for item in data.get("bullish_drivers", []):
+            for item in data.bullish_drivers:
                 st.markdown(f"- {item}")
         with col2:
             st.subheader("Bearish risks")
-            for item in data.get("bearish_risks", []):
+            for item in data.bearish_risks:
                 st.markdown(f"- {item}")
 
         st.subheader("Key news items")
-        for n in data.get("key_news_items", []):
+        for n in data.key_news_items:
             st.markdown(
-                f"**{n.get('headline', '')}**  \\n"
-                f"Source: {n.get('source', 'N/A')}  \\n"
-                f"Impact: {n.get('impact', 'neutral').capitalize()}  \\n"
-                f"{n.get('commentary', '')}"
+                f"**{n.headline}**  \\n"
+                f"Source: {n.source}  \\n"
+                f"Impact: {n.impact.capitalize()}  \\n"
+                f"{n.commentary}"
             )
             st.markdown("---")
 
         st.subheader("Macro view")
-        st.write(data.get("macro_view", ""))
+        st.write(data.macro_view)
 
-        st.caption(data.get("educational_disclaimer", ""))
+        st.caption(data.educational_disclaimer)
 
     def main():
         st.set_page_config(
@@ -163,22 +220,22 @@ Constraints:
             run_btn = st.button("Generate fin-news feed", type="primary")
 
         if run_btn:
-            client = get_client()
+            api_key = get_api_key()
             prompt = build_sector_prompt(sector, horizon, depth)
 
             with st.spinner(f"Fetching LLM-driven news & analysis for {sector}..."):
-                data = call_llm(client, prompt)
+                data = call_llm(api_key, prompt)
 
             render_news_output(data)
 
     if __name__ == "__main__":
         main()
-    """
+        render_diagnostics("fin-news")
+    '''
 
     req_txt = """
     streamlit==1.38.0
-    openai==1.12.0
-    httpx==0.27.0
+    httpx[http2]==0.27.0
     python-dotenv>=1.0.0
     pydantic>=2.0.0
     """
@@ -222,6 +279,7 @@ Constraints:
     write_file(APP_DIR / "app.py", app_py)
     write_file(APP_DIR / "requirements.txt", req_txt)
     write_file(APP_DIR / "README.md", readme_md)
+    check_common_imports(APP_DIR / "app.py")
 
     # Also append to root README if not present
     root_readme = ROOT / "README.md"
@@ -1,18 +1,99 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import yfinance as yf
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from openai import OpenAI
 import json
+import sys
+import threading
 import warnings
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
 warnings.filterwarnings('ignore')
 
-# Initialize Perplexity API client (OpenAI-compatible)
-client = OpenAI(
-    api_key=st.secrets.get("PERPLEXITY_API_KEY", ""),
-    base_url="https://api.perplexity.ai"
-)
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from common.price_store import load_histories
+
+# Prices move during the session; sector and fundamentals barely change
+HISTORY_TTL = 15 * 60
+INFO_TTL = 24 * 3600
+FETCH_TIMEOUT = 10
+
+def calculate_rsi(prices, period=14):
+    """Calculate Relative Strength Index"""
+    delta = prices.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
+    rs = gain / loss
+    rsi = 100 - (100 / (1 + rs))
+    return rsi.iloc[-1] if not rsi.empty else 50
+
+def calculate_momentum(prices, period=20):
+    """Calculate momentum"""
+    return ((prices.iloc[-1] - prices.iloc[-period]) / prices.iloc[-period]) * 100
+
+@st.cache_data(ttl=HISTORY_TTL, max_entries=256, show_spinner=False)
+def get_price_history(symbol):
+    """One year of daily prices; raises when there are none, so a failure is not cached"""
+    histories = load_histories([symbol], period="1y", max_age=HISTORY_TTL)
+    if symbol not in histories.prices:
+        raise ValueError(histories.errors.get(symbol, "no price data"))
+    return histories.prices[symbol]
+
+@st.cache_data(ttl=INFO_TTL, max_entries=256, show_spinner=False)
+def get_stock_info(symbol):
+    """Sector and fundamentals from Yahoo's slow quote-summary endpoint; raises on an empty reply, so it is not cached"""
+    info = yf.Ticker(symbol).info
+    if not info:
+        raise ValueError(f"No quote summary for {symbol}")
+    return info
+
+def fetch_holdings(tickers):
+    """Fetch history and info for every holding at once, each bounded by FETCH_TIMEOUT.
+
+    Returns per-ticker metrics (None when the price history is unavailable or too short) and per-ticker errors.
+    A missing ``info`` only loses the sector.
+    """
+    ctx = get_script_run_ctx()
+    pool = ThreadPoolExecutor(
+        max_workers=2 * len(tickers),
+        thread_name_prefix="holdings",
+        # Lets the cached loaders run on worker threads without losing the session
+        initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx),
+    )
+    histories = {ticker: pool.submit(get_price_history, f"{ticker}.NS") for ticker in tickers}
+    infos = {ticker: pool.submit(get_stock_info, f"{ticker}.NS") for ticker in tickers}
+    wait([*histories.values(), *infos.values()], timeout=FETCH_TIMEOUT)
+    # Stragglers finish in the background and still fill the cache for the next analysis
+    pool.shutdown(wait=False)
+
+    stock_data, errors = {}, {}
+    for ticker in tickers:
+        future = histories[ticker]
+        if not future.done():
+            stock_data[ticker], errors[ticker] = None, f"timed out after {FETCH_TIMEOUT}s"
+            continue
+        if future.exception() is not None:
+            stock_data[ticker], errors[ticker] = None, str(future.exception())
+            continue
+        hist = future.result()
+        info_future = infos[ticker]
+        info = info_future.result() if info_future.done() and info_future.exception() is None else {}
+        # A short history (a recent listing) fails only its own ticker
+        try:
+            stock_data[ticker] = {
+                'current_price': hist['Close'].iloc[-1],
+                'year_high': hist['Close'].max(),
+                'year_low': hist['Close'].min(),
+                'rsi': calculate_rsi(hist['Close']),
+                'momentum': calculate_momentum(hist['Close']),
+                'sector': info.get('sector', 'Unknown')
+            }
+        except Exception as e:
+            stock_data[ticker], errors[ticker] = None, f"could not compute metrics from {len(hist)} bars: {e}"
+    return stock_data, errors
 
 # Streamlit page configuration
 st.set_page_config(
@@ -124,23 +205,9 @@ if st.sidebar.button("🔍 Analyze Portfolio", use_container_width=True):
         with st.spinner("🔄 Fetching market data & analyzing portfolio..."):
             try:
                 # Fetch stock data
-                stock_data = {}
-                for ticker in stocks_list:
-                    try:
-                        data = yf.Ticker(f"{ticker}.NS")
-                        hist = data.history(period="1y")
-                        info = data.info
-                        
-                        stock_data[ticker] = {
-                            'current_price': hist['Close'].iloc[-1],
-                            'year_high': hist['Close'].max(),
-                            'year_low': hist['Close'].min(),
-                            'rsi': calculate_rsi(hist['Close']),
-                            'momentum': calculate_momentum(hist['Close']),
-                            'sector': info.get('sector', 'Unknown')
-                        }
-                    except:
-                        stock_data[ticker] = None
+                stock_data, fetch_errors = fetch_holdings(stocks_list)
+                for ticker, error in fetch_errors.items():
+                    st.warning(f"⚠️ {ticker}: could not fetch market data ({error})")
                 
                 # Display current portfolio
                 st.header("📊 Current Portfolio Snapshot")
@@ -185,16 +252,3 @@ st.markdown("""
 - Past performance ≠ Future results
 - Stock market carries significant risk
 """)
-
-def calculate_rsi(prices, period=14):
-    """Calculate Relative Strength Index"""
-    delta = prices.diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-    rs = gain / loss
-    rsi = 100 - (100 / (1 + rs))
-    return rsi.iloc[-1] if not rsi.empty else 50
-
-def calculate_momentum(prices, period=20):
-    """Calculate momentum"""
-    return ((prices.iloc[-1] - prices.iloc[-period]) / prices.iloc[-period]) * 100
@@ -1,7 +1,27 @@
 import streamlit as st
-import json
-from openai import OpenAI
-import re
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from common.json_stream import StreamingJSONParser, as_number
+from common.llm_gateway import stream_chat_completion
+from common.model_router import AUTO_MODEL
+from common.quantize import quantize_inputs
+from common.structured_output import StructuredOutputError, parse_response, response_format, validates_as
+from common.telemetry import render_diagnostics
+from rules import check_applicant
+from scoring import BnplDecision, build_prompt
+
+def show_metrics(status_slot, tenure_slot, fields, limit_cap=None):
+    """Fill the headline metrics from whichever fields have arrived so far."""
+    if "approved" in fields:
+        max_limit = as_number(fields.get("max_limit")) or 0
+        if limit_cap is not None:
+            max_limit = min(max_limit, limit_cap)
+        status_slot.metric("Status", "✅ APPROVED" if fields["approved"] else "❌ REJECTED", f"₹{max_limit:,.0f}")
+    if "tenure_months" in fields:
+        tenure_slot.metric("Tenure", f"{fields['tenure_months']} months")
 
 st.set_page_config(page_title="BNPL Checker", layout="centered", page_icon="🛒")
 st.title("🛒 BNPL Eligibility Simulator")
@@ -14,70 +34,64 @@ with st.sidebar:
     age = st.slider("Age", 18, 60, 28)
 
 if st.button("🔍 Check Eligibility", type="primary", use_container_width=True):
+    # The hard rules bulk_score.py applies: failing applicants are rejected without an LLM call
+    reject_reasons, limit_cap = check_applicant(age, income, cibil)
+    if reject_reasons:
+        st.columns(2)[0].metric("Status", "❌ REJECTED", "₹0")
+        for reason in reject_reasons:
+            st.error(reason)
+        st.stop()
+    
     api_key = st.secrets.get("PERPLEXITY_API_KEY", None)
     if not api_key:
         st.error("⚠️ PERPLEXITY_API_KEY not found!")
         st.info("Add to Streamlit Secrets: PERPLEXITY_API_KEY = 'pplx-your-key'")
         st.stop()
     
-    client = OpenAI(api_key=api_key, base_url="https://api.perplexity.ai")
+    # Near-identical profiles share one canonical prompt (and cache entry)
+    q = quantize_inputs("bnpl-eligibility-checker", {"income": income, "cibil": cibil, "age": age})
     
     with st.spinner("Analyzing with RBI compliance..."):
-        prompt = f"""You are a BNPL eligibility engine for India following RBI Digital Lending Guidelines.
-
-Analyze this applicant:
-- Age: {age}
-- Annual Income: ₹{income:,.0f}
-- CIBIL Score: {cibil}
-
-Return ONLY valid JSON (no markdown, no code blocks):
-
-{{
-  "approved": boolean,
-  "max_limit": number,
-  "tenure_months": number,
-  "interest_rate": "string",
-  "citations": ["source1", "source2"],
-  "reasoning": "string explanation"
-}}
-
-Rules: CIBIL ≥1500 for approval, income ≥3L for limits >25k, age 21-55 preferred."""
+        prompt = build_prompt(q['age'], q['income'], q['cibil'])
 
         try:
-            response = client.chat.completions.create(
-                model="sonar-pro",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1
-            )
-            
-            raw = response.choices[0].message.content.strip()
-            raw = re.sub(r'``````', '', raw)
-            
-            json_match = re.search(r'\{.*\}', raw, re.DOTALL)
-            if not json_match:
-                st.error("No JSON found in response")
-                st.code(raw)
-                st.stop()
+            col1, col2 = st.columns(2)
+            status_slot = col1.empty()
+            tenure_slot = col2.empty()
             
-            json_str = json_match.group(0)
-            result = json.loads(json_str)
+            # Metrics fill in as soon as their JSON fields finish streaming
+            parser = StreamingJSONParser()
+            for delta in stream_chat_completion(
+                [{"role": "user", "content": prompt}],
+                model=AUTO_MODEL,
+                app="bnpl-eligibility-checker",
+                api_key=api_key,
+                temperature=0.1,
+                response_format=response_format(BnplDecision),
+                cacheable=validates_as(BnplDecision)
+            ):
+                if parser.feed(delta):
+                    show_metrics(status_slot, tenure_slot, parser.fields, limit_cap)
             
-            col1, col2 = st.columns(2)
-            with col1:
-                st.metric("Status", "✅ APPROVED" if result["approved"] else "❌ REJECTED", f"₹{result.get('max_limit', 0):,}")
-            with col2:
-                st.metric("Tenure", f"{result.get('tenure_months', 0)} months")
+            result = parse_response(parser.text, BnplDecision, "bnpl-eligibility-checker", AUTO_MODEL, api_key=api_key)
+            # Low-income applicants keep the LLM decision but with a capped limit, as in bulk scoring
+            if limit_cap is not None:
+                result.max_limit = min(result.max_limit, limit_cap)
             
-            st.json(result)
+            show_metrics(status_slot, tenure_slot, result.model_dump())
+            st.json(result.model_dump())
             
             with st.expander("📚 Citations"):
-                for citation in result.get('citations', []):
+                for citation in result.citations:
                     st.write(f"- {citation}")
                     
-        except json.JSONDecodeError as e:
-            st.error(f"JSON parsing error: {e}")
+        except StructuredOutputError as e:
+            st.error(f"Unexpected response format: {e}")
+            st.code(parser.text)
         except Exception as e:
             st.error(f"API Error: {str(e)}")
 
 st.markdown("---")
 st.caption("**Disclaimer**: Demo only. Consult LazyPay/ZestMoney for real BNPL.")
+
+render_diagnostics("bnpl-eligibility-checker")
@@ -0,0 +1,213 @@
+"""Bulk BNPL eligibility scoring over an applicant file.
+
+Reads a CSV or Parquet file of applicants in chunks and applies the hard
+rules in BNPL_HARD_RULES as vectorized operations. Applicants that fail a
+hard rule are rejected locally. The rest are scored by the LLM through an
+asyncio worker pool with a concurrency cap and a per-request deadline.
+The deadline is enforced inside the gateway call, schema repair included,
+so a late decision frees its worker thread instead of running on behind
+the pool. Scored chunks are appended to the output file as they finish.
+
+    python bulk_score.py applicants.csv decisions.csv
+    python bulk_score.py applicants.parquet decisions.parquet --concurrency 16 --deadline 20
+
+Input columns: age, income (annual, ₹), cibil. Any other columns
+(applicant id, ...) are passed through unchanged.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from common.batch_io import ChunkWriter, iter_chunks
+from common.llm_gateway import PoolConfig
+from common.quantize import quantize_inputs
+from rules import apply_hard_rules
+from scoring import score_applicant
+
+REQUIRED_COLUMNS = ["age", "income", "cibil"]
+
+# Smaller than the fair-practices default: LLM-bound chunks are written only
+# once every decision in them is back, so this sets the output granularity.
+DEFAULT_CHUNKSIZE = 5000
+
+
+def _decisions(chunk, hard, results, keys):
+    """Build the fixed-schema decision columns for one chunk."""
+    n = len(chunk)
+    approved = np.zeros(n, dtype=bool)
+    max_limit = np.zeros(n, dtype=float)
+    tenure_months = np.zeros(n, dtype=float)
+    interest_rate = np.full(n, "", dtype=object)
+    reasoning = np.full(n, "", dtype=object)
+    error = np.full(n, "", dtype=object)
+    source = np.where(hard["hard_reject"].to_numpy(), "rules", "llm").astype(object)
+
+    for i, key in enumerate(keys):
+        if key is None:
+            continue
+        result = results[key]
+        if isinstance(result, str):
+            source[i] = "error"
+            error[i] = result
+            continue
+        approved[i] = result.approved
+        max_limit[i] = result.max_limit
+        tenure_months[i] = result.tenure_months
+        interest_rate[i] = result.interest_rate
+        reasoning[i] = result.reasoning
+
+    # Low-income applicants keep the LLM decision but with a capped limit
+    cap = hard["max_limit_cap"].to_numpy()
+    max_limit = np.where(np.isnan(cap), max_limit, np.minimum(max_limit, cap))
+    max_limit[~approved] = 0.0
+
+    return pd.DataFrame({
+        "approved": approved,
+        "max_limit": max_limit,
+        "tenure_months": tenure_months,
+        "interest_rate": interest_rate,
+        "reasoning": reasoning,
+        "reject_reasons": hard["reject_reasons"].to_numpy(),
+        "decision_source": source,
+        "error": error,
+    }, index=chunk.index)
+
+
+async def _score_keys(keys, api_key, executor, concurrency, deadline, on_done):
+    """Score every canonical applicant in ``keys`` with ``concurrency`` workers."""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    for key in keys:
+        queue.put_nowait(key)
+    results = {}
+
+    async def worker():
+        while True:
+            try:
+                key = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            q = dict(key)
+            # A validated BnplDecision, or the error message. score_applicant
+            # returns by the deadline on its own, so each worker holds one thread.
+            try:
+                results[key] = await loop.run_in_executor(
+                    executor, score_applicant, api_key, q["age"], q["income"], q["cibil"], deadline
+                )
+            except TimeoutError:
+                results[key] = f"No decision within {deadline}s"
+            except Exception as e:
+                results[key] = str(e)
+            on_done(not isinstance(results[key], str))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results
+
+
+async def _run(input_path, output_path, chunksize, concurrency, deadline, api_key, progress):
+    stats = {"rows": 0, "hard_rejects": 0, "llm_rows": 0, "llm_calls": 0, "llm_errors": 0, "approved": 0}
+    # Decisions for canonical applicants already scored in earlier chunks
+    memo = {}
+    started = time.perf_counter()
+
+    def on_done(ok):
+        stats["llm_calls"] += 1
+        if not ok:
+            stats["llm_errors"] += 1
+        if stats["llm_calls"] % 100 == 0:
+            elapsed = time.perf_counter() - started
+            progress(f"  {stats['llm_calls']:,} LLM decisions ({stats['llm_errors']:,} errors, {stats['llm_calls'] / elapsed:,.1f}/s)")
+
+    # Requests beyond the gateway's connections would only spend their deadline queueing for one
+    max_connections = PoolConfig.from_env().max_connections
+    if concurrency > max_connections:
+        progress(f"Concurrency {concurrency} exceeds LLM_POOL_SIZE; using {max_connections}")
+        concurrency = max_connections
+
+    writer = ChunkWriter(output_path)
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bnpl-score")
+    try:
+        for chunk in iter_chunks(input_path, chunksize):
+            missing = [col for col in REQUIRED_COLUMNS if col not in chunk.columns]
+            if missing:
+                raise ValueError(f"Input is missing required columns: {', '.join(missing)}")
+
+            hard = apply_hard_rules(chunk)
+            eligible = ~hard["hard_reject"].to_numpy()
+
+            # Applicants with the same canonical inputs share one LLM call
+            keys = [None] * len(chunk)
+            pending = set()
+            records = chunk[REQUIRED_COLUMNS].to_dict("records")
+            for i in np.flatnonzero(eligible):
+                key = tuple(sorted(quantize_inputs("bnpl-eligibility-checker", records[i]).items()))
+                keys[i] = key
+                if key not in memo:
+                    pending.add(key)
+            if pending:
+                memo.update(await _score_keys(pending, api_key, executor, concurrency, deadline, on_done))
+
+            decisions = _decisions(chunk, hard, memo, keys)
+            writer.write(pd.concat([chunk, decisions], axis=1))
+
+            stats["rows"] += len(chunk)
+            stats["hard_rejects"] += int((~eligible).sum())
+            stats["llm_rows"] += int(eligible.sum())
+            stats["approved"] += int(decisions["approved"].sum())
+            elapsed = time.perf_counter() - started
+            progress(
+                f"Scored {stats['rows']:,} rows ({stats['hard_rejects']:,} hard rejects, "
+                f"{stats['llm_calls']:,} LLM calls, {stats['llm_errors']:,} errors) "
+                f"at {stats['rows'] / elapsed:,.0f} rows/s"
+            )
+    finally:
+        writer.close()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+def run_bulk(input_path, output_path, chunksize=DEFAULT_CHUNKSIZE, concurrency=8, deadline=30.0,
+             api_key=None, progress=print):
+    """Score every applicant in ``input_path`` into ``output_path`` and return run statistics."""
+    return asyncio.run(_run(input_path, output_path, chunksize, concurrency, deadline, api_key, progress))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a file of applicants for BNPL eligibility.")
+    parser.add_argument("input", help="CSV or Parquet file of applicants")
+    parser.add_argument("output", help="CSV or Parquet file for the decisions")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="rows per chunk")
+    parser.add_argument("--concurrency", type=int, default=8, help="maximum concurrent LLM requests")
+    parser.add_argument("--deadline", type=float, default=30.0, help="seconds allowed per LLM decision")
+    args = parser.parse_args(argv)
+
+    api_key = os.getenv("PERPLEXITY_API_KEY", "")
+    if not api_key:
+        parser.error("PERPLEXITY_API_KEY must be set in the environment")
+
+    stats = run_bulk(
+        args.input, args.output,
+        chunksize=args.chunksize,
+        concurrency=args.concurrency,
+        deadline=args.deadline,
+        api_key=api_key,
+    )
+    print(
+        f"Done: {stats['rows']:,} rows in {stats['seconds']:,.1f}s, {stats['approved']:,} approved, "
+        f"{stats['hard_rejects']:,} hard rejects, {stats['llm_calls']:,} LLM calls ({stats['llm_errors']:,} failed)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Hard BNPL eligibility rules, evaluated locally.
+
+Applicants that fail a hard rule are rejected without an LLM call; the rest
+are scored by the LLM, with ``max_limit`` capped where the income rule says
+so. ``apply_hard_rules`` evaluates the whole table over a DataFrame of
+applicants as vectorized NumPy operations, for bulk scoring;
+``check_applicant`` runs the same code for the single applicant in the app.
+"""
+import numpy as np
+import pandas as pd
+
+# Rules that reject outright. Missing values fail their rule.
+BNPL_HARD_RULES = {
+    "age_band": {
+        "input": "age",
+        "min": 21,
+        "max": 55,
+        "reason": "Age outside the 21-55 band",
+    },
+    "cibil_floor": {
+        "input": "cibil",
+        "min": 650,
+        "max": 900,
+        "reason": "CIBIL score below 650",
+    },
+    # Without an income the low-income limit cap cannot be applied
+    "income_reported": {
+        "input": "income",
+        "min": 0,
+        "max": np.inf,
+        "reason": "Income missing",
+    },
+}
+
+# Applicants below the income threshold can still be approved, but their
+# limit is capped.
+INCOME_LIMIT_THRESHOLD = 300000
+LOW_INCOME_MAX_LIMIT = 25000
+
+
+def _reject_labels():
+    """Lookup of ';'-joined rule names for every reject bitmask."""
+    names = list(BNPL_HARD_RULES)
+    return np.array([
+        ";".join(name for bit, name in enumerate(names) if mask >> bit & 1)
+        for mask in range(1 << len(names))
+    ], dtype=object)
+
+
+def apply_hard_rules(df):
+    """Evaluate BNPL_HARD_RULES over a DataFrame of applicants.
+
+    ``df`` needs ``age``, ``income`` and ``cibil`` columns. Returns
+    ``hard_reject``, ``reject_reasons`` (';'-joined rule names) and
+    ``max_limit_cap`` (NaN where the limit is uncapped).
+    """
+    mask = np.zeros(len(df), dtype=np.int64)
+    for bit, rule in enumerate(BNPL_HARD_RULES.values()):
+        values = df[rule["input"]].to_numpy(dtype=float)
+        passed = (values >= rule["min"]) & (values <= rule["max"])
+        mask |= (~passed).astype(np.int64) << bit
+
+    income = df["income"].to_numpy(dtype=float)
+    return pd.DataFrame({
+        "hard_reject": mask != 0,
+        "reject_reasons": _reject_labels()[mask],
+        "max_limit_cap": np.where(income < INCOME_LIMIT_THRESHOLD, float(LOW_INCOME_MAX_LIMIT), np.nan),
+    }, index=df.index)
+
+
+def check_applicant(age, income, cibil):
+    """``apply_hard_rules`` for one applicant.
+
+    Returns ``(reasons, max_limit_cap)``: the ``reason`` of every failed
+    rule (empty if none fail) and the limit cap, or None when uncapped.
+    """
+    row = apply_hard_rules(pd.DataFrame({"age": [age], "income": [income], "cibil": [cibil]})).iloc[0]
+    reasons = [BNPL_HARD_RULES[name]["reason"] for name in row["reject_reasons"].split(";") if name]
+    cap = row["max_limit_cap"]
+    return reasons, None if np.isnan(cap) else float(cap)
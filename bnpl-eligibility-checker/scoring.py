@@ -0,0 +1,57 @@
+"""BNPL eligibility prompt, response schema and single-applicant LLM scoring."""
+import sys
+from pathlib import Path
+from typing import List
+
+from pydantic import BaseModel
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from common.model_router import AUTO_MODEL
+from common.structured_output import structured_completion
+
+
+class BnplDecision(BaseModel):
+    """The eligibility decision the LLM must return."""
+
+    approved: bool
+    max_limit: float
+    tenure_months: int
+    interest_rate: str
+    citations: List[str] = []
+    reasoning: str
+
+
+def build_prompt(age, income, cibil):
+    return f"""You are a BNPL eligibility engine for India following RBI Digital Lending Guidelines.
+
+Analyze this applicant:
+- Age: {age}
+- Annual Income: ₹{income:,.0f}
+- CIBIL Score: {cibil}
+
+Return ONLY valid JSON (no markdown, no code blocks):
+
+{{
+  "approved": boolean,
+  "max_limit": number,
+  "tenure_months": number,
+  "interest_rate": "string",
+  "citations": ["source1", "source2"],
+  "reasoning": "string explanation"
+}}
+
+Rules: CIBIL ≥1500 for approval, income ≥3L for limits >25k, age 21-55 preferred."""
+
+
+def score_applicant(api_key, age, income, cibil, timeout=None):
+    """Return the validated LLM eligibility decision for one applicant."""
+    return structured_completion(
+        [{"role": "user", "content": build_prompt(age, income, cibil)}],
+        model=AUTO_MODEL,
+        response_model=BnplDecision,
+        app="bnpl-eligibility-checker",
+        api_key=api_key,
+        temperature=0.1,
+        timeout=timeout
+    )
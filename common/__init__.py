@@ -0,0 +1 @@
+"""Shared infrastructure used by the Streamlit apps in this repository."""
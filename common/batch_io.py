@@ -0,0 +1,72 @@
+"""Chunked CSV/Parquet readers and writers for the batch tools.
+
+Files ending in ``.parquet`` or ``.pq`` go through pyarrow (optional
+dependency); everything else is treated as CSV.
+"""
+from pathlib import Path
+from typing import Iterator, Optional
+
+import pandas as pd
+
+DEFAULT_CHUNKSIZE = 200_000
+
+
+def is_parquet(path) -> bool:
+    return Path(path).suffix.lower() in (".parquet", ".pq")
+
+
+def iter_chunks(path, chunksize: int = DEFAULT_CHUNKSIZE) -> Iterator[pd.DataFrame]:
+    """Yield DataFrames of at most ``chunksize`` rows with a global row index."""
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+
+        offset = 0
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            df = batch.to_pandas()
+            df.index = pd.RangeIndex(offset, offset + len(df))
+            offset += len(df)
+            yield df
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+
+class ChunkWriter:
+    """Append DataFrame chunks to a CSV or Parquet file.
+
+    Every chunk must have the same columns and dtypes; Parquet fixes the
+    schema from the first chunk written.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.parquet = is_parquet(path)
+        self.rows = 0
+        self._writer = None
+        self._wrote_header = False
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self._writer is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            else:
+                table = pa.Table.from_pandas(df, schema=self._writer.schema, preserve_index=False)
+            self._writer.write_table(table)
+        else:
+            df.to_csv(self.path, mode="a" if self._wrote_header else "w", header=not self._wrote_header, index=False)
+            self._wrote_header = True
+        self.rows += len(df)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self) -> "ChunkWriter":
+        return self
+
+    def __exit__(self, *exc: Optional[BaseException]) -> None:
+        self.close()
@@ -0,0 +1,119 @@
+"""Per-app deadline budgets and hedged requests for LLM tail latency.
+
+Every non-streaming call gets a wall-clock budget from
+:data:`DEADLINE_BUDGETS`. For the apps in :data:`HEDGED_APPS`, a call that
+is still running once the app's observed p90 latency has passed gets a
+second, identical request; whichever finishes first wins. At most
+``LLM_HEDGE_MAX_RATE`` of requests are hedged, so stragglers are cut
+without doubling spend.
+
+- ``LLM_DEFAULT_DEADLINE``: budget for apps not listed (default 60 seconds)
+- ``LLM_HEDGE``: set to ``0`` to disable hedging (default on)
+- ``LLM_HEDGE_MAX_RATE``: maximum fraction of requests hedged (default 0.1)
+- ``LLM_HEDGE_MIN_DELAY``: never hedge sooner than this many seconds (default 1)
+"""
+import os
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+# Wall-clock seconds a non-streaming call may take, per app. The streaming
+# apps bound their wait with a first-token timeout instead.
+DEADLINE_BUDGETS: Dict[str, float] = {
+    "insurance-premium-calculator": 25,
+    "fair-practices-auditor": 30,
+    "dividend-income-screener": 30,
+    "sector-rotation-screener": 30,
+    "fin-news": 45,
+}
+
+# Interactive apps where a user is waiting on a single non-streaming call
+HEDGED_APPS = frozenset({
+    "insurance-premium-calculator",
+    "dividend-income-screener",
+    "sector-rotation-screener",
+})
+
+# Latencies needed before the p90 is trusted enough to hedge on
+MIN_SAMPLES = 20
+WINDOW = 200
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when an LLM call does not finish within its deadline budget."""
+
+
+def deadline_for(app: Optional[str]) -> float:
+    return float(DEADLINE_BUDGETS.get(app or "", os.getenv("LLM_DEFAULT_DEADLINE", "60")))
+
+
+class HedgePolicy:
+    """Tracks recent latencies per (app, model) and decides when to hedge."""
+
+    def __init__(self, max_rate: float, min_delay: float):
+        self.max_rate = max_rate
+        self.min_delay = min_delay
+        self._lock = threading.Lock()
+        self._latencies: Dict[Tuple[str, str], Deque[float]] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def _app_counters(self, app: Optional[str]) -> Dict[str, int]:
+        return self._counters.setdefault(app or "default", {"requests": 0, "hedged": 0, "hedge_wins": 0, "deadline_exceeded": 0})
+
+    def record(self, app: Optional[str], model: str, seconds: float) -> None:
+        with self._lock:
+            self._latencies.setdefault((app or "default", model), deque(maxlen=WINDOW)).append(seconds)
+
+    def quantile(self, app: Optional[str], model: str, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._latencies.get((app or "default", model), ()))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def hedge_delay(self, app: Optional[str], model: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None if this app/model is not hedged yet."""
+        if app not in HEDGED_APPS:
+            return None
+        p90 = self.quantile(app, model, 0.9)
+        return None if p90 is None else max(self.min_delay, p90)
+
+    def start(self, app: Optional[str]) -> None:
+        with self._lock:
+            self._app_counters(app)["requests"] += 1
+
+    def try_hedge(self, app: Optional[str]) -> bool:
+        """Claim a hedge if the app is still under the hedge-rate cap."""
+        with self._lock:
+            counters = self._app_counters(app)
+            if counters["hedged"] + 1 > self.max_rate * counters["requests"]:
+                return False
+            counters["hedged"] += 1
+            return True
+
+    def count(self, app: Optional[str], name: str) -> None:
+        with self._lock:
+            self._app_counters(app)[name] += 1
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return request/hedge/deadline counters per app for this process."""
+        with self._lock:
+            return {app: dict(counters) for app, counters in self._counters.items()}
+
+
+_policy: Optional[HedgePolicy] = None
+_policy_lock = threading.Lock()
+
+
+def get_hedge_policy() -> HedgePolicy:
+    """Return the process-wide hedge policy. Latencies are always tracked; hedging itself honours LLM_HEDGE."""
+    global _policy
+    if _policy is None:
+        with _policy_lock:
+            if _policy is None:
+                enabled = os.getenv("LLM_HEDGE", "1") not in ("0", "false", "False")
+                _policy = HedgePolicy(
+                    float(os.getenv("LLM_HEDGE_MAX_RATE", "0.1")) if enabled else 0.0,
+                    float(os.getenv("LLM_HEDGE_MIN_DELAY", "1")),
+                )
+    return _policy
@@ -0,0 +1,133 @@
+"""Local repair of malformed JSON in LLM replies.
+
+Models sometimes return JSON that is almost right. :func:`repair_json`
+fixes the common defects without another round trip:
+
+- code fences and prose around the object
+- single-quoted strings and Python literals (``True``, ``None``)
+- trailing commas before ``}`` or ``]``
+- output cut off mid-object: the last incomplete member is dropped and the
+  open brackets are closed
+- template placeholders echoed back, such as ``"number 0-100"``: the member
+  is dropped, so a schema default applies or validation names the field
+"""
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.S)
+
+# Values the apps' prompt sketches use in place of a real value. Only these
+# exact tokens are dropped, so a real answer such as "string theory is cool"
+# survives; add new tokens here when a prompt sketch introduces one.
+_PLACEHOLDERS = frozenset({
+    "string", "string explanation", "string percentage", "string summary",
+    "number", "number 0-100", "integer", "boolean", "float",
+    "...", "X%",
+})
+
+_WORD = re.compile(r"\w+")
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def _extract(text: str) -> str:
+    fenced = _FENCE.search(text)
+    if fenced and "{" in fenced.group(1):
+        text = fenced.group(1)
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    return text[min(starts):] if starts else text
+
+
+def _string_end(text: str, start: int) -> Optional[int]:
+    """Index of the quote closing the string opened at ``start``, or None if it never closes."""
+    quote = text[start]
+    i = start + 1
+    while i < len(text):
+        if text[i] == "\\":
+            i += 2
+            continue
+        if text[i] == quote:
+            return i
+        i += 1
+    return None
+
+
+def _rewrite(text: str) -> str:
+    """Normalize quotes, literals and trailing commas; close brackets left open by truncation."""
+    out: List[str] = []
+    size = 0
+    stack: List[str] = []
+    # Where the text can be cut so that everything before it is complete
+    safe: Tuple[int, Tuple[str, ...]] = (0, ())
+    complete = False
+    i, n = 0, len(text)
+
+    def emit(piece: str) -> None:
+        nonlocal size
+        out.append(piece)
+        size += len(piece)
+
+    while i < n:
+        ch = text[i]
+        if ch in "\"'":
+            end = _string_end(text, i)
+            if end is None:
+                break
+            body = text[i + 1:end]
+            if ch == "'":
+                body = body.replace("\\'", "'").replace('"', '\\"')
+            emit('"' + body + '"')
+            i = end + 1
+            continue
+        if ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            emit(ch)
+            safe = (size, tuple(stack))
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            emit(ch)
+            safe = (size, tuple(stack))
+            if not stack:
+                complete = True
+                break
+        elif ch == ",":
+            safe = (size, tuple(stack))
+            j = i + 1
+            while j < n and text[j].isspace():
+                j += 1
+            if j < n and text[j] not in "}]":
+                emit(ch)
+        elif ch.isalpha():
+            word = _WORD.match(text, i).group(0)
+            emit(_LITERALS.get(word, word))
+            i += len(word)
+            continue
+        else:
+            emit(ch)
+        i += 1
+
+    repaired = "".join(out)
+    if complete or not stack:
+        return repaired
+    cut, open_brackets = safe
+    return repaired[:cut].rstrip().rstrip(",") + "".join(reversed(open_brackets))
+
+
+def _prune_placeholders(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {
+            key: _prune_placeholders(item) for key, item in value.items()
+            if not (isinstance(item, str) and item.strip() in _PLACEHOLDERS)
+        }
+    if isinstance(value, list):
+        return [_prune_placeholders(item) for item in value]
+    return value
+
+
+def repair_json(text: str) -> Any:
+    """Parse ``text`` after fixing common LLM JSON defects.
+
+    Raises :class:`ValueError` (``json.JSONDecodeError``) if it is still not valid JSON.
+    """
+    return _prune_placeholders(json.loads(_rewrite(_extract(text))))
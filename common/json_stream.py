@@ -0,0 +1,97 @@
+"""Incremental JSON extraction from streamed LLM output.
+
+The apps ask for a single JSON object but models often wrap it in prose or
+code fences. :class:`StreamingJSONParser` is fed content deltas as they
+stream in, skips anything before the first ``{``, and emits each top-level
+``key: value`` pair as soon as its value is complete, so the UI can fill in
+metrics while the rest of the object is still being generated.
+
+Streamed fields have not been validated against the app's schema yet, so a
+number may still arrive as a string. Use :func:`as_number` before
+formatting one.
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def as_number(value: Any) -> Optional[float]:
+    """``value`` as a float, or None if it is missing or not numeric."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class StreamingJSONParser:
+    """Emit top-level members of a streamed JSON object as they complete."""
+
+    def __init__(self) -> None:
+        self.text = ""
+        self.fields: Dict[str, Any] = {}
+        self.complete = False
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._end: Optional[int] = None
+        self._member_start = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consume a chunk of text and return the members it completed."""
+        self.text += chunk
+        emitted: List[Tuple[str, Any]] = []
+        text = self.text
+        while self._pos < len(text) and not self.complete:
+            ch = text[self._pos]
+            if self._start is None:
+                if ch == "{":
+                    self._start = self._pos
+                    self._member_start = self._pos + 1
+                    self._depth = 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    emitted.extend(self._emit_member(self._pos))
+                    self._end = self._pos + 1
+                    self.complete = True
+            elif ch == "," and self._depth == 1:
+                emitted.extend(self._emit_member(self._pos))
+                self._member_start = self._pos + 1
+            self._pos += 1
+        return emitted
+
+    def _emit_member(self, end: int) -> List[Tuple[str, Any]]:
+        member = self.text[self._member_start:end].strip()
+        if not member:
+            return []
+        try:
+            parsed = json.loads("{" + member + "}")
+        except json.JSONDecodeError:
+            # Malformed member; result() reports the error for the whole object.
+            return []
+        self.fields.update(parsed)
+        return list(parsed.items())
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """Return the complete object, or None if the stream contained no JSON.
+
+        Raises :class:`json.JSONDecodeError` if the object is malformed or
+        was cut off before its closing brace.
+        """
+        if self._start is None:
+            return None
+        if not self.complete:
+            raise json.JSONDecodeError("Unterminated JSON object", self.text, len(self.text))
+        return json.loads(self.text[self._start:self._end])
@@ -0,0 +1,195 @@
+"""Content-addressed, disk-backed cache for LLM responses.
+
+Responses are stored in a local SQLite database keyed on a hash of
+``(model, messages, temperature, response_format)``, so a prompt that is
+re-sent verbatim is served locally across Streamlit sessions and process
+restarts. Entries expire after a per-app TTL and the store is capped in
+bytes, evicting least-recently-used entries first.
+
+- ``LLM_CACHE_PATH``: database file (default ``~/.cache/llm-powered-apps/llm_cache.sqlite3``)
+- ``LLM_CACHE_MAX_BYTES``: size cap for stored responses (default 64 MiB)
+- ``LLM_CACHE_STALE_SECONDS``: how long expired entries are kept as a
+  last-resort fallback when a live call misses its deadline (default 1 day)
+- ``LLM_CACHE_DISABLE``: set to ``1`` to bypass the cache entirely
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+DEFAULT_CACHE_PATH = Path.home() / ".cache" / "llm-powered-apps" / "llm_cache.sqlite3"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_STALE_GRACE = 24 * 3600
+
+# Seconds a cached response stays valid, per app. Apps that are not listed
+# (news feeds, market commentary) are never cached.
+CACHE_TTLS: Dict[str, int] = {
+    "fair-practices-auditor": 7 * 24 * 3600,
+    "bnpl-eligibility-checker": 24 * 3600,
+    "insurance-premium-calculator": 24 * 3600,
+    "loan-against-asset-checker": 3600,
+}
+
+_KEY_FIELDS = ("model", "messages", "temperature", "response_format")
+
+
+def cache_key(payload: Dict[str, Any]) -> str:
+    """Hash the fields of a chat payload that determine its response."""
+    material = {field: payload.get(field) for field in _KEY_FIELDS}
+    encoded = json.dumps(material, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def ttl_for(app: Optional[str]) -> int:
+    return CACHE_TTLS.get(app or "", 0)
+
+
+class LLMCache:
+    """SQLite-backed response store with TTL expiry and LRU eviction."""
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES,
+                 stale_grace: float = DEFAULT_STALE_GRACE):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.stale_grace = stale_grace
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                app TEXT,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                expires REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access);
+            CREATE TABLE IF NOT EXISTS counters (
+                app TEXT NOT NULL,
+                name TEXT NOT NULL,
+                value INTEGER NOT NULL,
+                PRIMARY KEY (app, name)
+            );
+            """
+        )
+        self._conn.commit()
+
+    def _bump(self, app: Optional[str], name: str) -> None:
+        self._conn.execute(
+            "INSERT INTO counters (app, name, value) VALUES (?, ?, 1) "
+            "ON CONFLICT(app, name) DO UPDATE SET value = value + 1",
+            (app or "default", name),
+        )
+
+    def get(self, key: str, app: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Return the cached response for ``key``, or None on a miss or expiry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                if row is not None and row[1] + self.stale_grace <= now:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._bump(app, "misses")
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._bump(app, "hits")
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def get_stale(self, key: str, app: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Return the entry for ``key`` even if expired (within the stale grace), else None."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM responses WHERE key = ? AND expires + ? > ?", (key, self.stale_grace, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self._bump(app, "stale_hits")
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict[str, Any], ttl: float, app: Optional[str] = None) -> None:
+        encoded = json.dumps(value, ensure_ascii=False)
+        size = len(encoded.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, app, value, size, created, expires, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, app, encoded, size, now, now + ttl, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM responses WHERE expires + ? <= ?", (self.stale_grace, now))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        if evicted:
+            self._conn.execute(
+                "INSERT INTO counters (app, name, value) VALUES ('default', 'evictions', ?) "
+                "ON CONFLICT(app, name) DO UPDATE SET value = value + excluded.value",
+                (evicted,),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return hit/miss counters per app, plus entry count and stored bytes."""
+        with self._lock:
+            rows = self._conn.execute("SELECT app, name, value FROM counters").fetchall()
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        stats: Dict[str, Dict[str, int]] = {}
+        for app, name, value in rows:
+            stats.setdefault(app, {})[name] = value
+        stats.setdefault("default", {}).update({"entries": entries, "bytes": total})
+        return stats
+
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[LLMCache]:
+    """Return the process-wide cache, or None when caching is disabled."""
+    global _cache
+    if os.getenv("LLM_CACHE_DISABLE", "0") in ("1", "true", "True"):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache(
+                    Path(os.getenv("LLM_CACHE_PATH", str(DEFAULT_CACHE_PATH))),
+                    int(os.getenv("LLM_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+                    float(os.getenv("LLM_CACHE_STALE_SECONDS", DEFAULT_STALE_GRACE)),
+                )
+    return _cache
@@ -0,0 +1,548 @@
+"""Pooled gateway for OpenAI-compatible chat completions (Perplexity sonar).
+
+Every app sends its LLM requests through :func:`chat_completion`. The
+gateway keeps a single keep-alive HTTP/2 connection pool per process, so a
+button press reuses an open TLS connection instead of paying DNS + TLS
+handshake again.
+
+Pool size and timeouts are configurable through environment variables:
+
+- ``LLM_POOL_SIZE``: maximum open connections (default 20)
+- ``LLM_POOL_KEEPALIVE``: maximum idle keep-alive connections (default 10)
+- ``LLM_KEEPALIVE_EXPIRY``: seconds an idle connection is kept (default 120)
+- ``LLM_CONNECT_TIMEOUT``: connect timeout in seconds (default 5)
+- ``LLM_READ_TIMEOUT``: read timeout in seconds (default 60)
+- ``LLM_HTTP2``: set to ``0`` to force HTTP/1.1 (default on)
+- ``LLM_BASE_URL``: OpenAI-compatible endpoint (default ``https://api.perplexity.ai``);
+  point it at :mod:`common.mock_llm_server` for offline load tests
+
+Identical requests that are in flight at the same time share one upstream
+call (see :mod:`common.single_flight`). Every upstream request first waits
+for capacity in the shared rate limiter (see :mod:`common.rate_limit`).
+Requests that get a 429 or 5xx are retried with exponential backoff:
+
+- ``LLM_MAX_RETRIES``: retries after a 429/5xx (default 2)
+
+Each :func:`chat_completion` call runs under a per-app deadline budget and
+may be hedged (see :mod:`common.deadlines`). If the deadline passes, a
+recently expired cached response is returned instead when one exists.
+
+:func:`stream_chat_completion` uses the same pool with ``stream=True`` and
+yields content deltas as they arrive.
+
+Both record latency, tokens and the call's outcome in :mod:`common.telemetry`.
+Passing ``model=AUTO_MODEL`` lets :mod:`common.model_router` pick sonar or
+sonar-pro per request.
+"""
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import httpx
+
+from common import llm_cache
+from common.deadlines import DeadlineExceeded, deadline_for, get_hedge_policy
+from common.model_router import AUTO_MODEL, Route, get_router
+from common.rate_limit import OVERLOAD_STATUSES, RateLimitTimeout, estimate_tokens, get_rate_limiter
+from common.single_flight import get_single_flight
+from common.telemetry import get_telemetry
+
+PPLX_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.perplexity.ai").rstrip("/")
+
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 10.0
+
+
+class FirstTokenTimeout(TimeoutError):
+    """Raised when a streamed completion produces no content in time."""
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    """Connection pool and timeout settings for the shared client."""
+
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 120.0
+    connect_timeout: float = 5.0
+    read_timeout: float = 60.0
+    http2: bool = True
+
+    @classmethod
+    def from_env(cls) -> "PoolConfig":
+        return cls(
+            max_connections=int(os.getenv("LLM_POOL_SIZE", cls.max_connections)),
+            max_keepalive_connections=int(os.getenv("LLM_POOL_KEEPALIVE", cls.max_keepalive_connections)),
+            keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", cls.keepalive_expiry)),
+            connect_timeout=float(os.getenv("LLM_CONNECT_TIMEOUT", cls.connect_timeout)),
+            read_timeout=float(os.getenv("LLM_READ_TIMEOUT", cls.read_timeout)),
+            http2=os.getenv("LLM_HTTP2", "1") not in ("0", "false", "False"),
+        )
+
+
+_client: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+_request_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_http_client(config: Optional[PoolConfig] = None) -> httpx.Client:
+    """Return the process-wide pooled client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                config = config or PoolConfig.from_env()
+                _client = httpx.Client(
+                    http2=config.http2 and _http2_available(),
+                    limits=httpx.Limits(
+                        max_connections=config.max_connections,
+                        max_keepalive_connections=config.max_keepalive_connections,
+                        keepalive_expiry=config.keepalive_expiry,
+                    ),
+                    timeout=httpx.Timeout(config.read_timeout, connect=config.connect_timeout),
+                )
+    return _client
+
+
+def _get_request_pool() -> ThreadPoolExecutor:
+    """Worker threads that run deadline-bounded (and hedged) requests."""
+    global _request_pool
+    if _request_pool is None:
+        with _client_lock:
+            if _request_pool is None:
+                _request_pool = ThreadPoolExecutor(
+                    max_workers=2 * PoolConfig.from_env().max_connections, thread_name_prefix="llm-request"
+                )
+    return _request_pool
+
+
+def close_http_client() -> None:
+    """Close the pooled client; the next request opens a fresh pool."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def resolve_api_key(api_key: Optional[str] = None) -> str:
+    return api_key or os.getenv("PERPLEXITY_API_KEY", "")
+
+
+def build_payload(
+    messages: List[Dict[str, str]],
+    model: str,
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    payload: Dict[str, Any] = {"model": model, "messages": messages}
+    if temperature is not None:
+        payload["temperature"] = temperature
+    if max_tokens is not None:
+        payload["max_tokens"] = max_tokens
+    if response_format is not None:
+        payload["response_format"] = response_format
+    return payload
+
+
+def _headers(api_key: Optional[str]) -> Dict[str, str]:
+    key = resolve_api_key(api_key)
+    if not key:
+        raise RuntimeError("PERPLEXITY_API_KEY not set. Please add it in your environment or Streamlit secrets.")
+    return {"Authorization": f"Bearer {key}", "Content-Type": "application/json"}
+
+
+def _backoff_delay(attempt: int, retry_after: Optional[str]) -> float:
+    """Seconds to wait before retry ``attempt``: Retry-After if given, else full-jitter exponential."""
+    if retry_after:
+        try:
+            return min(BACKOFF_MAX, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def _post(payload: Dict[str, Any], api_key: Optional[str], timeout: Optional[float]) -> Dict[str, Any]:
+    headers = _headers(api_key)
+    limiter = get_rate_limiter()
+    tokens = estimate_tokens(payload)
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        with limiter.slot(tokens) if limiter is not None else nullcontext() as slot:
+            resp = get_http_client().post(
+                f"{PPLX_BASE_URL}/chat/completions",
+                headers=headers,
+                json=payload,
+                timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+            )
+            if slot is not None:
+                slot.observe(resp.status_code)
+
+        if resp.status_code in OVERLOAD_STATUSES and attempt < MAX_RETRIES:
+            delay = _backoff_delay(attempt, resp.headers.get("retry-after"))
+            # Don't sleep past the caller's own deadline just to retry
+            if timeout is None or time.monotonic() - started + delay < timeout:
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+        resp.raise_for_status()
+        data = resp.json()
+        if slot is not None:
+            slot.record_usage((data.get("usage") or {}).get("total_tokens"))
+        return data
+
+
+def _timed_post(payload: Dict[str, Any], api_key: Optional[str], timeout: float, app: Optional[str]) -> Dict[str, Any]:
+    started = time.monotonic()
+    response = _post(payload, api_key, timeout)
+    get_hedge_policy().record(app, payload["model"], time.monotonic() - started)
+    return response
+
+
+def _post_with_deadline(
+    payload: Dict[str, Any], api_key: Optional[str], app: Optional[str], deadline: float
+) -> Dict[str, Any]:
+    """Run the request on a worker thread, hedging it once past the app's p90.
+
+    Raises :class:`DeadlineExceeded` if no attempt succeeds within
+    ``deadline`` seconds. A losing attempt is left to finish in the
+    background; its result is discarded.
+    """
+    policy = get_hedge_policy()
+    policy.start(app)
+    end = time.monotonic() + deadline
+    pool = _get_request_pool()
+    primary = pool.submit(_timed_post, payload, api_key, deadline, app)
+    pending = {primary}
+
+    hedge_after = policy.hedge_delay(app, payload["model"])
+    if hedge_after is not None and hedge_after < deadline:
+        done, _ = wait(pending, timeout=hedge_after)
+        if not done and policy.try_hedge(app):
+            pending.add(pool.submit(_timed_post, payload, api_key, end - time.monotonic(), app))
+
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, timeout=max(0.0, end - time.monotonic()), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            try:
+                response = future.result()
+            except Exception as e:
+                error = e
+                continue
+            if future is not primary:
+                policy.count(app, "hedge_wins")
+            return response
+
+    if error is None or isinstance(error, httpx.TimeoutException):
+        policy.count(app, "deadline_exceeded")
+        raise DeadlineExceeded(f"No response from {payload['model']} within {deadline:g}s") from error
+    raise error
+
+
+def _outcome(error: BaseException) -> str:
+    """Telemetry outcome for a failed call."""
+    if isinstance(error, DeadlineExceeded):
+        return "deadline_exceeded"
+    if isinstance(error, FirstTokenTimeout):
+        return "first_token_timeout"
+    if isinstance(error, RateLimitTimeout):
+        return "rate_limited"
+    return "error"
+
+
+def _record(
+    app: Optional[str],
+    model: str,
+    outcome: str,
+    started: float,
+    usage: Optional[Dict[str, Any]] = None,
+    ttft: Optional[float] = None,
+    error: Optional[BaseException] = None,
+) -> None:
+    latency = time.monotonic() - started
+    if outcome == "upstream":
+        get_router().observe(model, latency)
+    telemetry = get_telemetry()
+    if telemetry is not None:
+        telemetry.record(app, model, outcome, latency, ttft=ttft, usage=usage, error=error)
+
+
+def _route(app: Optional[str], model: str, messages: List[Dict[str, str]], complexity: Optional[str]) -> Optional[Route]:
+    return get_router().route(app, messages, complexity) if model == AUTO_MODEL else None
+
+
+def _shadow(route: Route, payload: Dict[str, Any], primary: str, api_key: Optional[str], app: Optional[str]) -> None:
+    """Send ``payload`` to the model the router did not pick and compare the replies, off the request path."""
+    shadow_payload = {key: value for key, value in payload.items() if key != "stream"}
+    shadow_payload["model"] = route.shadow_model
+    # Counted under their own label so they never skew the app's own latency or tokens
+    shadow_app = f"{app or 'default'}:shadow"
+
+    def run() -> None:
+        started = time.monotonic()
+        try:
+            response = _post(shadow_payload, api_key, deadline_for(app))
+            text = completion_text(response)
+        except Exception as e:
+            _record(shadow_app, route.shadow_model, _outcome(e), started, error=e)
+            return
+        _record(shadow_app, route.shadow_model, "upstream", started, usage=response.get("usage"))
+        get_router().record_shadow(app, primary, text)
+
+    _get_request_pool().submit(run)
+
+
+def _flight_key(payload: Dict[str, Any], api_key: Optional[str]) -> str:
+    """Identity of an upstream request: the full payload plus which key sends it."""
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    key_id = hashlib.sha256(resolve_api_key(api_key).encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{key_id}\n{raw}".encode("utf-8")).hexdigest()
+
+
+def chat_completion(
+    messages: List[Dict[str, str]],
+    *,
+    model: str,
+    app: Optional[str] = None,
+    api_key: Optional[str] = None,
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+    timeout: Optional[float] = None,
+    cache_ttl: Optional[float] = None,
+    complexity: Optional[str] = None,
+    refresh: bool = False,
+    cacheable: Optional[Callable[[Dict[str, Any]], bool]] = None,
+) -> Dict[str, Any]:
+    """Send a chat completion over the shared pool and return the response JSON.
+
+    ``app`` selects per-app settings such as the response-cache TTL from
+    :data:`common.llm_cache.CACHE_TTLS`; ``cache_ttl`` overrides it for a
+    single call (``0`` disables caching). ``refresh=True`` skips the cache
+    lookup and replaces the cached entry with the new response, for when
+    the user explicitly asks again. ``cacheable``, if given, decides
+    whether a fresh response may be stored at all; the structured-output
+    apps use it so a reply that fails schema validation is returned but
+    never cached. Concurrent identical calls are coalesced into one
+    upstream request.
+
+    ``timeout`` is the wall-clock deadline for the whole call and defaults
+    to the app's budget in :data:`common.deadlines.DEADLINE_BUDGETS`. When
+    it passes, a recently expired cache entry is returned (marked
+    ``"stale": True``) if there is one; otherwise :class:`DeadlineExceeded`
+    is raised.
+
+    With ``model=AUTO_MODEL`` the router picks the model from
+    ``complexity`` (``simple``, ``standard`` or ``complex``; defaults to the
+    app's declared level), the prompt size and recent latencies.
+    """
+    started = time.monotonic()
+    route = _route(app, model, messages, complexity)
+    if route is not None:
+        model = route.model
+    payload = build_payload(messages, model, temperature, max_tokens, response_format)
+
+    ttl = cache_ttl if cache_ttl is not None else llm_cache.ttl_for(app)
+    cache = llm_cache.get_cache() if ttl > 0 else None
+    if cache is not None:
+        key = llm_cache.cache_key(payload)
+        cached = None if refresh else cache.get(key, app)
+        if cached is not None:
+            _record(app, model, "cache_hit", started)
+            return cached
+
+    deadline = timeout if timeout is not None else deadline_for(app)
+    upstream = False
+
+    def fetch() -> Dict[str, Any]:
+        nonlocal upstream
+        upstream = True
+        response = _post_with_deadline(payload, api_key, app, deadline)
+        if cache is not None and (cacheable is None or cacheable(response)):
+            cache.put(key, response, ttl, app)
+        return response
+
+    try:
+        flights = get_single_flight()
+        if flights is None:
+            response = fetch()
+        else:
+            response = flights.do(_flight_key(payload, api_key), fetch, app=app, timeout=deadline)
+    except TimeoutError as e:
+        stale = cache.get_stale(key, app) if cache is not None else None
+        if stale is None:
+            _record(app, model, _outcome(e), started, error=e)
+            raise
+        _record(app, model, "stale", started, error=e)
+        stale["stale"] = True
+        return stale
+    except Exception as e:
+        _record(app, model, _outcome(e), started, error=e)
+        raise
+
+    # Followers of a coalesced call spent no tokens of their own
+    if upstream:
+        _record(app, model, "upstream", started, usage=response.get("usage"))
+        if route is not None and route.shadow_model:
+            _shadow(route, payload, completion_text(response), api_key, app)
+    else:
+        _record(app, model, "coalesced", started)
+    return response
+
+
+def _iter_sse_deltas(resp: httpx.Response, usage: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """Yield content deltas; ``usage`` is filled from chunks that report token usage."""
+    for line in resp.iter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            break
+        chunk = json.loads(data)
+        if usage is not None and chunk.get("usage"):
+            usage.update(chunk["usage"])
+        choices = chunk.get("choices") or [{}]
+        delta = (choices[0].get("delta") or {}).get("content")
+        if delta:
+            yield delta
+
+
+def stream_chat_completion(
+    messages: List[Dict[str, str]],
+    *,
+    model: str,
+    app: Optional[str] = None,
+    api_key: Optional[str] = None,
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+    first_token_timeout: Optional[float] = None,
+    cache_ttl: Optional[float] = None,
+    complexity: Optional[str] = None,
+    refresh: bool = False,
+    cacheable: Optional[Callable[[Dict[str, Any]], bool]] = None,
+) -> Iterator[str]:
+    """Stream a chat completion, yielding content deltas as they arrive.
+
+    If ``first_token_timeout`` seconds pass without any content,
+    :class:`FirstTokenTimeout` is raised so the caller can fall back to a
+    deterministic result. Responses share the cache used by
+    :func:`chat_completion`: a hit is yielded as a single delta, and a
+    stream that runs to completion is stored. ``refresh`` and ``cacheable``
+    work as there. ``model=AUTO_MODEL`` is routed as in
+    :func:`chat_completion`.
+    """
+    started = time.monotonic()
+    route = _route(app, model, messages, complexity)
+    if route is not None:
+        model = route.model
+    payload = build_payload(messages, model, temperature, max_tokens, response_format)
+
+    ttl = cache_ttl if cache_ttl is not None else llm_cache.ttl_for(app)
+    cache = llm_cache.get_cache() if ttl > 0 else None
+    if cache is not None:
+        key = llm_cache.cache_key(payload)
+        cached = None if refresh else cache.get(key, app)
+        if cached is not None:
+            _record(app, model, "cache_hit", started)
+            yield completion_text(cached)
+            return
+
+    payload["stream"] = True
+    headers = _headers(api_key)
+
+    # The HTTP read runs on a worker thread so the first-token wait can be
+    # bounded independently of the pool's (much longer) read timeout.
+    deltas: "queue.Queue[Any]" = queue.Queue()
+    done = object()
+    cancelled = threading.Event()
+    usage: Dict[str, Any] = {}
+
+    limiter = get_rate_limiter()
+
+    def produce() -> None:
+        try:
+            # Waiting for rate-limit capacity counts against the first-token timeout
+            with limiter.slot(estimate_tokens(payload)) if limiter is not None else nullcontext() as slot:
+                with get_http_client().stream(
+                    "POST", f"{PPLX_BASE_URL}/chat/completions", headers=headers, json=payload
+                ) as resp:
+                    if slot is not None:
+                        slot.observe(resp.status_code)
+                    resp.raise_for_status()
+                    for delta in _iter_sse_deltas(resp, usage):
+                        if cancelled.is_set():
+                            return
+                        deltas.put(delta)
+        except Exception as e:
+            deltas.put(e)
+        finally:
+            deltas.put(done)
+
+    threading.Thread(target=produce, name=f"llm-stream-{app or 'default'}", daemon=True).start()
+
+    wait = first_token_timeout
+    parts: List[str] = []
+    ttft: Optional[float] = None
+    try:
+        while True:
+            try:
+                item = deltas.get(timeout=wait)
+            except queue.Empty:
+                raise FirstTokenTimeout(f"No content from {model} within {first_token_timeout:.1f}s")
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            if ttft is None:
+                ttft = time.monotonic() - started
+            wait = None
+            parts.append(item)
+            yield item
+    except Exception as e:
+        _record(app, model, _outcome(e), started, ttft=ttft, error=e)
+        raise
+    finally:
+        cancelled.set()
+
+    # The producer fills ``usage`` before it queues ``done``
+    _record(app, model, "upstream", started, usage=usage, ttft=ttft)
+
+    content = "".join(parts)
+    if route is not None and route.shadow_model and parts:
+        _shadow(route, payload, content, api_key, app)
+    if cache is not None and parts:
+        response = {"model": model, "choices": [{"message": {"role": "assistant", "content": content}}]}
+        if cacheable is None or cacheable(response):
+            cache.put(key, response, ttl, app)
+
+
+def completion_text(response: Dict[str, Any]) -> str:
+    """Extract the assistant message content from a chat completion response."""
+    try:
+        return response["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError) as e:
+        raise RuntimeError(f"Unexpected LLM response format: {e}")
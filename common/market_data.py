@@ -0,0 +1,184 @@
+"""Deduplicated, batched price-history downloads from Yahoo Finance.
+
+:func:`fetch_histories` takes any list of tickers, possibly with
+repeats, and fetches each distinct ticker once. It works in two passes:
+
+1. A single multi-ticker ``yf.download`` call, which yfinance runs on its
+   own threads.
+2. A bounded thread pool that retries, one at a time, every ticker the
+   batch returned no rows for. Each retry has its own timeout, and the
+   whole pass has a wall-clock deadline.
+
+Tickers that still have no data come back in :attr:`FetchResult.errors`
+with the reason. One bad symbol never hides the rest.
+
+Both passes ask for split- and dividend-adjusted bars explicitly. The
+pinned yfinance defaults ``download`` to unadjusted prices but
+``Ticker.history`` to adjusted ones, so leaving it to the defaults would
+mix the two in one result.
+
+:func:`fetch_infos` does the same for ``Ticker.info`` fundamentals, which
+have no batch endpoint. It fetches every distinct ticker on the bounded
+pool, under a deadline that scales with the number of tickers per worker.
+
+yfinance is imported on first use, so apps that never fetch prices do not
+need it installed.
+
+- ``MARKET_DATA_WORKERS``: threads for the per-ticker retry pass and for ``fetch_infos`` (default 8)
+- ``MARKET_DATA_TIMEOUT``: per-request timeout in seconds (default 10)
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+
+@dataclass
+class FetchResult:
+    """Price histories by ticker, and the reason each missing ticker failed."""
+
+    prices: Dict[str, pd.DataFrame] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class InfoResult:
+    """``Ticker.info`` dicts by ticker, and the reason each missing ticker failed."""
+
+    infos: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+
+def _unique(tickers: Iterable[str]) -> List[str]:
+    return list(dict.fromkeys(t.strip() for t in tickers if t and t.strip()))
+
+
+def _split_batch(data: pd.DataFrame, tickers: List[str]) -> Dict[str, pd.DataFrame]:
+    """Per-ticker frames from a ``group_by="ticker"`` download, skipping tickers with no rows."""
+    frames: Dict[str, pd.DataFrame] = {}
+    if data is None or data.empty:
+        return frames
+    if not isinstance(data.columns, pd.MultiIndex):
+        # A single-ticker download comes back with flat columns
+        data = pd.concat({tickers[0]: data}, axis=1)
+    for ticker in tickers:
+        if ticker not in data.columns.get_level_values(0):
+            continue
+        frame = data[ticker].dropna(how="all")
+        if not frame.empty:
+            frames[ticker] = frame
+    return frames
+
+
+def _fetch_one(ticker: str, span: Dict[str, str], interval: str, timeout: float) -> pd.DataFrame:
+    import yfinance as yf
+
+    frame = yf.Ticker(ticker).history(**span, interval=interval, auto_adjust=True, timeout=timeout, raise_errors=True)
+    frame = frame.dropna(how="all")
+    if frame.empty:
+        raise ValueError("no price data returned")
+    return frame
+
+
+def fetch_histories(
+    tickers: Iterable[str],
+    period: str = "1y",
+    interval: str = "1d",
+    timeout: Optional[float] = None,
+    max_workers: Optional[int] = None,
+    start: Optional[str] = None,
+) -> FetchResult:
+    """Download adjusted OHLCV history for every distinct ticker in ``tickers``.
+
+    ``start`` (``YYYY-MM-DD``) fetches from that date to today instead of
+    over ``period``.
+
+    Each retry in the fallback pass is bounded by ``timeout`` seconds. The
+    pass as a whole gets twice that. Tickers that are still missing after
+    it are reported in ``errors`` rather than raised.
+    """
+    import yfinance as yf
+
+    timeout = timeout if timeout is not None else float(os.getenv("MARKET_DATA_TIMEOUT", "10"))
+    max_workers = max_workers or int(os.getenv("MARKET_DATA_WORKERS", "8"))
+    wanted = _unique(tickers)
+    result = FetchResult()
+    if not wanted:
+        return result
+    span = {"start": start} if start is not None else {"period": period}
+
+    try:
+        batch = yf.download(
+            wanted, **span, interval=interval, group_by="ticker", auto_adjust=True,
+            threads=min(max_workers, len(wanted)), progress=False, timeout=timeout,
+        )
+        result.prices.update(_split_batch(batch, wanted))
+    except Exception:
+        # Every ticker falls through to the per-ticker pass, which records the reason
+        pass
+
+    missing = [t for t in wanted if t not in result.prices]
+    if not missing:
+        return result
+
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(missing)), thread_name_prefix="market-data")
+    futures = {pool.submit(_fetch_one, t, span, interval, timeout): t for t in missing}
+    done, pending = wait(futures, timeout=2 * timeout)
+    # Stragglers keep their threads until yfinance gives up; nobody waits for them
+    pool.shutdown(wait=False, cancel_futures=True)
+    for future in done:
+        ticker = futures[future]
+        try:
+            result.prices[ticker] = future.result()
+        except Exception as e:
+            result.errors[ticker] = f"{type(e).__name__}: {e}"[:200]
+    for future in pending:
+        result.errors[futures[future]] = f"timed out after {2 * timeout:g}s"
+    return result
+
+
+def _info_one(ticker: str) -> Dict[str, Any]:
+    import yfinance as yf
+
+    info = yf.Ticker(ticker).info
+    if not info or not (info.get("currentPrice") or info.get("regularMarketPrice")):
+        raise ValueError("no quote data returned")
+    return info
+
+
+def fetch_infos(
+    tickers: Iterable[str],
+    timeout: Optional[float] = None,
+    max_workers: Optional[int] = None,
+) -> InfoResult:
+    """Fetch ``Ticker.info`` for every distinct ticker in ``tickers`` on a bounded pool.
+
+    Each worker gets ``timeout`` seconds per ticker it has to handle, plus
+    one spare, so a 500-ticker universe is not cut off after the first
+    wave. Tickers without a quote, that raised, or that were still
+    running at the deadline are reported in ``errors``.
+    """
+    timeout = timeout if timeout is not None else float(os.getenv("MARKET_DATA_TIMEOUT", "10"))
+    max_workers = max_workers or int(os.getenv("MARKET_DATA_WORKERS", "8"))
+    wanted = _unique(tickers)
+    result = InfoResult()
+    if not wanted:
+        return result
+
+    workers = min(max_workers, len(wanted))
+    deadline = timeout * (-(-len(wanted) // workers) + 1)
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="market-info")
+    futures = {pool.submit(_info_one, t): t for t in wanted}
+    done, pending = wait(futures, timeout=deadline)
+    pool.shutdown(wait=False, cancel_futures=True)
+    for future in done:
+        ticker = futures[future]
+        try:
+            result.infos[ticker] = future.result()
+        except Exception as e:
+            result.errors[ticker] = f"{type(e).__name__}: {e}"[:200]
+    for future in pending:
+        result.errors[futures[future]] = f"timed out after {deadline:g}s"
+    return result
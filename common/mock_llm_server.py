@@ -0,0 +1,421 @@
+"""Local OpenAI-compatible stand-in for the Perplexity API.
+
+Serves ``POST /chat/completions`` (plain and ``stream=True``) with canned or
+templated content per app, and schema-valid JSON for any other request that
+carries a ``response_format`` json_schema. Canned replies are checked against
+that schema too: one that no longer matches its app's model is answered with
+a 500 naming the failing fields instead of being served. Latency, error rate
+and 429s are configurable, so every app's LLM path can be load-tested and
+benchmarked offline::
+
+    python -m common.mock_llm_server --port 8911 --latency-median 3 --tail-rate 0.05 --rate-429 0.02
+    LLM_BASE_URL=http://127.0.0.1:8911 PERPLEXITY_API_KEY=mock streamlit run insurance-premium-calculator/app.py
+
+``GET /stats`` returns request counts per app and status, plus latency
+percentiles of the responses served.
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+
+def _bnpl(prompt: str) -> str:
+    cibil = int(re.search(r"CIBIL Score: (\d+)", prompt).group(1)) if "CIBIL Score:" in prompt else 700
+    approved = cibil >= 650
+    return json.dumps({
+        "approved": approved,
+        "max_limit": 50000 if approved else 0,
+        "tenure_months": 6 if approved else 0,
+        "interest_rate": "14-18% APR" if approved else "N/A",
+        "citations": ["RBI Digital Lending Guidelines 2022"],
+        "reasoning": f"Mock decision for CIBIL {cibil}.",
+    })
+
+
+def _fair_practices(prompt: str) -> str:
+    match = re.search(r"Recommendation: (\w+)", prompt)
+    return json.dumps({
+        "citations": ["RBI Master Circular - Fair Practices Code for Lenders"],
+        "reasoning": f"Mock reasoning for a {match.group(1) if match else 'APPROVE'} outcome.",
+    })
+
+
+def _goal_tracker(prompt: str) -> str:
+    bucket = {"percentage": 20, "allocation_amount": 100000, "instruments": ["Index fund", "Debt fund"]}
+    return json.dumps({
+        "goal_achievable": True,
+        "confidence_score": 72,
+        "required_monthly_sip": 25000,
+        "expected_corpus": 5000000,
+        "expected_return_cagr": "11%",
+        "asset_allocation": {name: dict(bucket) for name in ("equity", "debt", "gold", "silver", "crude_energy", "real_estate")},
+        "recommendations": ["Start a monthly SIP", "Review annually"],
+        "risk_factors": ["Market volatility"],
+        "tax_benefits": ["Section 80C via ELSS"],
+        "rebalancing_frequency": "Annually",
+        "alternative_strategies": ["Extend the tenure"],
+        "market_outlook_2025": "Mock outlook.",
+        "disclaimer": "Mock response for load testing.",
+    })
+
+
+def _fin_news(prompt: str) -> str:
+    return json.dumps({
+        "sector_summary": ["Mock summary point 1", "Mock summary point 2", "Mock summary point 3"],
+        "bullish_drivers": ["Mock driver 1", "Mock driver 2", "Mock driver 3"],
+        "bearish_risks": ["Mock risk 1", "Mock risk 2", "Mock risk 3"],
+        "key_news_items": [{"headline": "Mock headline", "source": "Mock Wire", "impact": "neutral", "commentary": "Mock commentary."}],
+        "macro_view": "Mock macro view.",
+        "educational_disclaimer": "Mock response; not investment advice.",
+    })
+
+
+def _sector_rotation(prompt: str) -> str:
+    return json.dumps({
+        "primary_rotation": "FROM IT TO Banking",
+        "reasoning": {"momentum_analysis": "Mock.", "valuation_insight": "Mock.", "risk_consideration": "Mock."},
+        "overweight_sectors": ["Banking"],
+        "underweight_sectors": ["IT"],
+        "recommended_stocks": {"Banking": ["SBIN.NS"]},
+        "confidence_score": "65%",
+        "key_risks": ["Mock risk"],
+        "alternative_scenario": "Mock scenario.",
+    })
+
+
+def _markdown(title: str) -> Callable[[str], str]:
+    return lambda prompt: (
+        f"## {title}\n\n"
+        "1. **Guidelines** - Mock summary of the applicable RBI/SEBI guidelines.\n"
+        "2. **Compliance** - Mock compliance assessment.\n"
+        "3. **Recommendations** - Mock recommendations for load testing.\n"
+    )
+
+
+# (app, marker in the last user message, content builder); first match wins
+APP_RESPONSES: List[Tuple[str, str, Callable[[str], str]]] = [
+    ("bnpl-eligibility-checker", "BNPL eligibility engine", _bnpl),
+    ("fair-practices-auditor", "Fair Practices Code compliance auditor", _fair_practices),
+    ("financial-goal-tracker", "goal-based wealth planning", _goal_tracker),
+    ("fin-news", "sector news feed", _fin_news),
+    ("sector-rotation-screener", "expert portfolio strategist", _sector_rotation),
+    ("dividend-income-screener", "dividend stock screening", _markdown("Dividend Portfolio Analysis")),
+    ("loan-against-asset-checker", "against RBI regulations", _markdown("Loan Against Asset Analysis")),
+]
+
+
+def _deref(schema: Dict[str, Any], root: Dict[str, Any]) -> Dict[str, Any]:
+    while "$ref" in schema:
+        node: Any = root
+        for part in schema["$ref"].lstrip("#/").split("/"):
+            node = node[part]
+        schema = node
+    return schema
+
+
+def _resolve(schema: Dict[str, Any], root: Dict[str, Any]) -> Dict[str, Any]:
+    schema = _deref(schema, root)
+    for combinator in ("anyOf", "oneOf"):
+        if combinator in schema:
+            options = [s for s in schema[combinator] if s.get("type") != "null"] or schema[combinator]
+            return _resolve(options[0], root)
+    if "allOf" in schema:
+        return _resolve(schema["allOf"][0], root)
+    return schema
+
+
+def sample_from_schema(schema: Dict[str, Any], root: Optional[Dict[str, Any]] = None, name: str = "value") -> Any:
+    """Build a minimal instance that validates against a JSON schema."""
+    root = root if root is not None else schema
+    schema = _resolve(schema, root)
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "const" in schema:
+        return schema["const"]
+    kind = schema.get("type")
+    if isinstance(kind, list):
+        kind = next((k for k in kind if k != "null"), "null")
+    if kind == "object" or "properties" in schema:
+        return {key: sample_from_schema(sub, root, key) for key, sub in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [sample_from_schema(schema.get("items", {}), root, name) for _ in range(max(2, schema.get("minItems", 0)))]
+    if kind == "integer":
+        return max(1, int(schema.get("minimum", 1)))
+    if kind == "number":
+        return float(max(1000, schema.get("minimum", 0)))
+    if kind == "boolean":
+        return True
+    if kind == "null":
+        return None
+    return f"Mock {name.replace('_', ' ')}"
+
+
+_JSON_TYPES: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool) or isinstance(v, float) and v.is_integer(),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+
+def schema_errors(instance: Any, schema: Dict[str, Any], root: Optional[Dict[str, Any]] = None, path: str = "$") -> List[str]:
+    """List where ``instance`` breaks ``schema``: types, required keys, enums and nested items."""
+    root = root if root is not None else schema
+    schema = _deref(schema, root)
+    for combinator in ("anyOf", "oneOf"):
+        if combinator in schema:
+            options = [schema_errors(instance, option, root, path) for option in schema[combinator]]
+            return [] if any(not errors for errors in options) else min(options, key=len)
+    errors = [e for sub in schema.get("allOf", []) for e in schema_errors(instance, sub, root, path)]
+    kinds = schema.get("type")
+    if kinds is not None:
+        kinds = kinds if isinstance(kinds, list) else [kinds]
+        if not any(_JSON_TYPES.get(kind, lambda v: True)(instance) for kind in kinds):
+            return errors + [f"{path}: expected {'/'.join(kinds)}, got {type(instance).__name__} {instance!r}"[:200]]
+    if "enum" in schema and instance not in schema["enum"]:
+        errors.append(f"{path}: {instance!r} not in {schema['enum']}")
+    if "const" in schema and instance != schema["const"]:
+        errors.append(f"{path}: expected {schema['const']!r}")
+    if isinstance(instance, dict):
+        errors.extend(f"{path}.{key}: missing" for key in schema.get("required", []) if key not in instance)
+        for key, sub in schema.get("properties", {}).items():
+            if key in instance:
+                errors.extend(schema_errors(instance[key], sub, root, f"{path}.{key}"))
+    if isinstance(instance, list) and isinstance(schema.get("items"), dict):
+        for i, item in enumerate(instance):
+            errors.extend(schema_errors(item, schema["items"], root, f"{path}[{i}]"))
+    return errors
+
+
+class CannedResponseError(ValueError):
+    """Raised when an app's canned reply does not match the schema its request asked for."""
+
+
+def build_content(payload: Dict[str, Any]) -> Tuple[str, str]:
+    """Return (app, content) for a chat completion request.
+
+    Raises :class:`CannedResponseError` if a canned reply breaks the
+    request's ``response_format`` schema.
+    """
+    messages = payload.get("messages") or [{}]
+    prompt = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    response_format = payload.get("response_format") or {}
+    spec = response_format.get("json_schema", {}) if response_format.get("type") == "json_schema" else None
+    for app, marker, build in APP_RESPONSES:
+        if marker in prompt:
+            content = build(prompt)
+            if spec is not None:
+                try:
+                    errors = schema_errors(json.loads(content), spec.get("schema", {}))
+                except ValueError as e:
+                    errors = [f"not JSON: {e}"]
+                if errors:
+                    raise CannedResponseError(f"Canned {app} reply does not match {spec.get('name', 'the schema')}: " + "; ".join(errors[:5]))
+            return app, content
+    if spec is not None:
+        return spec.get("name", "json_schema"), json.dumps(sample_from_schema(spec.get("schema", {})))
+    return "unknown", "Mock response from the local LLM stand-in."
+
+
+class MockConfig:
+    """Latency distribution and fault injection settings."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.latency_median = args.latency_median
+        self.latency_sigma = args.latency_sigma
+        self.tail_rate = args.tail_rate
+        self.tail_seconds = args.tail_seconds
+        self.ttft_share = args.ttft_share
+        self.error_rate = args.error_rate
+        self.rate_429 = args.rate_429
+        self.retry_after = args.retry_after
+        self.rpm = args.rpm
+
+    def sample_latency(self) -> float:
+        if self.tail_rate and random.random() < self.tail_rate:
+            return self.tail_seconds
+        if self.latency_median <= 0:
+            return 0.0
+        return random.lognormvariate(math.log(self.latency_median), self.latency_sigma)
+
+
+class MockState:
+    """Counters and recent latencies served, for ``GET /stats``."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.counts: Dict[str, Dict[str, int]] = {}
+        self.latencies: Deque[float] = deque(maxlen=10000)
+        self.recent: Deque[float] = deque()
+
+    def over_rpm(self, rpm: int) -> bool:
+        now = time.monotonic()
+        with self.lock:
+            while self.recent and now - self.recent[0] > 60:
+                self.recent.popleft()
+            if len(self.recent) >= rpm:
+                return True
+            self.recent.append(now)
+            return False
+
+    def record(self, app: str, status: int, seconds: Optional[float] = None) -> None:
+        with self.lock:
+            by_status = self.counts.setdefault(app, {})
+            by_status[str(status)] = by_status.get(str(status), 0) + 1
+            if seconds is not None:
+                self.latencies.append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            samples = sorted(self.latencies)
+            counts = {app: dict(by_status) for app, by_status in self.counts.items()}
+        pct = {
+            f"p{q}": round(samples[min(len(samples) - 1, int(q / 100 * len(samples)))], 3) if samples else None
+            for q in (50, 90, 95, 99)
+        }
+        return {"requests": counts, "latency_seconds": pct, "served": len(samples)}
+
+
+def make_handler(config: MockConfig, state: MockState, verbose: bool = False):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format: str, *args: Any) -> None:
+            if verbose:
+                super().log_message(format, *args)
+
+        def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            if self.path.rstrip("/") == "/stats":
+                self._send_json(200, state.snapshot())
+            elif self.path.rstrip("/") == "/health":
+                self._send_json(200, {"status": "ok"})
+            else:
+                self._send_json(404, {"error": {"message": "Not found"}})
+
+        def do_POST(self) -> None:
+            if self.path.rstrip("/") not in ("/chat/completions", "/v1/chat/completions"):
+                self._send_json(404, {"error": {"message": "Not found"}})
+                return
+            started = time.monotonic()
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            try:
+                app, content = build_content(payload)
+            except CannedResponseError as e:
+                state.record("canned-schema-mismatch", 500)
+                self._send_json(500, {"error": {"message": str(e), "type": "mock_schema_mismatch"}})
+                return
+
+            if (config.rpm and state.over_rpm(config.rpm)) or random.random() < config.rate_429:
+                state.record(app, 429)
+                self._send_json(429, {"error": {"message": "Rate limit exceeded", "type": "rate_limit"}},
+                                {"Retry-After": str(config.retry_after)})
+                return
+            latency = config.sample_latency()
+            if random.random() < config.error_rate:
+                time.sleep(latency)
+                state.record(app, 503)
+                self._send_json(503, {"error": {"message": "Service temporarily overloaded", "type": "server_error"}})
+                return
+
+            if payload.get("stream"):
+                self._stream(payload, content, latency)
+            else:
+                time.sleep(latency)
+                self._send_json(200, self._completion(payload, content))
+            state.record(app, 200, time.monotonic() - started)
+
+        def _completion(self, payload: Dict[str, Any], content: str) -> Dict[str, Any]:
+            prompt_tokens = len(json.dumps(payload.get("messages", []))) // 4
+            completion_tokens = max(1, len(content) // 4)
+            return {
+                "id": f"mock-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": payload.get("model", "sonar"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            }
+
+        def _write_chunk(self, data: bytes) -> None:
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def _stream(self, payload: Dict[str, Any], content: str, latency: float) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            pieces = re.findall(r"\S+\s*|\s+", content) or [content]
+            time.sleep(latency * config.ttft_share)
+            gap = latency * (1 - config.ttft_share) / len(pieces)
+            stream_id = f"mock-{uuid.uuid4().hex[:12]}"
+            for piece in pieces:
+                chunk = {"id": stream_id, "object": "chat.completion.chunk", "model": payload.get("model", "sonar"),
+                         "choices": [{"index": 0, "delta": {"content": piece}}]}
+                self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                time.sleep(gap)
+            # Like the real API, the final chunk reports token usage
+            final = {"id": stream_id, "object": "chat.completion.chunk", "model": payload.get("model", "sonar"),
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                     "usage": self._completion(payload, content)["usage"]}
+            self._write_chunk(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in for the Perplexity API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8911)
+    parser.add_argument("--latency-median", type=float, default=1.0, help="median response time in seconds (lognormal)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="lognormal sigma of the response time")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="fraction of requests that take --tail-seconds")
+    parser.add_argument("--tail-seconds", type=float, default=20.0, help="response time of tail requests")
+    parser.add_argument("--ttft-share", type=float, default=0.3, help="share of the response time spent before the first streamed token")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--rpm", type=int, default=0, help="answer 429 beyond this many requests per minute (0 = no limit)")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    state = MockState()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(MockConfig(args), state, args.verbose))
+    server.daemon_threads = True
+    print(f"Mock LLM server on http://{args.host}:{args.port} (set LLM_BASE_URL to this address)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(state.snapshot(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""Per-request model routing between sonar and sonar-pro.
+
+Apps that pass ``model=AUTO_MODEL`` to the gateway let :class:`ModelRouter`
+choose the model for each request. The choice uses three inputs:
+
+- the task's declared complexity, given per call or per app in
+  :data:`APP_COMPLEXITY`
+- the prompt size
+- recent latency of each model, observed from this process's upstream calls
+
+``simple`` tasks, such as rule checks, go to the fast model unless the
+prompt is long or the fast model is currently slower than the strong one.
+``complex`` tasks always go to the strong model. ``standard`` tasks use the
+strong model, but short prompts move to the fast model while the strong
+model's recent median is over ``LLM_ROUTER_SLOW_SECONDS``.
+
+:data:`MODEL_OVERRIDES` (and ``LLM_ROUTER_OVERRIDES``) pins an app to one
+model. In shadow mode, a sample of routed calls is also sent to the model
+the router did not pick. The two replies are compared off the request
+path, and the agreement is reported per app in :meth:`ModelRouter.stats`.
+
+- ``LLM_ROUTER``: set to ``0`` to send every routed call to the strong model
+- ``LLM_ROUTER_OVERRIDES``: extra pins, e.g. ``bnpl-eligibility-checker=sonar-pro,financial-goal-tracker=sonar``
+- ``LLM_ROUTER_SLOW_SECONDS``: strong-model median that moves ``standard`` tasks (default 12)
+- ``LLM_ROUTER_SHADOW_RATE``: fraction of routed calls shadowed on the other model (default 0)
+"""
+import json
+import os
+import re
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+AUTO_MODEL = "auto"
+FAST_MODEL = "sonar"
+STRONG_MODEL = "sonar-pro"
+
+COMPLEXITIES = ("simple", "standard", "complex")
+
+# Declared task complexity per app, for calls that do not pass one
+APP_COMPLEXITY: Dict[str, str] = {
+    "bnpl-eligibility-checker": "simple",
+    "fair-practices-auditor": "simple",
+    "insurance-premium-calculator": "standard",
+    "financial-goal-tracker": "standard",
+    "sector-rotation-screener": "complex",
+}
+
+# Apps pinned to one model whatever the request looks like
+MODEL_OVERRIDES: Dict[str, str] = {}
+
+# Prompt tokens above which a task is routed as one level more complex
+LONG_PROMPT_TOKENS = {"simple": 3000, "standard": 1500}
+
+# Latencies needed per model before they are trusted. Older samples are
+# ignored, so a model that stops getting traffic because it was slow is
+# tried again once they age out.
+MIN_SAMPLES = 10
+WINDOW = 200
+MAX_SAMPLE_AGE = 600
+SHADOW_WINDOW = 500
+
+_NUMBER = re.compile(r"-?\d[\d,]*\.?\d*")
+_TOKEN = re.compile(r"\w+")
+
+
+@dataclass(frozen=True)
+class Route:
+    """The router's choice for one request."""
+
+    model: str
+    complexity: str
+    reason: str
+    shadow_model: Optional[str] = None
+
+
+def _prompt_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(len(m.get("content") or "") for m in messages) // 4
+
+
+def _close(a: Any, b: Any) -> bool:
+    """Whether two JSON scalars agree: numbers within 10%, strings by their numbers or words."""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return a == b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return abs(a - b) <= 0.1 * max(abs(a), abs(b), 1e-9)
+    if isinstance(a, str) and isinstance(b, str):
+        numbers_a, numbers_b = _NUMBER.findall(a), _NUMBER.findall(b)
+        if numbers_a or numbers_b:
+            return numbers_a == numbers_b
+        return _overlap(a, b) >= 0.5
+    return a == b
+
+
+def _overlap(a: str, b: str) -> float:
+    """Jaccard overlap of the lower-cased words in ``a`` and ``b``."""
+    words_a, words_b = set(_TOKEN.findall(a.lower())), set(_TOKEN.findall(b.lower()))
+    if not words_a and not words_b:
+        return 1.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+def agreement(primary: str, shadow: str) -> float:
+    """Score in [0, 1] for how closely two replies to the same request agree.
+
+    JSON objects are compared field by field on their scalar top-level
+    fields, which is where decisions such as ``approved`` and
+    ``max_limit`` live. Free text falls back to word overlap.
+    """
+    try:
+        a, b = json.loads(primary), json.loads(shadow)
+    except ValueError:
+        return _overlap(primary, shadow)
+    if not (isinstance(a, dict) and isinstance(b, dict)):
+        return 1.0 if a == b else 0.0
+    keys = [k for k in a.keys() | b.keys() if not isinstance(a.get(k, b.get(k)), (dict, list))]
+    if not keys:
+        return 1.0 if a == b else 0.0
+    return sum(_close(a.get(k), b.get(k)) for k in keys) / len(keys)
+
+
+class ModelRouter:
+    """Chooses a model per request and keeps the latency and shadow stats it routes on."""
+
+    def __init__(self, enabled: bool, overrides: Dict[str, str], slow_seconds: float, shadow_rate: float):
+        self.enabled = enabled
+        self.overrides = overrides
+        self.slow_seconds = slow_seconds
+        self.shadow_rate = shadow_rate
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[Tuple[float, float]]] = {}
+        self._routed: Dict[str, Dict[str, int]] = {}
+        self._shadowed: Dict[str, int] = {}
+        self._agreement: Dict[str, Deque[float]] = {}
+
+    def observe(self, model: str, seconds: float) -> None:
+        """Record the latency of an upstream call to ``model``."""
+        with self._lock:
+            self._latencies.setdefault(model, deque(maxlen=WINDOW)).append((time.monotonic(), seconds))
+
+    def median(self, model: str) -> Optional[float]:
+        """Median latency of ``model`` over recent calls, or None without enough of them."""
+        cutoff = time.monotonic() - MAX_SAMPLE_AGE
+        with self._lock:
+            samples = [seconds for at, seconds in self._latencies.get(model, ()) if at >= cutoff]
+        return statistics.median(samples) if len(samples) >= MIN_SAMPLES else None
+
+    def _choose(self, app: Optional[str], complexity: str, tokens: int) -> Route:
+        pinned = self.overrides.get(app or "")
+        if pinned:
+            return Route(pinned, complexity, "override")
+        if not self.enabled:
+            return Route(STRONG_MODEL, complexity, "router disabled")
+        if complexity != "complex" and tokens > LONG_PROMPT_TOKENS[complexity]:
+            complexity = "standard" if complexity == "simple" else "complex"
+        if complexity == "complex":
+            return Route(STRONG_MODEL, complexity, "complex task")
+
+        fast, strong = self.median(FAST_MODEL), self.median(STRONG_MODEL)
+        if complexity == "simple":
+            if fast is not None and strong is not None and fast > strong:
+                return Route(STRONG_MODEL, complexity, f"{FAST_MODEL} slower ({fast:.1f}s vs {strong:.1f}s)")
+            return Route(FAST_MODEL, complexity, "simple task")
+        if strong is not None and strong > self.slow_seconds and (fast is None or fast < strong):
+            return Route(FAST_MODEL, complexity, f"{STRONG_MODEL} slow ({strong:.1f}s median)")
+        return Route(STRONG_MODEL, complexity, "standard task")
+
+    def route(self, app: Optional[str], messages: List[Dict[str, str]], complexity: Optional[str] = None) -> Route:
+        """Pick the model for one request; ``complexity`` defaults to the app's declared level."""
+        complexity = complexity or APP_COMPLEXITY.get(app or "", "standard")
+        if complexity not in COMPLEXITIES:
+            raise ValueError(f"Unknown task complexity {complexity!r}; expected one of {COMPLEXITIES}")
+        route = self._choose(app, complexity, _prompt_tokens(messages))
+        with self._lock:
+            routed = self._routed.setdefault(app or "default", {})
+            routed[route.model] = routed.get(route.model, 0) + 1
+            shadow = self.shadow_rate > 0 and self._shadowed.get(app or "default", 0) < self.shadow_rate * sum(routed.values())
+            if shadow:
+                self._shadowed[app or "default"] = self._shadowed.get(app or "default", 0) + 1
+        if shadow:
+            other = FAST_MODEL if route.model == STRONG_MODEL else STRONG_MODEL
+            route = Route(route.model, route.complexity, route.reason, shadow_model=other)
+        return route
+
+    def record_shadow(self, app: Optional[str], primary: str, shadow: str) -> None:
+        """Compare a routed reply with the same request answered by the other model."""
+        score = agreement(primary, shadow)
+        with self._lock:
+            self._agreement.setdefault(app or "default", deque(maxlen=SHADOW_WINDOW)).append(score)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return calls per model, shadow comparisons and mean agreement per app for this process."""
+        with self._lock:
+            apps = set(self._routed) | set(self._agreement)
+            return {
+                app: {
+                    "routed": dict(self._routed.get(app, {})),
+                    "shadow_compared": len(self._agreement.get(app, ())),
+                    "shadow_agreement": (
+                        round(statistics.fmean(self._agreement[app]), 3) if self._agreement.get(app) else None
+                    ),
+                }
+                for app in sorted(apps)
+            }
+
+
+def _parse_overrides(raw: str) -> Dict[str, str]:
+    overrides: Dict[str, str] = {}
+    for item in raw.split(","):
+        app, _, model = item.partition("=")
+        if app.strip() and model.strip():
+            overrides[app.strip()] = model.strip()
+    return overrides
+
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    """Return the process-wide router. Latencies are always tracked; routing itself honours LLM_ROUTER."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter(
+                    os.getenv("LLM_ROUTER", "1") not in ("0", "false", "False"),
+                    {**MODEL_OVERRIDES, **_parse_overrides(os.getenv("LLM_ROUTER_OVERRIDES", ""))},
+                    float(os.getenv("LLM_ROUTER_SLOW_SECONDS", "12")),
+                    float(os.getenv("LLM_ROUTER_SHADOW_RATE", "0")),
+                )
+    return _router
@@ -0,0 +1,172 @@
+"""Speculative, debounced prefetch of LLM calls whose prompt is already known.
+
+Some apps can build their prompt well before the user asks for the answer.
+For example, the dividend screener's insights prompt is fixed once the
+portfolio is computed. :class:`Prefetcher` starts such a call in the
+background after the inputs have been stable for ``LLM_PREFETCH_DEBOUNCE``
+seconds. When the user then clicks, :meth:`Prefetcher.take` hands back the
+result that is already running or finished.
+
+Each session has at most one speculative call per app:
+
+- A newer prompt supersedes the old one. A call still waiting for its
+  debounce or for a worker is cancelled. A call already in flight is
+  abandoned and its result discarded.
+- A call whose result is never taken counts as waste. Once more than
+  ``LLM_PREFETCH_MAX_WASTE`` of an app's calls settled in the last 30
+  minutes are waste, new speculation for that app is skipped, and clicks
+  fall back to a normal call. The cap lifts as those outcomes age out.
+
+- ``LLM_PREFETCH_DEBOUNCE``: seconds the prompt must stay unchanged before launching (default 2)
+- ``LLM_PREFETCH_MAX_WASTE``: maximum fraction of recent speculative calls left unused (default 0.3)
+- ``LLM_PREFETCH_MAX_AGE``: seconds a prefetched result stays usable (default 600)
+- ``LLM_PREFETCH_DISABLE``: set to ``1`` to turn speculation off everywhere
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+# Settled calls an app needs, within WASTE_WINDOW seconds, before its waste rate is enforced
+MIN_LAUNCHES = 5
+WASTE_WINDOW = 1800
+MAX_SESSIONS = 256
+WORKERS = 4
+
+_COUNTERS = ("scheduled", "launched", "used", "wasted", "cancelled", "skipped_waste_cap")
+
+
+@dataclass
+class _Slot:
+    """The speculative call for one (app, session)."""
+
+    key: str
+    timer: Optional[threading.Timer] = None
+    future: Optional[Future] = None
+    launched_at: float = 0.0
+    used: bool = False
+
+
+class Prefetcher:
+    """Debounces, launches and hands over speculative calls, one per app and session."""
+
+    def __init__(self, debounce: float, max_waste: float, max_age: float):
+        self.debounce = debounce
+        self.max_waste = max_waste
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._slots: "OrderedDict[Tuple[str, str], _Slot]" = OrderedDict()
+        self._counters: Dict[str, Dict[str, int]] = {}
+        # (settled at, wasted) per app, for the rolling waste rate
+        self._settled: Dict[str, Deque[Tuple[float, bool]]] = {}
+        self._pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="llm-prefetch")
+
+    def _count(self, app: str, name: str) -> None:
+        self._counters.setdefault(app, dict.fromkeys(_COUNTERS, 0))[name] += 1
+        if name in ("used", "wasted"):
+            self._settled.setdefault(app, deque(maxlen=200)).append((time.monotonic(), name == "wasted"))
+
+    def _retire(self, app: str, slot: _Slot) -> None:
+        """Cancel or abandon a slot that is no longer wanted. Caller holds the lock."""
+        if slot.timer is not None:
+            slot.timer.cancel()
+            self._count(app, "cancelled")
+        elif slot.future is not None and not slot.used:
+            # cancel() only succeeds while the call is still queued, before anything was spent
+            self._count(app, "cancelled" if slot.future.cancel() else "wasted")
+
+    def _over_waste_cap(self, app: str) -> bool:
+        cutoff = time.monotonic() - WASTE_WINDOW
+        recent = [wasted for at, wasted in self._settled.get(app, ()) if at >= cutoff]
+        return len(recent) >= MIN_LAUNCHES and sum(recent) > self.max_waste * len(recent)
+
+    def speculate(self, app: str, session: str, key: str, fn: Callable[[], Any]) -> None:
+        """Run ``fn`` in the background once ``key`` has been the session's latest for ``debounce`` seconds.
+
+        ``key`` identifies the request (normally the prompt itself). Calling
+        again with the same key keeps the existing call.
+        """
+        with self._lock:
+            slot = self._slots.get((app, session))
+            if slot is not None and slot.key == key and not self._expired(slot):
+                self._slots.move_to_end((app, session))
+                return
+            if slot is not None:
+                self._retire(app, slot)
+            slot = _Slot(key)
+            slot.timer = threading.Timer(self.debounce, self._launch, (app, session, slot, fn))
+            slot.timer.daemon = True
+            self._slots[(app, session)] = slot
+            self._slots.move_to_end((app, session))
+            while len(self._slots) > MAX_SESSIONS:
+                (old_app, _), old = self._slots.popitem(last=False)
+                self._retire(old_app, old)
+            self._count(app, "scheduled")
+        slot.timer.start()
+
+    def _launch(self, app: str, session: str, slot: _Slot, fn: Callable[[], Any]) -> None:
+        with self._lock:
+            if self._slots.get((app, session)) is not slot or slot.timer is None:
+                return
+            slot.timer = None
+            if self._over_waste_cap(app):
+                self._count(app, "skipped_waste_cap")
+                del self._slots[(app, session)]
+                return
+            slot.future = self._pool.submit(fn)
+            slot.launched_at = time.monotonic()
+            self._count(app, "launched")
+
+    def _expired(self, slot: _Slot) -> bool:
+        return slot.future is not None and time.monotonic() - slot.launched_at > self.max_age
+
+    def take(self, app: str, session: str, key: str) -> Optional[Future]:
+        """Return the future of the session's speculative call for ``key``, or None to call live.
+
+        A call still in its debounce window is cancelled, so the live call
+        is the only one sent. A failed or expired call is dropped.
+        """
+        with self._lock:
+            slot = self._slots.get((app, session))
+            if slot is None or slot.key != key:
+                return None
+            failed = slot.future is not None and slot.future.done() and slot.future.exception() is not None
+            if slot.future is None or failed or self._expired(slot):
+                del self._slots[(app, session)]
+                self._retire(app, slot)
+                return None
+            if not slot.used:
+                slot.used = True
+                self._count(app, "used")
+            return slot.future
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return scheduled/launched/used/wasted counts and the waste rate per app for this process."""
+        with self._lock:
+            return {
+                app: {**counters, "waste_rate": round(counters["wasted"] / counters["launched"], 3) if counters["launched"] else None}
+                for app, counters in self._counters.items()
+            }
+
+
+_prefetcher: Optional[Prefetcher] = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher() -> Optional[Prefetcher]:
+    """Return the process-wide prefetcher, or None if disabled."""
+    global _prefetcher
+    if os.getenv("LLM_PREFETCH_DISABLE", "0") in ("1", "true", "True"):
+        return None
+    if _prefetcher is None:
+        with _prefetcher_lock:
+            if _prefetcher is None:
+                _prefetcher = Prefetcher(
+                    float(os.getenv("LLM_PREFETCH_DEBOUNCE", "2")),
+                    float(os.getenv("LLM_PREFETCH_MAX_WASTE", "0.3")),
+                    float(os.getenv("LLM_PREFETCH_MAX_AGE", "600")),
+                )
+    return _prefetcher
@@ -0,0 +1,319 @@
+"""Shared on-disk store of daily OHLCV history, refreshed incrementally.
+
+Each ticker is one uncompressed Arrow IPC file under ``PRICE_STORE_PATH``.
+The file holds split- and dividend-adjusted Open/High/Low/Close/Volume on a
+date index. Reads memory-map the file, so its columns are not copied into
+the process. Every app and every process on the machine shares the same
+files.
+
+:func:`load_histories` is the entry point:
+
+- **Fresh** files, refreshed within ``PRICE_STORE_MAX_AGE``, are served
+  straight from disk.
+- **Stale** files fetch only the bars from their last completed stored bar
+  onwards, in one batched download across tickers. The last stored bar may
+  be a still-moving intraday bar, so the one before it is the anchor.
+- If the anchor bar's close no longer matches the stored one, Yahoo has
+  re-adjusted the history (after a split or dividend), so the ticker is
+  fetched again in full.
+- A ticker is also fetched in full when the store has never held the
+  requested period, e.g. ``5y`` after only ``1y`` was ever asked for.
+
+Files are replaced atomically, so readers in other processes never see a
+partial write. If a refresh fails, the stored bars are served as they are.
+
+Each file records :data:`STORE_FORMAT`. Files written before every fetch
+path asked for adjusted bars may mix adjusted and raw closes, so a file
+with an older format is treated as missing and fetched again in full.
+
+pyarrow is an optional dependency. Without it, or with
+``PRICE_STORE_DISABLE=1``, :func:`load_histories` downloads directly
+through :func:`common.market_data.fetch_histories`.
+
+- ``PRICE_STORE_PATH``: directory for the files (default ``~/.cache/llm-powered-apps/prices``)
+- ``PRICE_STORE_MAX_AGE``: seconds before a stored ticker is refreshed (default 6 hours)
+- ``PRICE_STORE_DISABLE``: set to ``1`` to bypass the store
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from common.market_data import FetchResult, fetch_histories
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_PATH = Path.home() / ".cache" / "llm-powered-apps" / "prices"
+DEFAULT_MAX_AGE = 6 * 3600
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+# A stored close this far from the re-fetched one means the history was re-adjusted
+ADJUSTMENT_TOLERANCE = 0.005
+# Slack when deciding whether the stored range covers a requested period
+COVERAGE_SLACK = pd.Timedelta(days=7)
+
+_PERIOD = re.compile(r"^(\d+)(d|wk|mo|y)$")
+_PERIOD_DAYS = {"d": 1, "wk": 7, "mo": 31, "y": 366}
+EARLIEST = pd.Timestamp("1900-01-01")
+# Bumped when stored bars are no longer comparable with freshly fetched ones
+STORE_FORMAT = 2
+
+
+def period_start(period: str, today: Optional[pd.Timestamp] = None) -> pd.Timestamp:
+    """First date a yfinance ``period`` string (``1y``, ``6mo``, ``ytd``, ``max``) reaches back to."""
+    today = (today or pd.Timestamp.today()).normalize()
+    if period == "max":
+        return EARLIEST
+    if period == "ytd":
+        return today.replace(month=1, day=1)
+    match = _PERIOD.match(period)
+    if not match:
+        raise ValueError(f"Unsupported period {period!r}")
+    return today - pd.Timedelta(days=int(match.group(1)) * _PERIOD_DAYS[match.group(2)])
+
+
+def _normalize(frame: pd.DataFrame) -> pd.DataFrame:
+    """OHLCV columns on a tz-naive, sorted, de-duplicated date index."""
+    frame = frame[[c for c in COLUMNS if c in frame.columns]].dropna(how="all")
+    index = pd.DatetimeIndex(frame.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    frame = frame.set_axis(index.normalize().rename("Date"))
+    return frame[~frame.index.duplicated(keep="last")].sort_index()
+
+
+def _anchor(frame: pd.DataFrame) -> pd.Timestamp:
+    """Date of the last stored bar that is certainly complete: the one before the last, which may be intraday."""
+    return frame.index[-2] if len(frame) > 1 else frame.index[-1]
+
+
+class PriceStore:
+    """Arrow IPC file per ticker, with a per-process cache of what was last read."""
+
+    def __init__(self, root: Path = DEFAULT_STORE_PATH, max_age: float = DEFAULT_MAX_AGE):
+        import pyarrow  # noqa: F401  (fail at construction, not at first read)
+
+        self.root = Path(root)
+        self.max_age = max_age
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # One refresh per ticker at a time; a caller that waited then finds the file fresh
+        self._ticker_locks: Dict[str, threading.Lock] = {}
+        self._memo: Dict[str, Tuple[int, pd.DataFrame, pd.Timestamp]] = {}
+        self._counters = {"reads": 0, "fresh": 0, "incremental": 0, "full": 0, "readjusted": 0, "stale_served": 0}
+
+    def _path(self, ticker: str) -> Path:
+        return self.root / (re.sub(r"[^A-Za-z0-9._^=-]", "_", ticker) + ".arrow")
+
+    def read(self, ticker: str) -> Optional[Tuple[pd.DataFrame, pd.Timestamp, float]]:
+        """Stored bars, the earliest date they were requested from, and when they were refreshed.
+
+        None if the file is missing or was written in an older :data:`STORE_FORMAT`.
+        """
+        import pyarrow as pa
+
+        path = self._path(ticker)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self._counters["reads"] += 1
+            memo = self._memo.get(ticker)
+            if memo is not None and memo[0] == stat.st_mtime_ns:
+                return memo[1], memo[2], stat.st_mtime
+        # The table's buffers point into the mapping, which stays open as long as they do
+        table = pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+        meta = json.loads((table.schema.metadata or {}).get(b"price_store", b"{}"))
+        if meta.get("format") != STORE_FORMAT:
+            return None
+        frame = table.drop(["Date"]).to_pandas(split_blocks=True)
+        frame.index = pd.DatetimeIndex(table.column("Date").to_pandas(), name="Date")
+        covers = pd.Timestamp(meta.get("covers_from", frame.index.min() if len(frame) else EARLIEST))
+        with self._lock:
+            self._memo[ticker] = (stat.st_mtime_ns, frame, covers)
+        return frame, covers, stat.st_mtime
+
+    def write(self, ticker: str, frame: pd.DataFrame, covers_from: pd.Timestamp) -> None:
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(frame.reset_index(), preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            b"price_store": json.dumps({"format": STORE_FORMAT, "covers_from": covers_from.isoformat()}).encode(),
+        })
+        path = self._path(ticker)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, path)
+
+    def _touch(self, ticker: str) -> None:
+        """Mark a ticker refreshed when the upstream had no new bars."""
+        try:
+            os.utime(self._path(ticker))
+        except FileNotFoundError:
+            pass
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += n
+
+    def _ticker_lock(self, ticker: str) -> threading.Lock:
+        with self._lock:
+            return self._ticker_locks.setdefault(ticker, threading.Lock())
+
+    def load(self, tickers: Iterable[str], period: str = "1y", max_age: Optional[float] = None) -> FetchResult:
+        """OHLCV for each distinct ticker from ``period_start(period)`` on, refreshing what is stale.
+
+        ``max_age`` overrides the store's refresh age for this call, for
+        callers that want fresher prices than the default.
+        """
+        wanted = list(dict.fromkeys(t.strip() for t in tickers if t and t.strip()))
+        start = period_start(period)
+        max_age = self.max_age if max_age is None else max_age
+        result = FetchResult()
+
+        stored, stale = self._classify(wanted, start, max_age)
+        self._count("fresh", len(wanted) - len(stale))
+        if stale:
+            with ExitStack() as stack:
+                # Sorted, so two callers with overlapping tickers cannot deadlock
+                for ticker in sorted(stale):
+                    stack.enter_context(self._ticker_lock(ticker))
+                # Another session may have refreshed these while this one waited
+                stored, stale = self._classify(wanted, start, max_age)
+                if stale:
+                    stored.update(self._refresh(stale, stored, start, period, result))
+
+        for ticker in wanted:
+            if ticker in stored:
+                result.prices[ticker] = stored[ticker][0].loc[start:]
+        return result
+
+    def _classify(self, tickers: List[str], start: pd.Timestamp, max_age: float) -> Tuple[Dict[str, Tuple[pd.DataFrame, pd.Timestamp]], List[str]]:
+        """Stored entries for ``tickers``, and which of them need a refresh."""
+        stored: Dict[str, Tuple[pd.DataFrame, pd.Timestamp]] = {}
+        stale: List[str] = []
+        now = time.time()
+        for ticker in tickers:
+            try:
+                entry = self.read(ticker)
+            except Exception as e:
+                logger.warning("Unreadable price file for %s, refetching: %s", ticker, e)
+                entry = None
+            if entry is None:
+                stale.append(ticker)
+                continue
+            frame, covers, refreshed = entry
+            stored[ticker] = (frame, covers)
+            if covers > start + COVERAGE_SLACK or now - refreshed > max_age:
+                stale.append(ticker)
+        return stored, stale
+
+    def _refresh(self, stale: List[str], stored: Dict[str, Tuple[pd.DataFrame, pd.Timestamp]],
+                 start: pd.Timestamp, period: str, result: FetchResult) -> Dict[str, Tuple[pd.DataFrame, pd.Timestamp]]:
+        """Fetch what ``stale`` is missing and write it back; returns the updated entries."""
+        updated: Dict[str, Tuple[pd.DataFrame, pd.Timestamp]] = {}
+        incremental = [t for t in stale if t in stored and stored[t][1] <= start + COVERAGE_SLACK and len(stored[t][0])]
+        full = [t for t in stale if t not in incremental]
+
+        if incremental:
+            since = min(_anchor(stored[t][0]) for t in incremental)
+            fetched = fetch_histories(incremental, start=since.strftime("%Y-%m-%d"))
+            for ticker in incremental:
+                frame, covers = stored[ticker]
+                new = fetched.prices.get(ticker)
+                if new is None:
+                    self._count("stale_served")
+                    logger.warning("Serving stored prices for %s: %s", ticker, fetched.errors.get(ticker))
+                    continue
+                new = _normalize(new)
+                anchor = _anchor(frame)
+                if anchor in new.index and abs(new.at[anchor, "Close"] / frame.at[anchor, "Close"] - 1) > ADJUSTMENT_TOLERANCE:
+                    self._count("readjusted")
+                    full.append(ticker)
+                    continue
+                if len(new):
+                    # The re-fetched bars replace stored ones from the same dates (the last bar may have moved)
+                    merged = pd.concat([frame[frame.index < new.index.min()], new])
+                    self.write(ticker, merged, covers)
+                else:
+                    merged = frame
+                    self._touch(ticker)
+                updated[ticker] = (merged, covers)
+                self._count("incremental")
+
+        if full:
+            # Never narrow what a file covers: a 1y request must not replace a stored 5y history
+            covers_from = {t: min(start, stored[t][1]) if t in stored else start for t in full}
+            widest = min(covers_from.values())
+            if widest == start:
+                fetched = fetch_histories(full, period=period)
+            else:
+                fetched = fetch_histories(full, start=widest.strftime("%Y-%m-%d"))
+            for ticker in full:
+                new = fetched.prices.get(ticker)
+                if new is None:
+                    if ticker in stored:
+                        self._count("stale_served")
+                    else:
+                        result.errors[ticker] = fetched.errors.get(ticker, "no price data returned")
+                    continue
+                new = _normalize(new)
+                self.write(ticker, new, covers_from[ticker])
+                updated[ticker] = (new, covers_from[ticker])
+                self._count("full")
+        return updated
+
+    def stats(self) -> Dict[str, int]:
+        """Return read, fresh, incremental, full-refetch and stale-served counts for this process."""
+        with self._lock:
+            return dict(self._counters)
+
+
+_store: Optional[PriceStore] = None
+_store_unavailable = False
+_store_lock = threading.Lock()
+
+
+def get_price_store() -> Optional[PriceStore]:
+    """Return the process-wide store, or None if disabled or pyarrow is not installed."""
+    global _store, _store_unavailable
+    if _store_unavailable or os.getenv("PRICE_STORE_DISABLE", "0") in ("1", "true", "True"):
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                try:
+                    _store = PriceStore(
+                        Path(os.getenv("PRICE_STORE_PATH", str(DEFAULT_STORE_PATH))),
+                        float(os.getenv("PRICE_STORE_MAX_AGE", DEFAULT_MAX_AGE)),
+                    )
+                except ImportError:
+                    logger.warning("pyarrow is not installed; price histories are fetched without the local store")
+                    _store_unavailable = True
+                    return None
+    return _store
+
+
+def load_histories(tickers: Iterable[str], period: str = "1y", max_age: Optional[float] = None) -> FetchResult:
+    """OHLCV for ``tickers`` over ``period``, through the shared store when it is available.
+
+    ``max_age`` is how old stored bars may be before they are refreshed
+    (default ``PRICE_STORE_MAX_AGE``).
+    """
+    store = get_price_store()
+    if store is None:
+        result = fetch_histories(tickers, period=period)
+        result.prices = {ticker: _normalize(frame) for ticker, frame in result.prices.items()}
+        return result
+    return store.load(tickers, period, max_age)
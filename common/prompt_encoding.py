@@ -0,0 +1,176 @@
+"""Compact, token-budgeted rendering of tabular data for prompts.
+
+Data-heavy prompts used to inline ``json.dumps(..., indent=2)`` output or
+free-text lists. That spends tokens on whitespace, quotes and 15-digit
+floats, and every one of those tokens adds prefill latency and cost.
+:func:`render_prompt` renders each :class:`Table` as a CSV-like block with
+rounded numbers and no indentation. It counts the tokens, and if the
+prompt is over the app's budget in :data:`PROMPT_TOKEN_BUDGETS`, it drops
+the lowest-priority rows and collapses them into one summary row.
+
+Token counts come from ``tiktoken`` (``cl100k_base``) when it is
+installed, and from a word-piece estimate otherwise. Before/after counts
+are logged on the ``common.prompt_encoding`` logger at INFO level and kept
+per app in :func:`prompt_stats`.
+"""
+import json
+import logging
+import math
+import numbers
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Maximum prompt tokens per app; apps not listed are rendered compactly but never trimmed
+PROMPT_TOKEN_BUDGETS: Dict[str, int] = {
+    "sector-rotation-screener": 900,
+    "dividend-income-screener": 600,
+}
+
+_WORD_PIECES = re.compile(r"\w+|[^\w\s]")
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # not installed, or the encoding could not be loaded offline
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken if available, else estimate ~4 characters per word piece."""
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return sum(math.ceil(len(piece) / 4) for piece in _WORD_PIECES.findall(text))
+
+
+def compact_value(value: Any, digits: int = 2) -> str:
+    """Render one cell: rounded numbers without trailing zeros, CSV-quoted text."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, numbers.Integral):
+        return str(int(value))
+    if isinstance(value, numbers.Real):
+        value = float(value)
+        if math.isnan(value):
+            return ""
+        text = f"{round(value, digits):.{digits}f}".rstrip("0").rstrip(".")
+        return "0" if text in ("", "-0") else text
+    text = str(value)
+    if any(ch in text for ch in ',"\n'):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+@dataclass
+class Table:
+    """Rows rendered as a CSV-like block under a header line.
+
+    When the prompt is over budget, rows with the lowest ``priority`` are
+    dropped first (from the end if no priority is given). Dropped rows are
+    collapsed into one ``other(n)`` row with the mean of each numeric
+    column, so the model still sees their aggregate.
+    """
+
+    columns: Sequence[str]
+    rows: List[Dict[str, Any]]
+    digits: int = 2
+    priority: Optional[Callable[[Dict[str, Any]], float]] = None
+
+    def _keep_order(self) -> List[int]:
+        indices = list(range(len(self.rows)))
+        if self.priority is not None:
+            indices.sort(key=lambda i: self.priority(self.rows[i]), reverse=True)
+        return indices
+
+    def render(self, keep: Optional[int] = None) -> str:
+        """Render the header and the ``keep`` highest-priority rows, in their original order."""
+        order = self._keep_order()
+        kept = set(order[:keep] if keep is not None else order)
+        lines = [",".join(self.columns)]
+        lines.extend(
+            ",".join(compact_value(self.rows[i].get(col), self.digits) for col in self.columns)
+            for i in range(len(self.rows)) if i in kept
+        )
+        dropped = [self.rows[i] for i in order if i not in kept]
+        if dropped:
+            lines.append(self._summary_row(dropped))
+        return "\n".join(lines)
+
+    def _summary_row(self, dropped: List[Dict[str, Any]]) -> str:
+        cells = [f"other({len(dropped)})"]
+        for col in self.columns[1:]:
+            values = [row.get(col) for row in dropped]
+            numeric = [float(v) for v in values if isinstance(v, numbers.Real) and not isinstance(v, bool)]
+            cells.append(compact_value(sum(numeric) / len(numeric), self.digits) if numeric else "")
+        return ",".join(cells)
+
+    def verbose(self) -> str:
+        """The pretty-printed JSON this table replaces, for before/after accounting.
+
+        Rows are keyed by their first column, the shape apps used to pass to
+        ``json.dumps(..., indent=2)``.
+        """
+        key, rest = self.columns[0], list(self.columns[1:])
+        if len(rest) == 1:
+            data = {str(row.get(key)): row.get(rest[0]) for row in self.rows}
+        else:
+            data = {str(row.get(key)): {col: row.get(col) for col in rest} for row in self.rows}
+        return json.dumps(data, indent=2, default=str)
+
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def render_prompt(app: Optional[str], template: str, tables: Dict[str, Table], **fields: Any) -> str:
+    """Fill ``template`` (``str.format`` syntax) with compact tables, within the app's token budget.
+
+    ``tables`` and ``fields`` are both passed to ``template.format``. Rows
+    are trimmed one at a time from whichever table still has the most,
+    until the prompt fits or every table is down to one row.
+    """
+    budget = PROMPT_TOKEN_BUDGETS.get(app or "")
+    keep = {name: len(table.rows) for name, table in tables.items()}
+
+    def render() -> str:
+        return template.format(**fields, **{name: table.render(keep[name]) for name, table in tables.items()})
+
+    prompt = render()
+    tokens = count_tokens(prompt)
+    while budget is not None and tokens > budget:
+        trimmable = [name for name, n in keep.items() if n > 1]
+        if not trimmable:
+            break
+        keep[max(trimmable, key=lambda name: keep[name])] -= 1
+        prompt = render()
+        tokens = count_tokens(prompt)
+
+    before = count_tokens(template.format(**fields, **{name: table.verbose() for name, table in tables.items()}))
+    trimmed = sum(len(table.rows) - keep[name] for name, table in tables.items())
+    logger.info(
+        "%s prompt: %d -> %d tokens (budget %s, %d rows trimmed)",
+        app or "default", before, tokens, budget if budget is not None else "none", trimmed,
+    )
+    with _stats_lock:
+        stats = _stats.setdefault(app or "default", {
+            "prompts": 0, "tokens_before": 0, "tokens_after": 0, "rows_trimmed": 0, "over_budget": 0,
+        })
+        stats["prompts"] += 1
+        stats["tokens_before"] += before
+        stats["tokens_after"] += tokens
+        stats["rows_trimmed"] += trimmed
+        if budget is not None and tokens > budget:
+            stats["over_budget"] += 1
+    return prompt
+
+
+def prompt_stats() -> Dict[str, Dict[str, int]]:
+    """Return per-app totals of prompt tokens before and after compaction for this process."""
+    with _stats_lock:
+        return {app: dict(stats) for app, stats in _stats.items()}
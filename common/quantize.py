@@ -0,0 +1,114 @@
+"""Input quantization for slider-driven LLM apps.
+
+Many users submit effectively the same request with tiny input differences
+(₹5,10,000 vs ₹5,00,000 income, CIBIL 702 vs 705). Each app declares a
+policy that snaps its inputs to canonical values *before* the prompt is
+built, so near-identical requests render the same prompt and share one
+entry in the response cache.
+
+Bucket directions are chosen so that no bucket straddles a rule threshold:
+``floor`` preserves ``value >= threshold`` rules and ``ceil`` preserves
+``value <= threshold`` rules, as long as the threshold is a multiple of the
+step.
+
+Run ``python -m common.quantize`` to print the resulting cache hit rates.
+"""
+import math
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Set, Tuple
+
+from common import llm_cache
+
+
+@dataclass(frozen=True)
+class Quantizer:
+    """Snap a numeric input to a multiple of ``step``."""
+
+    step: float
+    mode: str = "floor"  # "floor", "ceil" or "round"
+
+    def apply(self, value: Any) -> Any:
+        """Snap ``value``; non-numeric and non-finite values (missing CSV cells) come back unchanged."""
+        if not isinstance(value, (int, float)) or not math.isfinite(value) or self.step <= 0:
+            return value
+        scaled = value / self.step
+        if self.mode == "ceil":
+            buckets = math.ceil(scaled - 1e-9)
+        elif self.mode == "round":
+            buckets = round(scaled)
+        else:
+            buckets = math.floor(scaled + 1e-9)
+        snapped = buckets * self.step
+        if isinstance(value, int) and float(self.step).is_integer():
+            return int(snapped)
+        # Trim float noise such as 1.2000000000000002 so prompts stay identical.
+        return round(snapped, 10)
+
+
+# Per-app policies, keyed by the input names each app passes in.
+QUANTIZATION_POLICIES: Dict[str, Dict[str, Quantizer]] = {
+    "bnpl-eligibility-checker": {
+        # Income rule is ">= ₹3L", a multiple of ₹25k.
+        "income": Quantizer(25000, "floor"),
+        "cibil": Quantizer(10, "floor"),
+    },
+}
+
+
+class _QuantizationStats:
+    """Per-process record of how many distinct inputs collapse into each prompt."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+        self.raw: Dict[str, Set[Tuple]] = {}
+        self.canonical: Dict[str, Set[Tuple]] = {}
+
+    def record(self, app: str, raw: Dict[str, Any], canonical: Dict[str, Any]) -> None:
+        with self._lock:
+            self.requests[app] = self.requests.get(app, 0) + 1
+            self.raw.setdefault(app, set()).add(tuple(sorted(raw.items())))
+            self.canonical.setdefault(app, set()).add(tuple(sorted(canonical.items())))
+
+
+_stats = _QuantizationStats()
+
+
+def quantize_inputs(app: str, inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """Return ``inputs`` with every field covered by the app's policy snapped to its bucket."""
+    policy = QUANTIZATION_POLICIES.get(app, {})
+    canonical = {
+        name: policy[name].apply(value) if name in policy else value
+        for name, value in inputs.items()
+    }
+    _stats.record(app, inputs, canonical)
+    return canonical
+
+
+def quantization_report(app: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Summarise input collapse (this process) and cache hit rate (all processes) per app."""
+    cache = llm_cache.get_cache()
+    cache_stats = cache.stats() if cache is not None else {}
+    apps = [app] if app else sorted(set(QUANTIZATION_POLICIES) | set(_stats.requests))
+    report: Dict[str, Dict[str, Any]] = {}
+    for name in apps:
+        hits = cache_stats.get(name, {}).get("hits", 0)
+        misses = cache_stats.get(name, {}).get("misses", 0)
+        report[name] = {
+            "requests": _stats.requests.get(name, 0),
+            "distinct_inputs": len(_stats.raw.get(name, ())),
+            "distinct_prompts": len(_stats.canonical.get(name, ())),
+            "cache_hits": hits,
+            "cache_misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+    return report
+
+
+if __name__ == "__main__":
+    for name, row in quantization_report().items():
+        print(
+            f"{name:32s} hits={row['cache_hits']:>6} misses={row['cache_misses']:>6} "
+            f"hit_rate={row['hit_rate']:.1%}"
+        )
@@ -0,0 +1,261 @@
+"""Shared rate limiting and adaptive concurrency for the Perplexity key.
+
+Every app sends requests with the same API key, so one app's spike uses up
+the quota for all of them. This module guards each upstream request two
+ways:
+
+- Token buckets for requests/min and tokens/min. They live in a small
+  SQLite file, so every process on the machine draws from the same budget.
+- A per-process AIMD concurrency limit. Each success raises the limit by
+  about one slot per window of requests. A 429 or 5xx halves it, at most
+  once per cooldown. A 429 also empties the shared request bucket, so
+  other processes pause too.
+
+Callers queue for both with a bounded wait. If that wait runs out they get
+:class:`RateLimitTimeout` instead of joining the retry storm.
+
+- ``LLM_RPM``: requests per minute, ``0`` for unlimited (default 50)
+- ``LLM_TPM``: tokens per minute, ``0`` for unlimited (default 100000)
+- ``LLM_MAX_CONCURRENCY``: upper bound for the adaptive limit (default 16)
+- ``LLM_QUEUE_TIMEOUT``: seconds a caller may wait for capacity (default 10)
+- ``LLM_RATE_LIMIT_PATH``: bucket file (default ``~/.cache/llm-powered-apps/rate_limit.sqlite3``)
+- ``LLM_RATE_LIMIT_DISABLE``: set to ``1`` to bypass all of the above
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+
+DEFAULT_LIMIT_PATH = Path.home() / ".cache" / "llm-powered-apps" / "rate_limit.sqlite3"
+
+# Completion size assumed when a request does not set max_tokens
+DEFAULT_COMPLETION_TOKENS = 512
+
+# Statuses that mean the provider is overloaded: back off and retry
+OVERLOAD_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class RateLimitTimeout(TimeoutError):
+    """Raised when no request capacity frees up within the queue timeout."""
+
+
+def estimate_tokens(payload: Dict[str, Any]) -> int:
+    """Rough token cost of a request: ~4 characters per prompt token plus the completion budget."""
+    prompt_chars = len(json.dumps(payload.get("messages", []), ensure_ascii=False))
+    return prompt_chars // 4 + int(payload.get("max_tokens") or DEFAULT_COMPLETION_TOKENS)
+
+
+class TokenBuckets:
+    """Requests/min and tokens/min buckets shared across processes via SQLite."""
+
+    def __init__(self, path: Path, rpm: float, tpm: float):
+        self.path = Path(path)
+        self.rates = {"requests": rpm / 60.0, "tokens": tpm / 60.0}
+        self.capacity = {"requests": float(rpm), "tokens": float(tpm)}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=10, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _levels(self, now: float) -> Dict[str, float]:
+        levels = {}
+        for name, capacity in self.capacity.items():
+            row = self._conn.execute("SELECT level, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+            level = capacity if row is None else min(capacity, row[0] + (now - row[1]) * self.rates[name])
+            levels[name] = level
+        return levels
+
+    def _store(self, levels: Dict[str, float], now: float) -> None:
+        for name, level in levels.items():
+            self._conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)", (name, level, now)
+            )
+
+    def try_take(self, tokens: int) -> float:
+        """Take one request and ``tokens`` tokens; return 0, or seconds to wait before retrying."""
+        need = {"requests": 1.0, "tokens": float(tokens)}
+        with self._lock:
+            now = time.time()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                levels = self._levels(now)
+                wait = 0.0
+                for name, capacity in self.capacity.items():
+                    if capacity <= 0:
+                        continue
+                    # A request bigger than the whole bucket waits for a full bucket
+                    amount = min(need[name], capacity)
+                    if levels[name] < amount:
+                        wait = max(wait, (amount - levels[name]) / self.rates[name])
+                if wait == 0.0:
+                    for name, capacity in self.capacity.items():
+                        if capacity > 0:
+                            levels[name] -= min(need[name], capacity)
+                    self._store(levels, now)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return wait
+
+    def _update(self, name: str, change: Callable[[float], float]) -> None:
+        if self.capacity.get(name, 0) <= 0:
+            return
+        with self._lock:
+            now = time.time()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                levels = self._levels(now)
+                levels[name] = min(self.capacity[name], change(levels[name]))
+                self._store(levels, now)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def adjust(self, name: str, delta: float) -> None:
+        """Add ``delta`` to a bucket (negative to charge more), e.g. after real token usage is known."""
+        self._update(name, lambda level: level + delta)
+
+    def drain(self, name: str) -> None:
+        """Empty a bucket so every process pauses until it refills."""
+        self._update(name, lambda level: min(level, 0.0))
+
+
+class AdaptiveConcurrency:
+    """Per-process AIMD limit on concurrent upstream requests."""
+
+    def __init__(self, max_limit: int, min_limit: int = 1, cooldown: float = 2.0):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.cooldown = cooldown
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, deadline: float) -> bool:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, overloaded: Optional[bool]) -> None:
+        """Free a slot; ``overloaded`` is True on 429/5xx, False on success, None if unknown."""
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if overloaded:
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.min_limit, self.limit / 2)
+                    self._last_decrease = now
+            elif overloaded is not None:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+
+class RateLimiter:
+    """Token buckets plus adaptive concurrency, with a bounded queueing wait."""
+
+    def __init__(self, buckets: TokenBuckets, concurrency: AdaptiveConcurrency, queue_timeout: float):
+        self.buckets = buckets
+        self.concurrency = concurrency
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "throttled": 0, "server_errors": 0, "queue_timeouts": 0, "wait_seconds": 0.0}
+
+    def _count(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    @contextmanager
+    def slot(self, tokens: int) -> Iterator["Slot"]:
+        """Wait for capacity, then hold a concurrency slot for the request.
+
+        Raises :class:`RateLimitTimeout` if none frees up within the queue timeout.
+        """
+        started = time.monotonic()
+        deadline = started + self.queue_timeout
+        if not self.concurrency.acquire(deadline):
+            self._count("queue_timeouts")
+            raise RateLimitTimeout(f"LLM capacity busy: no request slot within {self.queue_timeout:.0f}s, try again shortly")
+        slot = Slot(self, tokens)
+        try:
+            while True:
+                wait = self.buckets.try_take(tokens)
+                if wait == 0:
+                    break
+                if time.monotonic() + wait > deadline:
+                    self._count("queue_timeouts")
+                    raise RateLimitTimeout(f"LLM rate limit reached: no quota within {self.queue_timeout:.0f}s, try again shortly")
+                time.sleep(wait)
+            self._count("requests")
+            self._count("wait_seconds", time.monotonic() - started)
+            yield slot
+        finally:
+            self.concurrency.release(slot.overloaded)
+
+    def stats(self) -> Dict[str, float]:
+        """Return request/throttle counters and the current concurrency limit for this process."""
+        with self._lock:
+            stats = dict(self._counters)
+        stats.update({"concurrency_limit": int(self.concurrency.limit), "in_flight": self.concurrency.in_flight})
+        return stats
+
+
+class Slot:
+    """Feedback handle for one request held in a :meth:`RateLimiter.slot`."""
+
+    def __init__(self, limiter: RateLimiter, tokens: int):
+        self._limiter = limiter
+        self.tokens = tokens
+        self.overloaded: Optional[bool] = None
+
+    def observe(self, status_code: int) -> None:
+        """Report the upstream status so the concurrency limit can adapt."""
+        self.overloaded = status_code in OVERLOAD_STATUSES
+        if status_code == 429:
+            self._limiter._count("throttled")
+            self._limiter.buckets.drain("requests")
+        elif self.overloaded:
+            self._limiter._count("server_errors")
+
+    def record_usage(self, total_tokens: Optional[int]) -> None:
+        """Correct the tokens/min bucket once the response reports its real usage."""
+        if total_tokens is not None:
+            self._limiter.buckets.adjust("tokens", self.tokens - total_tokens)
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """Return the process-wide limiter, or None when rate limiting is disabled."""
+    global _limiter
+    if os.getenv("LLM_RATE_LIMIT_DISABLE", "0") in ("1", "true", "True"):
+        return None
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter(
+                    TokenBuckets(
+                        Path(os.getenv("LLM_RATE_LIMIT_PATH", str(DEFAULT_LIMIT_PATH))),
+                        float(os.getenv("LLM_RPM", "50")),
+                        float(os.getenv("LLM_TPM", "100000")),
+                    ),
+                    AdaptiveConcurrency(int(os.getenv("LLM_MAX_CONCURRENCY", "16"))),
+                    float(os.getenv("LLM_QUEUE_TIMEOUT", "10")),
+                )
+    return _limiter
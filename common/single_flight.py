@@ -0,0 +1,90 @@
+"""Single-flight coalescing of identical in-flight LLM requests.
+
+When many sessions send the same request at once, for example everyone
+pressing "Generate AI Rotation" right after a market move, only the first
+caller (the leader) goes upstream. Callers that arrive while it is in
+flight wait on its future and receive a copy of the same response, or the
+same exception.
+
+Coalescing is per process and only spans requests that overlap in time;
+the response cache in :mod:`common.llm_cache` covers repeats after the
+leader finishes. Set ``LLM_SINGLE_FLIGHT=0`` to turn it off.
+"""
+import copy
+import os
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Optional
+
+
+class SingleFlight:
+    """Run at most one call per key at a time and share its outcome."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, app: Optional[str], name: str) -> None:
+        counters = self._counters.setdefault(app or "default", {"leaders": 0, "coalesced": 0})
+        counters[name] += 1
+
+    def do(self, key: str, fn: Callable[[], Any], app: Optional[str] = None, timeout: Optional[float] = None) -> Any:
+        """Return ``fn()``, or the result of an identical call already in flight.
+
+        Followers wait at most ``timeout`` seconds for the leader and raise
+        :class:`TimeoutError` after that; the leader is bounded by its own
+        request timeout.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+            self._count(app, "leaders" if leader else "coalesced")
+
+        if not leader:
+            try:
+                result = future.result(timeout)
+            except FutureTimeout:
+                raise TimeoutError(f"Identical in-flight request did not finish within {timeout:g}s")
+            # Each follower gets its own copy so callers can't mutate each other's response
+            return copy.deepcopy(result)
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._inflight)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return leader/coalesced counters per app for this process."""
+        with self._lock:
+            return {app: dict(counters) for app, counters in self._counters.items()}
+
+
+_flights: Optional[SingleFlight] = None
+_flights_lock = threading.Lock()
+
+
+def get_single_flight() -> Optional[SingleFlight]:
+    """Return the process-wide SingleFlight, or None if disabled."""
+    global _flights
+    if os.getenv("LLM_SINGLE_FLIGHT", "1") in ("0", "false", "False"):
+        return None
+    if _flights is None:
+        with _flights_lock:
+            if _flights is None:
+                _flights = SingleFlight()
+    return _flights
@@ -0,0 +1,187 @@
+"""Schema-enforced structured outputs for the JSON-returning apps.
+
+Each app declares its response once, as a pydantic v2 model. The model is
+used in two places:
+
+- :func:`response_format` turns it into the ``json_schema``
+  ``response_format`` that the API enforces while it generates.
+- :func:`parse_response` validates the reply with pydantic's compiled
+  validator, so app code reads typed attributes instead of ``.get`` chains.
+
+A reply that fails validation is first repaired locally with
+:func:`common.json_repair.repair_json`. If that fails too, a short "fix
+this JSON" request goes to a fast model with the validation errors. Each
+path is counted with :func:`common.telemetry.record_parse_outcome`. A
+reply that none of them can fix raises :class:`StructuredOutputError`.
+
+Only replies that validate as sent, or after the local repair, go into the
+response cache (see :func:`validates_as`). A reply that needed a re-ask
+is not stored, so a cache hit never starts with a broken reply.
+
+- ``LLM_REPAIR_REASK``: set to ``0`` to skip the follow-up request (default on)
+- ``LLM_REPAIR_MODEL``: model for the follow-up request (default ``sonar``)
+- ``LLM_REPAIR_TIMEOUT``: deadline in seconds for the follow-up request (default 15)
+
+A ``timeout`` passed to :func:`structured_completion` covers the follow-up
+request too: it gets only what is left of the deadline, and is skipped
+when nothing is left.
+"""
+import os
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+from common.json_repair import repair_json
+from common.llm_gateway import chat_completion, completion_text
+from common.telemetry import record_parse_outcome
+
+M = TypeVar("M", bound=BaseModel)
+
+REASK_PROMPT = """This JSON does not match the required schema.
+
+Errors:
+{errors}
+
+JSON:
+{text}
+
+Return only the corrected JSON. Keep every value that is already valid."""
+
+
+class StructuredOutputError(ValueError):
+    """Raised when an LLM reply does not match the app's response model."""
+
+
+def _inline_refs(node: Any, defs: Dict[str, Any]) -> Any:
+    if isinstance(node, dict):
+        if "$ref" in node:
+            return _inline_refs(defs[node["$ref"].rsplit("/", 1)[-1]], defs)
+        return {key: _inline_refs(value, defs) for key, value in node.items() if key != "$defs"}
+    if isinstance(node, list):
+        return [_inline_refs(value, defs) for value in node]
+    return node
+
+
+@lru_cache(maxsize=None)
+def _schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    schema = model.model_json_schema()
+    return _inline_refs(schema, schema.get("$defs", {}))
+
+
+def response_format(model: Type[BaseModel]) -> Dict[str, Any]:
+    """``response_format`` that makes the API return JSON matching ``model``.
+
+    Nested models are inlined, because the API does not resolve ``$defs``.
+    """
+    return {"type": "json_schema", "json_schema": {"name": model.__name__, "schema": _schema(model)}}
+
+
+def _validate_repaired(text: str, model: Type[M]) -> M:
+    return model.model_validate(repair_json(text))
+
+
+def validates_as(model: Type[BaseModel]) -> Callable[[Dict[str, Any]], bool]:
+    """``cacheable`` check for the gateway: the reply parses as ``model``, as sent or after local repair."""
+    def check(response: Dict[str, Any]) -> bool:
+        try:
+            text = completion_text(response)
+            try:
+                model.model_validate_json(text)
+            except ValidationError:
+                _validate_repaired(text, model)
+        except (RuntimeError, ValueError):
+            return False
+        return True
+    return check
+
+
+def _reask(
+    text: str, error: Exception, model: Type[M], app: Optional[str], api_key: Optional[str], timeout: float
+) -> M:
+    """Ask a fast model to fix ``text`` against the schema, given the validation errors."""
+    response = chat_completion(
+        [{"role": "user", "content": REASK_PROMPT.format(errors=str(error)[:1500], text=text)}],
+        model=os.getenv("LLM_REPAIR_MODEL", "sonar"),
+        app=app,
+        api_key=api_key,
+        temperature=0,
+        max_tokens=max(512, len(text) // 2),
+        response_format=response_format(model),
+        timeout=timeout,
+        cache_ttl=0,
+    )
+    reply = completion_text(response)
+    try:
+        return model.model_validate_json(reply)
+    except ValidationError:
+        return _validate_repaired(reply, model)
+
+
+def parse_response(
+    text: str,
+    model: Type[M],
+    app: Optional[str] = None,
+    llm_model: Optional[str] = None,
+    api_key: Optional[str] = None,
+    reask: bool = True,
+    reask_timeout: Optional[float] = None,
+) -> M:
+    """Validate an LLM reply against ``model``, repairing it if needed.
+
+    Tries the reply as is, then a local repair. If both fail and ``reask``
+    is on, it sends one follow-up request, bounded by ``LLM_REPAIR_TIMEOUT``
+    and by ``reask_timeout`` (the caller's remaining deadline) if given.
+    """
+    try:
+        result = model.model_validate_json(text)
+    except ValidationError as e:
+        error: Exception = e
+    else:
+        record_parse_outcome(app, llm_model, "valid")
+        return result
+
+    try:
+        result = _validate_repaired(text, model)
+    except ValueError as e:
+        error = e
+    else:
+        record_parse_outcome(app, llm_model, "repaired")
+        return result
+
+    timeout = float(os.getenv("LLM_REPAIR_TIMEOUT", "15"))
+    if reask_timeout is not None:
+        timeout = min(timeout, reask_timeout)
+    if reask and timeout > 0 and os.getenv("LLM_REPAIR_REASK", "1") not in ("0", "false", "False"):
+        try:
+            result = _reask(text, error, model, app, api_key, timeout)
+        except Exception:
+            # The follow-up call's own failure is already in the call telemetry;
+            # the original defect is the more useful error to surface
+            pass
+        else:
+            record_parse_outcome(app, llm_model, "reasked", error)
+            return result
+
+    record_parse_outcome(app, llm_model, "failed", error)
+    raise StructuredOutputError(f"LLM response does not match {model.__name__}: {error}") from error
+
+
+def structured_completion(
+    messages: List[Dict[str, str]], *, model: str, response_model: Type[M], app: Optional[str] = None, **kwargs: Any
+) -> M:
+    """:func:`common.llm_gateway.chat_completion` with ``response_model`` enforced and validated.
+
+    ``timeout`` bounds the whole call, including any follow-up repair request.
+    """
+    timeout = kwargs.get("timeout")
+    end = time.monotonic() + timeout if timeout is not None else None
+    kwargs.setdefault("cacheable", validates_as(response_model))
+    response = chat_completion(messages, model=model, app=app, response_format=response_format(response_model), **kwargs)
+    # A routed call reports the model it actually went to
+    llm_model = response.get("model") or model
+    return parse_response(
+        completion_text(response), response_model, app, llm_model, api_key=kwargs.get("api_key"),
+        reask_timeout=end - time.monotonic() if end is not None else None,
+    )
@@ -0,0 +1,338 @@
+"""Per-app telemetry for LLM calls.
+
+:mod:`common.llm_gateway` records every call with its app, model, outcome,
+total latency, time to first token (streams only) and the prompt/completion
+tokens from ``response.usage``. How each reply's JSON was parsed is
+counted with :func:`record_parse_outcome`: ``valid`` as received,
+``repaired`` locally, ``reasked`` (fixed by a follow-up request) or ``failed``.
+
+Outcomes are ``upstream``, ``cache_hit``, ``coalesced`` (served by an
+identical in-flight call), ``stale`` (expired cache entry after a missed
+deadline), ``deadline_exceeded``, ``first_token_timeout``, ``rate_limited``
+and ``error``. Latency percentiles leave out cache hits. Only calls that
+reached the provider count towards tokens.
+
+The data is exported three ways:
+
+- a Prometheus text endpoint on ``/metrics``, when ``LLM_METRICS_PORT`` is set
+- a rolling JSONL log with one line per call
+- :func:`render_diagnostics`, a sidebar panel with p50/p95/p99 per app
+  and the model router's choices
+
+Counters and percentiles are per process. The JSONL log is shared by every
+process that writes to the same path.
+
+- ``LLM_TELEMETRY_LOG``: JSONL path (default ``~/.cache/llm-powered-apps/telemetry.jsonl``), empty to disable
+- ``LLM_TELEMETRY_LOG_MAX_BYTES``: size at which the log rolls over, keeping 3 old files (default 10 MiB)
+- ``LLM_METRICS_PORT``: serve ``/metrics`` on this port (default off)
+- ``LLM_DIAGNOSTICS``: set to ``0`` to hide the in-app panel
+- ``LLM_TELEMETRY_DISABLE``: set to ``1`` to turn all of the above off
+"""
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from common.model_router import get_router
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOG_PATH = Path.home() / ".cache" / "llm-powered-apps" / "telemetry.jsonl"
+DEFAULT_LOG_MAX_BYTES = 10 * 1024 * 1024
+
+OUTCOMES = (
+    "upstream", "cache_hit", "coalesced", "stale",
+    "deadline_exceeded", "first_token_timeout", "rate_limited", "error",
+)
+FAILURE_OUTCOMES = frozenset({"deadline_exceeded", "first_token_timeout", "rate_limited", "error"})
+PARSE_OUTCOMES = ("valid", "repaired", "reasked", "failed")
+
+# Latency samples kept per (app, model) for percentiles
+WINDOW = 1000
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _quantile(samples: List[float], q: float) -> Optional[float]:
+    """``q`` quantile of already-sorted samples, or None if there are none."""
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+@dataclass
+class _Series:
+    """Counters and recent latencies for one (app, model)."""
+
+    outcomes: Dict[str, int] = field(default_factory=lambda: dict.fromkeys(OUTCOMES, 0))
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency: Deque[float] = field(default_factory=lambda: deque(maxlen=WINDOW))
+    latency_sum: float = 0.0
+    latency_count: int = 0
+    ttft: Deque[float] = field(default_factory=lambda: deque(maxlen=WINDOW))
+    ttft_sum: float = 0.0
+    ttft_count: int = 0
+
+
+class Telemetry:
+    """Thread-safe store of LLM call records for this process."""
+
+    def __init__(self, log_path: Optional[Path] = None, log_max_bytes: int = DEFAULT_LOG_MAX_BYTES):
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._parse_outcomes: Dict[str, Dict[str, int]] = {}
+        self._log: Optional[logging.Logger] = None
+        if log_path is not None:
+            Path(log_path).parent.mkdir(parents=True, exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                str(log_path), maxBytes=log_max_bytes, backupCount=3, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            # A private logger, so app logging config never routes or duplicates these lines
+            self._log = logging.Logger("llm-telemetry")
+            self._log.addHandler(handler)
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        if self._log is not None:
+            self._log.info(json.dumps(entry, ensure_ascii=False))
+
+    def record(
+        self,
+        app: Optional[str],
+        model: str,
+        outcome: str,
+        latency: float,
+        ttft: Optional[float] = None,
+        usage: Optional[Dict[str, Any]] = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """Record one call. ``usage`` is the response's ``usage`` object, if it reached the provider."""
+        usage = usage or {}
+        prompt_tokens = int(usage.get("prompt_tokens") or 0)
+        completion_tokens = int(usage.get("completion_tokens") or 0)
+        with self._lock:
+            series = self._series.setdefault((app or "default", model), _Series())
+            series.outcomes[outcome] += 1
+            series.prompt_tokens += prompt_tokens
+            series.completion_tokens += completion_tokens
+            if outcome != "cache_hit":
+                series.latency.append(latency)
+                series.latency_sum += latency
+                series.latency_count += 1
+            if ttft is not None:
+                series.ttft.append(ttft)
+                series.ttft_sum += ttft
+                series.ttft_count += 1
+        self._write({
+            "ts": round(time.time(), 3),
+            "app": app or "default",
+            "model": model,
+            "outcome": outcome,
+            "latency_s": round(latency, 4),
+            "ttft_s": round(ttft, 4) if ttft is not None else None,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "error": f"{type(error).__name__}: {error}"[:300] if error is not None else None,
+        })
+
+    def record_parse(self, app: Optional[str], model: Optional[str], outcome: str,
+                     error: Optional[BaseException] = None) -> None:
+        """Count how a reply's JSON was parsed; one of :data:`PARSE_OUTCOMES`."""
+        with self._lock:
+            self._parse_outcomes.setdefault(app or "default", dict.fromkeys(PARSE_OUTCOMES, 0))[outcome] += 1
+        if outcome == "valid":
+            return
+        self._write({
+            "ts": round(time.time(), 3),
+            "app": app or "default",
+            "model": model,
+            "outcome": f"parse_{outcome}",
+            "error": f"{type(error).__name__}: {error}"[:300] if error is not None else None,
+        })
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per-app call counts, tokens and latency percentiles (all models combined)."""
+        with self._lock:
+            grouped: Dict[str, List[_Series]] = {}
+            for (app, _), series in self._series.items():
+                grouped.setdefault(app, []).append(series)
+            latencies = {app: sorted(x for s in group for x in s.latency) for app, group in grouped.items()}
+            ttfts = {app: sorted(x for s in group for x in s.ttft) for app, group in grouped.items()}
+            outcomes = {
+                app: {name: sum(s.outcomes[name] for s in group) for name in OUTCOMES}
+                for app, group in grouped.items()
+            }
+            tokens = {
+                app: (sum(s.prompt_tokens for s in group), sum(s.completion_tokens for s in group))
+                for app, group in grouped.items()
+            }
+            parse_outcomes = {app: dict(counts) for app, counts in self._parse_outcomes.items()}
+
+        summary: Dict[str, Dict[str, Any]] = {}
+        for app in sorted(set(outcomes) | set(parse_outcomes)):
+            parsed = parse_outcomes.get(app, dict.fromkeys(PARSE_OUTCOMES, 0))
+            counts = outcomes.get(app, dict.fromkeys(OUTCOMES, 0))
+            row: Dict[str, Any] = {
+                "calls": sum(counts.values()),
+                "upstream": counts["upstream"],
+                "cache_hit": counts["cache_hit"],
+                "coalesced": counts["coalesced"],
+                "stale": counts["stale"],
+                "failed": sum(counts[name] for name in FAILURE_OUTCOMES),
+                "json_repaired": parsed["repaired"],
+                "json_reasked": parsed["reasked"],
+                "parse_failures": parsed["failed"],
+            }
+            for q in QUANTILES:
+                value = _quantile(latencies.get(app, []), q)
+                row[f"p{int(q * 100)}_s"] = round(value, 3) if value is not None else None
+            ttft = _quantile(ttfts.get(app, []), 0.5)
+            row["ttft_p50_s"] = round(ttft, 3) if ttft is not None else None
+            row["prompt_tokens"], row["completion_tokens"] = tokens.get(app, (0, 0))
+            summary[app] = row
+        return summary
+
+    def prometheus_text(self) -> str:
+        """Render all series in the Prometheus text exposition format."""
+        with self._lock:
+            snapshot = {
+                key: {
+                    "outcomes": dict(s.outcomes),
+                    "tokens": {"prompt": s.prompt_tokens, "completion": s.completion_tokens},
+                    "llm_request_latency_seconds": (sorted(s.latency), s.latency_sum, s.latency_count),
+                    "llm_time_to_first_token_seconds": (sorted(s.ttft), s.ttft_sum, s.ttft_count),
+                }
+                for key, s in sorted(self._series.items())
+            }
+            parse_outcomes = {app: dict(counts) for app, counts in sorted(self._parse_outcomes.items())}
+
+        lines = ["# HELP llm_requests_total LLM calls by outcome.", "# TYPE llm_requests_total counter"]
+        for (app, model), data in snapshot.items():
+            for outcome, count in data["outcomes"].items():
+                lines.append(f"llm_requests_total{_labels(app=app, model=model, outcome=outcome)} {count}")
+
+        lines += ["# HELP llm_tokens_total Tokens reported by the provider.", "# TYPE llm_tokens_total counter"]
+        for (app, model), data in snapshot.items():
+            for kind, count in data["tokens"].items():
+                lines.append(f"llm_tokens_total{_labels(app=app, model=model, kind=kind)} {count}")
+
+        lines += ["# HELP llm_parse_outcomes_total How LLM replies were parsed: valid, repaired, reasked or failed.",
+                  "# TYPE llm_parse_outcomes_total counter"]
+        for app, counts in parse_outcomes.items():
+            for outcome, count in counts.items():
+                lines.append(f"llm_parse_outcomes_total{_labels(app=app, outcome=outcome)} {count}")
+
+        for name, help_text in (
+            ("llm_request_latency_seconds", "Wall-clock latency of LLM calls, excluding cache hits."),
+            ("llm_time_to_first_token_seconds", "Time to the first streamed token."),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} summary"]
+            for (app, model), data in snapshot.items():
+                samples, total, count = data[name]
+                if not count:
+                    continue
+                for q in QUANTILES:
+                    lines.append(f"{name}{_labels(app=app, model=model, quantile=str(q))} {_quantile(samples, q):.6f}")
+                lines.append(f"{name}_sum{_labels(app=app, model=model)} {total:.6f}")
+                lines.append(f"{name}_count{_labels(app=app, model=model)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(**labels: Any) -> str:
+    def escape(value: Any) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def serve_metrics(telemetry: Telemetry, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve ``GET /metrics`` for ``telemetry`` on a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?")[0].rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = telemetry.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="llm-metrics", daemon=True).start()
+    return server
+
+
+_telemetry: Optional[Telemetry] = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry() -> Optional[Telemetry]:
+    """Return the process-wide telemetry, or None when disabled. Starts ``/metrics`` on first use if configured."""
+    global _telemetry
+    if os.getenv("LLM_TELEMETRY_DISABLE", "0") in ("1", "true", "True"):
+        return None
+    if _telemetry is None:
+        with _telemetry_lock:
+            if _telemetry is None:
+                log_path = os.getenv("LLM_TELEMETRY_LOG", str(DEFAULT_LOG_PATH))
+                telemetry = Telemetry(
+                    Path(log_path) if log_path else None,
+                    int(os.getenv("LLM_TELEMETRY_LOG_MAX_BYTES", DEFAULT_LOG_MAX_BYTES)),
+                )
+                port = os.getenv("LLM_METRICS_PORT")
+                if port:
+                    try:
+                        serve_metrics(telemetry, int(port))
+                    except OSError as e:
+                        # Another app on this machine already has the port
+                        logger.warning("LLM metrics endpoint not started on port %s: %s", port, e)
+                _telemetry = telemetry
+    return _telemetry
+
+
+def record_parse_outcome(app: Optional[str], model: Optional[str], outcome: str,
+                         error: Optional[BaseException] = None) -> None:
+    """Count how an LLM reply's JSON was parsed: ``valid``, ``repaired``, ``reasked`` or ``failed``."""
+    telemetry = get_telemetry()
+    if telemetry is not None:
+        telemetry.record_parse(app, model, outcome, error)
+
+
+def render_diagnostics(app: Optional[str] = None) -> None:
+    """Sidebar expander with latency percentiles, tokens and cache outcomes for this process."""
+    import streamlit as st
+
+    telemetry = get_telemetry()
+    if telemetry is None or os.getenv("LLM_DIAGNOSTICS", "1") in ("0", "false", "False"):
+        return
+    summary = telemetry.summary()
+    if app is not None:
+        summary = {name: row for name, row in summary.items() if name == app}
+    with st.sidebar.expander("🩺 LLM diagnostics", expanded=False):
+        if not summary:
+            st.caption("No LLM calls in this process yet.")
+            return
+        st.dataframe([{"app": name, **row} for name, row in summary.items()], hide_index=True, use_container_width=True)
+        st.caption("Latency percentiles exclude cache hits. Counts reset when the app restarts.")
+        routing = {name: row for name, row in get_router().stats().items() if app is None or name == app}
+        if routing:
+            st.dataframe(
+                [{"app": name, **{f"→ {model}": n for model, n in row.pop("routed").items()}, **row}
+                 for name, row in routing.items()],
+                hide_index=True, use_container_width=True,
+            )
+            st.caption("Model routing: calls per model, and how often shadow replies from the other model agreed.")
@@ -1,12 +1,22 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from openai import OpenAI
 import os
+import sys
+import uuid
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from common.deadlines import DeadlineExceeded
+from common.llm_gateway import chat_completion, completion_text
+from common.prefetch import get_prefetcher
+from common.prompt_encoding import Table, render_prompt
+from common.telemetry import render_diagnostics
 
 st.set_page_config(page_title="💰 Dividend Income Screener", page_icon="💰", layout="wide")
 
-client = OpenAI(api_key=os.getenv("PERPLEXITY_API_KEY", ""), base_url="https://api.perplexity.ai")
+PERPLEXITY_API_KEY = os.getenv("PERPLEXITY_API_KEY", "")
 
 DIVIDEND_STOCKS = {
     "Banking & Finance": {
@@ -39,6 +49,34 @@ DIVIDEND_STOCKS = {
 
 TAX_SLABS = {"Upto 2.5L": 0, "2.5L - 5L": 5, "5L - 10L": 20, "Above 10L": 30}
 
+
+def build_insights_prompt(filtered_stocks, monthly_income, investment_amount, sector, yield_min, yield_max,
+                          min_years, total_annual, coverage, net_income):
+    # Highest yields are kept first if the stock table exceeds the token budget
+    stock_table = Table(
+        ["ticker", "name", "yield_pct", "years"],
+        [{"ticker": t, "name": d["name"], "yield_pct": d["yield"], "years": d["consecutive"]} for t, d in filtered_stocks.items()],
+        digits=1,
+        priority=lambda row: row["yield_pct"],
+    )
+    return render_prompt("dividend-income-screener", """Based on dividend stock screening:
+CRITERIA: Monthly Target: ₹{monthly_income:,}, Investment: ₹{investment_amount:,}, Sector: {sector}, Yield: {yield_min}-{yield_max}%, Min Years: {min_years}
+STOCKS:
+{stocks}
+METRICS: Annual Income: ₹{total_annual:,.0f}, Coverage: {coverage:.1f}%, After-Tax: ₹{net_income:,.0f}
+Provide: 1. Stock rationale 2. Diversification 3. Tax strategies 4. Rebalancing 5. Risk factors 6. Alternatives. Include RBI/SEBI compliance.""",
+        {"stocks": stock_table},
+        monthly_income=monthly_income, investment_amount=investment_amount, sector=sector,
+        yield_min=yield_min, yield_max=yield_max, min_years=min_years,
+        total_annual=total_annual, coverage=coverage, net_income=net_income,
+    )
+
+
+def fetch_insights(prompt):
+    response = chat_completion([{"role": "user", "content": prompt}], model="sonar", app="dividend-income-screener", api_key=PERPLEXITY_API_KEY, max_tokens=1200)
+    return completion_text(response)
+
+
 st.title("💰 Dividend Income Screener")
 st.markdown("**AI-Powered Income Screening & Portfolio Composition Tool**")
 
@@ -52,6 +90,10 @@ min_years = st.sidebar.slider("Min Consecutive Dividend Years", 1, 60, 5)
 consistency_filter = st.sidebar.checkbox("Apply Consistency Filter", True)
 investment_amount = st.sidebar.number_input("Investment Amount (₹)", 50000, 10000000, 500000, 50000)
 tax_slab = st.sidebar.selectbox("Tax Slab", list(TAX_SLABS.keys()))
+prefetch_insights = st.sidebar.checkbox(
+    "⚡ Prefetch AI Insights", False,
+    help="Start the AI analysis in the background once the portfolio stops changing, so it appears instantly on click."
+)
 
 filtered_stocks = {}
 for ticker, details in DIVIDEND_STOCKS[sector].items():
@@ -117,17 +159,23 @@ if filtered_stocks:
     st.markdown("---")
     st.subheader("🤖 AI-Powered Recommendations")
     
+    prompt = build_insights_prompt(filtered_stocks, monthly_income, investment_amount, sector, yield_min, yield_max,
+                                   min_years, total_annual, coverage, net_income)
+    prefetcher = get_prefetcher() if prefetch_insights and PERPLEXITY_API_KEY else None
+    session_id = st.session_state.setdefault("prefetch_session", uuid.uuid4().hex)
+    if prefetcher is not None:
+        # A changed prompt restarts the debounce, so only a portfolio the user has settled on is sent
+        prefetcher.speculate("dividend-income-screener", session_id, prompt, lambda: fetch_insights(prompt))
+    
     if st.button("Generate AI Insights", type="primary"):
         with st.spinner("Analyzing portfolio with AI..."):
             try:
-                prompt = f"""Based on dividend stock screening:
-CRITERIA: Monthly Target: ₹{monthly_income:,}, Investment: ₹{investment_amount:,}, Sector: {sector}, Yield: {yield_min}-{yield_max}%, Min Years: {min_years}
-STOCKS: {', '.join([f"{t}: {d['name']} ({d['yield']}%)" for t, d in list(filtered_stocks.items())[:5]])}
-METRICS: Annual Income: ₹{total_annual:,.0f}, Coverage: {coverage:.1f}%, After-Tax: ₹{net_income:,.0f}
-Provide: 1. Stock rationale 2. Diversification 3. Tax strategies 4. Rebalancing 5. Risk factors 6. Alternatives. Include RBI/SEBI compliance."""
-                response = client.messages.create(model="sonar", messages=[{"role": "user", "content": prompt}], max_tokens=1200)
+                prefetched = prefetcher.take("dividend-income-screener", session_id, prompt) if prefetcher is not None else None
+                insights = prefetched.result() if prefetched is not None else fetch_insights(prompt)
                 st.success("AI Analysis Generated")
-                st.markdown(response.choices[0].message.content)
+                st.markdown(insights)
+            except DeadlineExceeded:
+                st.info("AI insights are taking longer than usual. The screening results above are complete; try again in a minute.")
             except Exception as e:
                 st.error(f"LLM Analysis Error: {str(e)}")
                 st.info("Fallback: Use manual analysis from portfolio metrics.")
@@ -142,3 +190,5 @@ st.markdown("""### 📋 Important Disclaimers
 - **Market Volatility**: Stock prices fluctuate; past yields don't guarantee future returns
 - **RBI/SEBI Compliance**: Follow all regulatory requirements for investments
 """)
+
+render_diagnostics("dividend-income-screener")
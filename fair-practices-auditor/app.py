@@ -1,7 +1,51 @@
 import streamlit as st
-import json
-from openai import OpenAI
-import re
+import sys
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from common.telemetry import render_diagnostics
+from narrative import fetch_narrative
+from rules import evaluate_loan_terms
+
+# Seconds to wait for the optional LLM citations before giving up on them
+NARRATIVE_TIMEOUT = 30
+
+@st.cache_resource
+def get_narrative_pool():
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="fpa-narrative")
+
+def show_audit(fee_slot, penalty_slot, verdict_slot, fields):
+    """Fill the audit panels from the audit fields."""
+    if "processing_fee_compliant" in fields:
+        with fee_slot.container():
+            fee_status = "✅ Compliant" if fields["processing_fee_compliant"] else "❌ Non-compliant (>1%)"
+            st.metric("Processing Fee", f"₹{fields.get('processing_fee_absolute', 0):,.0f}", f"{processing_fee_pct}%")
+            if fields["processing_fee_compliant"]:
+                st.success(fee_status)
+            else:
+                st.error(fee_status)
+
+    if "prepayment_penalty_compliant" in fields:
+        with penalty_slot.container():
+            penalty_status = "✅ Compliant" if fields["prepayment_penalty_compliant"] else "❌ Non-compliant (>2%)"
+            st.metric("Prepayment Penalty", f"{prepayment_penalty_pct}%")
+            if fields["prepayment_penalty_compliant"]:
+                st.success(penalty_status)
+            else:
+                st.error(penalty_status)
+
+    if "is_compliant" in fields:
+        with verdict_slot.container():
+            if not fields["is_compliant"]:
+                st.error("🚫 Loan terms rejected")
+                for violation in fields.get("violations", []):
+                    st.warning(f"⚠️ {violation}")
+            elif fields.get("recommendation") == "WARNING":
+                st.warning("⚠️ Loan terms compliant, but close to the RBI caps")
+            else:
+                st.success("🎉 Loan terms approved!")
 
 st.set_page_config(page_title="RBI Fair Practices Auditor", layout="centered", page_icon="🏦")
 st.title("🏦 RBI Fair Practices Auditor")
@@ -12,6 +56,7 @@ with st.sidebar:
     principal = st.number_input("Loan Principal (₹)", min_value=0.0, value=100000.0, step=1000.0, format="%.0f")
     processing_fee_pct = st.number_input("Processing Fee (%)", min_value=0.0, max_value=10.0, value=0.50, step=0.1, format="%.2f")
     prepayment_penalty_pct = st.number_input("Prepayment Penalty (%)", min_value=0.0, max_value=10.0, value=1.00, step=0.1, format="%.2f")
+    include_narrative = st.checkbox("Add AI citations & reasoning", value=True, help="Compliance is checked locally; the LLM only adds RBI citations and an explanation.")
 
 col1, col2, col3 = st.columns(3)
 with col1:
@@ -24,84 +69,41 @@ with col3:
 st.markdown("---")
 
 if st.button("🔍 Audit Loan Terms", type="primary", use_container_width=True):
-    api_key = st.secrets.get("PERPLEXITY_API_KEY", None)
-    if not api_key:
-        st.error("⚠️ PERPLEXITY_API_KEY not found!")
-        st.info("Setup: In Streamlit Cloud → Settings → Secrets: PERPLEXITY_API_KEY = 'pplx-your-key'")
-        st.stop()
-    
-    client = OpenAI(api_key=api_key, base_url="https://api.perplexity.ai")
-    
-    with st.spinner("📏 Checking RBI compliance..."):
-        prompt = f"""You are an RBI Fair Practices Code compliance auditor for loan terms.
-
-Analyze these loan terms:
-- Principal: ₹{principal:,.0f}
-- Processing Fee: {processing_fee_pct}%
-- Prepayment Penalty: {prepayment_penalty_pct}%
-
-RBI Fair Practices Code Rules:
-- Processing fee must be ≤1% of principal
-- Prepayment penalty must be ≤2% per annum
-
-Return ONLY valid JSON (no markdown, no code blocks):
-
-{{
-  "is_compliant": boolean,
-  "recommendation": "APPROVE|REJECT|WARNING",
-  "processing_fee_compliant": boolean,
-  "prepayment_penalty_compliant": boolean,
-  "processing_fee_absolute": number,
-  "violations": ["reason1", "reason2"],
-  "citations": ["RBI source1"],
-  "reasoning": "string explanation"
-}}"""
-
-        try:
-            response = client.chat.completions.create(
-                model="sonar-pro",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1
-            )
-            
-            raw = response.choices[0].message.content.strip()
-            match = re.search(r'\{.*\}', raw, re.DOTALL)
-            if not match:
-                st.error("No JSON found")
-                st.stop()
-            
-            result = json.loads(match.group(0))
-            
-            st.subheader("Audit Results")
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                fee_status = "✅ Compliant" if result["processing_fee_compliant"] else "❌ Non-compliant (>1%)")
-                st.metric("Processing Fee", f"₹{result.get('processing_fee_absolute', 0):,.0f}", f"{processing_fee_pct}%")
-                if result["processing_fee_compliant"]:
-                    st.success(fee_status)
-                else:
-                    st.error(fee_status)
-            
-            with col2:
-                penalty_status = "✅ Compliant" if result["prepayment_penalty_compliant"] else "❌ Non-compliant (>2%)")
-                st.metric("Prepayment Penalty", f"{prepayment_penalty_pct}%")
-                if result["prepayment_penalty_compliant"]:
-                    st.success(penalty_status)
-                else:
-                    st.error(penalty_status)
-            
-            if result["is_compliant"]:
-                st.success("🎉 Loan terms approved!")
-            else:
-                st.error("🚫 Loan terms rejected")
-                for violation in result.get("violations", []):
-                    st.warning(f"⚠️ {violation}")
-            
-            st.json(result)
-            
-        except Exception as e:
-            st.error(f"Error: {e}")
+    # Compliance comes from the local rule table, so results show instantly
+    # and stay available when the LLM API is slow or down
+    result = evaluate_loan_terms(principal, processing_fee_pct, prepayment_penalty_pct)
+
+    st.subheader("Audit Results")
+    col1, col2 = st.columns(2)
+    show_audit(col1.empty(), col2.empty(), st.empty(), result)
+
+    if include_narrative:
+        api_key = st.secrets.get("PERPLEXITY_API_KEY", None)
+        if not api_key:
+            st.info("Setup: In Streamlit Cloud → Settings → Secrets: PERPLEXITY_API_KEY = 'pplx-your-key' to add RBI citations.")
+        else:
+            # The prompt carries only the audit outcome, so every audit with the same outcome shares one cached narrative
+            future = get_narrative_pool().submit(fetch_narrative, api_key, result)
+
+            with st.spinner("📏 Fetching RBI citations..."):
+                try:
+                    narrative = future.result(timeout=NARRATIVE_TIMEOUT)
+                    if narrative.reasoning:
+                        st.markdown("#### Reasoning")
+                        st.write(narrative.reasoning)
+                    if narrative.citations:
+                        with st.expander("📚 Citations"):
+                            for citation in narrative.citations:
+                                st.write(f"- {citation}")
+                    result.update(narrative.model_dump())
+                except FutureTimeout:
+                    st.info("RBI citations are taking longer than usual. The compliance result above is final.")
+                except Exception as e:
+                    st.info(f"RBI citations unavailable ({e}). The compliance result above is final.")
+
+    st.json(result)
 
 st.markdown("---")
 st.caption("Built with 🧡 by Ankit Saxena")
+
+render_diagnostics("fair-practices-auditor")
@@ -0,0 +1,148 @@
+"""Batch audit of loan products against the RBI Fair Practices Code.
+
+Reads a CSV or Parquet file of loan products in chunks, evaluates every
+rule in FAIR_PRACTICES_RULES as vectorized operations, and appends each
+audited chunk to the output file as it goes. Only violating rows are sent
+to the LLM for an explanation, with bounded concurrency, and the
+explanations are written to a separate JSONL file.
+
+    python batch_audit.py products.csv audited.csv
+    python batch_audit.py products.parquet audited.parquet --explain explanations.jsonl
+
+Input columns: principal, processing_fee_pct, prepayment_penalty_pct.
+Any other columns (product id, lender, ...) are passed through unchanged.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from common.batch_io import DEFAULT_CHUNKSIZE, ChunkWriter, iter_chunks
+from narrative import fetch_narrative
+from rules import evaluate_loan_frame, evaluate_loan_terms
+
+REQUIRED_COLUMNS = ["principal", "processing_fee_pct", "prepayment_penalty_pct"]
+
+
+def run_batch(input_path, output_path, chunksize=DEFAULT_CHUNKSIZE, explain_path=None,
+              concurrency=4, max_explanations=1000, api_key=None, progress=print):
+    """Audit every row of ``input_path`` into ``output_path`` and return run statistics."""
+    stats = {"rows": 0, "violations": 0, "warnings": 0, "explained": 0, "explain_errors": 0, "explain_skipped": 0,
+             "rule_seconds": 0.0}
+    writer = ChunkWriter(output_path)
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="fpa-explain") if explain_path else None
+    # The narrative prompt names only the failed rules, so rows that fail the same rules share one LLM call
+    futures = {}
+    rows_by_terms = {}
+    # Violating rows with missing terms: (row, terms, missing columns); they get no LLM call
+    incomplete = []
+    # Violating rows whose rule combination came after --max-explanations was reached: (row, terms)
+    capped = []
+
+    try:
+        for chunk in iter_chunks(input_path, chunksize):
+            missing = [col for col in REQUIRED_COLUMNS if col not in chunk.columns]
+            if missing:
+                raise ValueError(f"Input is missing required columns: {', '.join(missing)}")
+
+            started = time.perf_counter()
+            audited = evaluate_loan_frame(chunk)
+            stats["rule_seconds"] += time.perf_counter() - started
+
+            writer.write(pd.concat([chunk, audited], axis=1))
+            stats["rows"] += len(chunk)
+            stats["violations"] += int((~audited["is_compliant"]).sum())
+            stats["warnings"] += int((audited["recommendation"] == "WARNING").sum())
+
+            if pool is not None:
+                violating = chunk.loc[~audited["is_compliant"], REQUIRED_COLUMNS]
+                failed_rules = audited.loc[~audited["is_compliant"], "violations"]
+                has_missing = violating.isna().any(axis=1).to_numpy()
+                for row, terms in zip(violating.index[has_missing], violating[has_missing].to_dict("records")):
+                    blanks = [col for col in REQUIRED_COLUMNS if pd.isna(terms[col])]
+                    incomplete.append((int(row), {col: None if col in blanks else terms[col] for col in terms}, blanks))
+                violating = violating[~has_missing]
+                for row, key, terms in zip(violating.index, failed_rules[~has_missing], violating.to_dict("records")):
+                    if key not in futures:
+                        if len(futures) >= max_explanations:
+                            capped.append((int(row), terms))
+                            continue
+                        futures[key] = pool.submit(fetch_narrative, api_key, evaluate_loan_terms(**terms))
+                    rows_by_terms.setdefault(key, []).append((int(row), terms))
+
+            progress(f"Audited {stats['rows']:,} rows ({stats['violations']:,} violations)")
+
+        if pool is not None:
+            key_by_future = {future: key for key, future in futures.items()}
+            with open(explain_path, "w", encoding="utf-8") as out:
+                for row, terms, blanks in incomplete:
+                    stats["explain_errors"] += 1
+                    out.write(json.dumps({"row": row, **terms, "error": f"missing {', '.join(blanks)}; not explained"}, ensure_ascii=False) + "\n")
+                for row, terms in capped:
+                    stats["explain_skipped"] += 1
+                    audit = evaluate_loan_terms(**terms)
+                    out.write(json.dumps({"row": row, **terms, "recommendation": audit["recommendation"], "violations": audit["violations"],
+                                          "skipped": "explanation skipped: cap reached"}, ensure_ascii=False) + "\n")
+                for future in as_completed(key_by_future):
+                    key = key_by_future[future]
+                    try:
+                        narrative = future.result().model_dump()
+                        stats["explained"] += 1
+                    except Exception as e:
+                        narrative = {"error": str(e)}
+                        stats["explain_errors"] += 1
+                    for row, terms in rows_by_terms[key]:
+                        audit = evaluate_loan_terms(**terms)
+                        out.write(json.dumps({"row": row, **terms, "recommendation": audit["recommendation"], "violations": audit["violations"],
+                                              **narrative}, ensure_ascii=False) + "\n")
+    finally:
+        writer.close()
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    stats["rows_per_second"] = stats["rows"] / stats["rule_seconds"] if stats["rule_seconds"] else 0.0
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Audit a file of loan products against the RBI Fair Practices Code.")
+    parser.add_argument("input", help="CSV or Parquet file of loan products")
+    parser.add_argument("output", help="CSV or Parquet file for the audited rows")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="rows per chunk")
+    parser.add_argument("--explain", metavar="JSONL", help="write LLM explanations for violating rows to this file")
+    parser.add_argument("--concurrency", type=int, default=4, help="maximum concurrent LLM requests")
+    parser.add_argument("--max-explanations", type=int, default=1000, help="cap on distinct LLM explanation requests")
+    args = parser.parse_args(argv)
+
+    api_key = os.getenv("PERPLEXITY_API_KEY", "")
+    if args.explain and not api_key:
+        parser.error("--explain needs PERPLEXITY_API_KEY in the environment")
+
+    stats = run_batch(
+        args.input, args.output,
+        chunksize=args.chunksize,
+        explain_path=args.explain,
+        concurrency=args.concurrency,
+        max_explanations=args.max_explanations,
+        api_key=api_key,
+    )
+    print(
+        f"Done: {stats['rows']:,} rows, {stats['violations']:,} violations, {stats['warnings']:,} warnings; "
+        f"rule pass {stats['rows_per_second']:,.0f} rows/s"
+    )
+    if args.explain:
+        print(
+            f"Explanations: {stats['explained']:,} ok, {stats['explain_errors']:,} failed, "
+            f"{stats['explain_skipped']:,} rows skipped at the cap -> {args.explain}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""LLM citations and reasoning for a locally computed fair-practices audit.
+
+The prompt names only which rules failed and the recommendation, never the
+loan figures. Every audit with the same outcome therefore shares one prompt
+and one cached narrative, and the explanation cannot quote a number that
+differs from the terms the user entered.
+"""
+import sys
+from pathlib import Path
+from typing import List
+
+from pydantic import BaseModel
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from common.model_router import AUTO_MODEL
+from common.structured_output import structured_completion
+from rules import FAIR_PRACTICES_RULES
+
+
+class Narrative(BaseModel):
+    """RBI citations and reasoning the LLM must return."""
+
+    citations: List[str] = []
+    reasoning: str
+
+
+def _rule_outcomes(audit):
+    """One line per rule saying whether the audited terms stayed within its cap."""
+    return "\n".join(
+        f"- {name.replace('_', ' ').capitalize()}: {'within' if audit[rule['result_field']] else 'EXCEEDS'} the {rule['max_pct']:g}% cap"
+        for name, rule in FAIR_PRACTICES_RULES.items()
+    )
+
+
+def fetch_narrative(api_key, audit):
+    """Ask the LLM for RBI citations and reasoning behind the local audit result."""
+    prompt = f"""You are an RBI Fair Practices Code compliance auditor for loan terms.
+
+RBI Fair Practices Code Rules:
+- Processing fee must be ≤1% of principal
+- Prepayment penalty must be ≤2% per annum
+
+Audit outcome (already determined, do not change it):
+- Recommendation: {audit['recommendation']}
+{_rule_outcomes(audit)}
+
+Explain the outcome in terms of the rules only; do not state or guess this loan's own amounts or percentages.
+
+Return ONLY valid JSON (no markdown, no code blocks):
+
+{{
+  "citations": ["RBI source1"],
+  "reasoning": "string explanation"
+}}"""
+
+    return structured_completion(
+        [{"role": "user", "content": prompt}],
+        model=AUTO_MODEL,
+        response_model=Narrative,
+        app="fair-practices-auditor",
+        api_key=api_key,
+        temperature=0.1
+    )
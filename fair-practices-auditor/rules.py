@@ -0,0 +1,104 @@
+"""RBI Fair Practices Code rules, evaluated locally.
+
+The compliance fields of an audit are fully determined by the loan terms, so
+they are computed here in microseconds instead of asking the LLM. The LLM is
+only used (optionally) for citations and narrative.
+
+``evaluate_loan_frame`` applies the same table to a whole DataFrame of loan
+products as vectorized NumPy operations, for batch audits.
+"""
+import numpy as np
+import pandas as pd
+
+# Each rule caps one percentage input. A value within ``warn_ratio`` of the
+# cap is still compliant but downgrades the recommendation to WARNING.
+FAIR_PRACTICES_RULES = {
+    "processing_fee": {
+        "input": "processing_fee_pct",
+        "result_field": "processing_fee_compliant",
+        "max_pct": 1.0,
+        "warn_ratio": 0.9,
+        "violation": "Processing fee {value:.2f}% exceeds the RBI cap of {max_pct:.0f}% of principal",
+    },
+    "prepayment_penalty": {
+        "input": "prepayment_penalty_pct",
+        "result_field": "prepayment_penalty_compliant",
+        "max_pct": 2.0,
+        "warn_ratio": 0.9,
+        "violation": "Prepayment penalty {value:.2f}% exceeds the RBI cap of {max_pct:.0f}% per annum",
+    },
+}
+
+
+def evaluate_loan_terms(principal, processing_fee_pct, prepayment_penalty_pct):
+    """Apply every rule in FAIR_PRACTICES_RULES and return the audit fields."""
+    inputs = {
+        "processing_fee_pct": processing_fee_pct,
+        "prepayment_penalty_pct": prepayment_penalty_pct,
+    }
+    result = {}
+    violations = []
+    near_cap = False
+
+    for rule in FAIR_PRACTICES_RULES.values():
+        value = inputs[rule["input"]]
+        compliant = value <= rule["max_pct"]
+        result[rule["result_field"]] = compliant
+        if not compliant:
+            violations.append(rule["violation"].format(value=value, max_pct=rule["max_pct"]))
+        elif value >= rule["max_pct"] * rule["warn_ratio"]:
+            near_cap = True
+
+    is_compliant = not violations
+    if not is_compliant:
+        recommendation = "REJECT"
+    elif near_cap:
+        recommendation = "WARNING"
+    else:
+        recommendation = "APPROVE"
+
+    return {
+        "is_compliant": is_compliant,
+        "recommendation": recommendation,
+        **result,
+        "processing_fee_absolute": principal * processing_fee_pct / 100,
+        "violations": violations,
+    }
+
+
+def _violation_labels():
+    """Lookup of ';'-joined rule names for every violation bitmask."""
+    names = list(FAIR_PRACTICES_RULES)
+    return np.array([
+        ";".join(name for bit, name in enumerate(names) if mask >> bit & 1)
+        for mask in range(1 << len(names))
+    ], dtype=object)
+
+
+def evaluate_loan_frame(df):
+    """Vectorized evaluate_loan_terms over a DataFrame of loan products.
+
+    ``df`` needs ``principal`` plus every rule input column. Missing values
+    fail their rule. ``violations`` holds the ';'-joined names of the
+    failed rules (e.g. ``processing_fee;prepayment_penalty``).
+    """
+    n = len(df)
+    mask = np.zeros(n, dtype=np.int64)
+    near_cap = np.zeros(n, dtype=bool)
+    flags = {}
+
+    for bit, rule in enumerate(FAIR_PRACTICES_RULES.values()):
+        values = df[rule["input"]].to_numpy(dtype=float)
+        compliant = values <= rule["max_pct"]
+        flags[rule["result_field"]] = compliant
+        mask |= (~compliant).astype(np.int64) << bit
+        near_cap |= compliant & (values >= rule["max_pct"] * rule["warn_ratio"])
+
+    is_compliant = mask == 0
+    return pd.DataFrame({
+        "is_compliant": is_compliant,
+        "recommendation": np.where(~is_compliant, "REJECT", np.where(near_cap, "WARNING", "APPROVE")),
+        **flags,
+        "processing_fee_absolute": df["principal"].to_numpy(dtype=float) * df["processing_fee_pct"].to_numpy(dtype=float) / 100,
+        "violations": _violation_labels()[mask],
+    }, index=df.index)
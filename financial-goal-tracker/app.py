@@ -1,7 +1,81 @@
 import streamlit as st
-import json
-from openai import OpenAI
-import re
+import sys
+from pathlib import Path
+from typing import List
+
+from pydantic import BaseModel
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from common.json_stream import StreamingJSONParser, as_number
+from common.llm_gateway import stream_chat_completion
+from common.model_router import AUTO_MODEL
+from common.structured_output import StructuredOutputError, parse_response, response_format, validates_as
+from common.telemetry import render_diagnostics
+
+class AllocationBucket(BaseModel):
+    percentage: float
+    allocation_amount: float
+    instruments: List[str] = []
+
+class AssetAllocation(BaseModel):
+    equity: AllocationBucket
+    debt: AllocationBucket
+    gold: AllocationBucket
+    silver: AllocationBucket
+    crude_energy: AllocationBucket
+    real_estate: AllocationBucket
+
+class InvestmentPlan(BaseModel):
+    """The investment plan the LLM must return."""
+    goal_achievable: bool
+    confidence_score: float
+    required_monthly_sip: float
+    expected_corpus: float
+    expected_return_cagr: str
+    asset_allocation: AssetAllocation
+    recommendations: List[str] = []
+    risk_factors: List[str] = []
+    tax_benefits: List[str] = []
+    rebalancing_frequency: str = ""
+    alternative_strategies: List[str] = []
+    market_outlook_2025: str = ""
+    disclaimer: str = "Educational purposes only."
+
+def show_plan_metrics(slots, fields):
+    """Fill the headline metrics from whichever fields have arrived so far."""
+    if "goal_achievable" in fields:
+        slots[0].metric("Goal Achievable", "✅ YES" if fields.get("goal_achievable") else "⚠️ CHECK")
+    if "confidence_score" in fields:
+        confidence = as_number(fields.get("confidence_score"))
+        slots[1].metric("Confidence", f"{confidence:.0f}%" if confidence is not None else "N/A")
+    if "required_monthly_sip" in fields:
+        sip = as_number(fields.get("required_monthly_sip"))
+        slots[2].metric("Required Monthly SIP", f"₹{sip:,.0f}" if sip is not None else "N/A")
+    if "expected_return_cagr" in fields:
+        slots[3].metric("Expected CAGR", fields.get("expected_return_cagr", "N/A"))
+
+def show_allocation(slot, allocation):
+    """Render the asset allocation breakdown and suggested instruments."""
+    with slot.container():
+        colA, colB = st.columns(2)
+        
+        with colA:
+            st.markdown("### Allocation Breakdown")
+            for asset, details in allocation.items():
+                pct = as_number(details.get("percentage")) or 0
+                amt = as_number(details.get("allocation_amount")) or 0
+                if pct > 0:
+                    st.markdown(f"**{asset.replace('_', ' ').title()}**: {pct:g}% (₹{amt:,.0f}/month)")
+        
+        with colB:
+            st.markdown("### Suggested Instruments")
+            for asset, details in allocation.items():
+                instruments = details.get("instruments", [])
+                if instruments:
+                    st.markdown(f"**{asset.replace('_', ' ').title()}**")
+                    for inst in instruments:
+                        st.write(f"-  {inst}")
 
 st.set_page_config(page_title="Financial Goal Tracker", layout="wide", page_icon="💰")
 
@@ -57,8 +131,6 @@ if st.button("🔍 Generate Investment Plan", type="primary", use_container_widt
         st.info("Setup: In Streamlit Cloud → Settings → Secrets, add: PERPLEXITY_API_KEY = 'pplx-your-key-here'")
         st.stop()
     
-    client = OpenAI(api_key=api_key, base_url="https://api.perplexity.ai")
-    
     with st.spinner("🤖 Analyzing your profile and market conditions..."):
         prompt = f"""You are a SEBI-registered financial advisor specializing in goal-based wealth planning for Indian investors.
 
@@ -80,7 +152,7 @@ Return ONLY valid JSON (no markdown, no code blocks):
 
 {{
   "goal_achievable": boolean,
-  "confidence_score": "number 0-100",
+  "confidence_score": number 0-100,
   "required_monthly_sip": number,
   "expected_corpus": number,
   "expected_return_cagr": "string percentage",
@@ -101,67 +173,47 @@ Return ONLY valid JSON (no markdown, no code blocks):
   "disclaimer": "string"
 }}"""
         try:
-            response = client.chat.completions.create(
-                model="sonar-pro",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.2
-            )
-            
-            raw = response.choices[0].message.content.strip()
-            match = re.search(r"\{.*\}", raw, re.DOTALL)
-            if not match:
-                st.error("LLM did not return JSON.")
-                st.code(raw)
-                st.stop()
-            
-            json_str = match.group(0)
-            result = json.loads(json_str)
-            
-            st.success("✅ Investment plan generated!")
-            
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                st.metric("Goal Achievable", "✅ YES" if result.get("goal_achievable") else "⚠️ CHECK")
-            with col2:
-                st.metric("Confidence", f"{result.get('confidence_score','0')}%")
-            with col3:
-                st.metric("Required Monthly SIP", f"₹{result.get('required_monthly_sip',0):,.0f}")
-            with col4:
-                st.metric("Expected CAGR", result.get("expected_return_cagr", "N/A"))
-            
+            status_slot = st.empty()
+            metric_slots = [col.empty() for col in st.columns(4)]
             st.markdown("---")
             st.subheader("📊 Asset Allocation Recommendation")
+            allocation_slot = st.empty()
             
-            allocation = result.get("asset_allocation", {})
-            colA, colB = st.columns(2)
+            # Metrics and allocation fill in as soon as their JSON fields finish streaming
+            parser = StreamingJSONParser()
+            for delta in stream_chat_completion(
+                [{"role": "user", "content": prompt}],
+                model=AUTO_MODEL,
+                app="financial-goal-tracker",
+                api_key=api_key,
+                temperature=0.2,
+                response_format=response_format(InvestmentPlan),
+                cacheable=validates_as(InvestmentPlan)
+            ):
+                for key, value in parser.feed(delta):
+                    show_plan_metrics(metric_slots, parser.fields)
+                    if key == "asset_allocation":
+                        show_allocation(allocation_slot, value)
             
-            with colA:
-                st.markdown("### Allocation Breakdown")
-                for asset, details in allocation.items():
-                    pct = details.get("percentage", 0)
-                    amt = details.get("allocation_amount", 0)
-                    if pct > 0:
-                        st.markdown(f"**{asset.replace('_', ' ').title()}**: {pct}% (₹{amt:,.0f}/month)")
+            plan = parse_response(parser.text, InvestmentPlan, "financial-goal-tracker", AUTO_MODEL, api_key=api_key)
             
-            with colB:
-                st.markdown("### Suggested Instruments")
-                for asset, details in allocation.items():
-                    instruments = details.get("instruments", [])
-                    if instruments:
-                        st.markdown(f"**{asset.replace('_', ' ').title()}**")
-                        for inst in instruments:
-                            st.write(f"-  {inst}")
+            status_slot.success("✅ Investment plan generated!")
+            show_plan_metrics(metric_slots, plan.model_dump())
+            show_allocation(allocation_slot, plan.asset_allocation.model_dump())
             
             with st.expander("🔍 Full JSON Response"):
-                st.json(result)
+                st.json(plan.model_dump())
             
             st.markdown("---")
-            st.warning(result.get("disclaimer", "Educational purposes only."))
+            st.warning(plan.disclaimer)
             
-        except json.JSONDecodeError as e:
-            st.error(f"JSON parsing error: {e}")
+        except StructuredOutputError as e:
+            st.error(f"Unexpected response format: {e}")
+            st.code(parser.text)
         except Exception as e:
             st.error(f"API Error: {e}")
 
 st.markdown("---")
 st.caption("Built with 🧡 by Ankit Saxena | AI-powered financial planning")
+
+render_diagnostics("financial-goal-tracker")
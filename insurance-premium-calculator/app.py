@@ -1,78 +1,62 @@
 import streamlit as st
 import os
-from typing import Dict, Any
+import sys
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
 
-import httpx
+from pydantic import BaseModel
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from common.deadlines import DeadlineExceeded
+from common.llm_gateway import chat_completion, completion_text
+from common.model_router import AUTO_MODEL
+from common.structured_output import parse_response, response_format, validates_as
+from common.telemetry import render_diagnostics
 
 PPLX_API_KEY = os.getenv("PERPLEXITY_API_KEY", "")
-PPLX_MODEL = "sonar-pro"
+PPLX_MODEL = AUTO_MODEL
+
+
+class RecommendedProduct(BaseModel):
+    type: str
+    coverage_amount: float
+    annual_premium: float
+    monthly_premium: float
+    key_features: List[str]
+    notes: str = ""
+
+
+class TaxBenefits(BaseModel):
+    section_80d_deduction: float
+    section_80c_deduction: float = 0
+    notes: str = ""
+
 
+class InsurancePremiumResponse(BaseModel):
+    """The premium estimate the LLM must return."""
 
-def call_llm(prompt: str) -> Dict[str, Any]:
+    is_eligible: bool
+    recommended_products: List[RecommendedProduct]
+    tax_benefits: TaxBenefits
+    risk_summary: str
+    irda_compliance_notes: str
+
+
+def call_llm(prompt: str) -> Tuple[InsurancePremiumResponse, bool]:
+    """Return the validated estimate and whether it is a stale cached copy served after a timeout."""
     if not PPLX_API_KEY:
         raise RuntimeError("PERPLEXITY_API_KEY not set. Please add it in your environment or Streamlit secrets.")
 
-    headers = {
-        "Authorization": f"Bearer {PPLX_API_KEY}",
-        "Content-Type": "application/json",
-    }
-
-    payload = {
-        "model": PPLX_MODEL,
-        "temperature": 0.2,
-        "max_tokens": 800,
-        "response_format": {
-            "type": "json_schema",
-            "json_schema": {
-                "name": "insurance_premium_response",
-                "schema": {
-                    "type": "object",
-                    "properties": {
-                        "is_eligible": {"type": "boolean"},
-                        "recommended_products": {
-                            "type": "array",
-                            "items": {
-                                "type": "object",
-                                "properties": {
-                                    "type": {"type": "string"},
-                                    "coverage_amount": {"type": "number"},
-                                    "annual_premium": {"type": "number"},
-                                    "monthly_premium": {"type": "number"},
-                                    "key_features": {"type": "array", "items": {"type": "string"}},
-                                    "notes": {"type": "string"}
-                                },
-                                "required": [
-                                    "type",
-                                    "coverage_amount",
-                                    "annual_premium",
-                                    "monthly_premium",
-                                    "key_features"
-                                ]
-                            }
-                        },
-                        "tax_benefits": {
-                            "type": "object",
-                            "properties": {
-                                "section_80d_deduction": {"type": "number"},
-                                "section_80c_deduction": {"type": "number"},
-                                "notes": {"type": "string"}
-                            },
-                            "required": ["section_80d_deduction"]
-                        },
-                        "risk_summary": {"type": "string"},
-                        "irda_compliance_notes": {"type": "string"}
-                    },
-                    "required": [
-                        "is_eligible",
-                        "recommended_products",
-                        "tax_benefits",
-                        "risk_summary",
-                        "irda_compliance_notes"
-                    ]
-                }
-            }
-        },
-        "messages": [
+    response = chat_completion(
+        model=PPLX_MODEL,
+        app="insurance-premium-calculator",
+        api_key=PPLX_API_KEY,
+        temperature=0.2,
+        max_tokens=800,
+        response_format=response_format(InsurancePremiumResponse),
+        cacheable=validates_as(InsurancePremiumResponse),
+        messages=[
             {
                 "role": "system",
                 "content": (
@@ -84,17 +68,13 @@ def call_llm(prompt: str) -> Dict[str, Any]:
             },
             {"role": "user", "content": prompt},
         ],
-    }
-
-    with httpx.Client(timeout=60) as client:
-        resp = client.post("https://api.perplexity.ai/chat/completions", headers=headers, json=payload)
-        resp.raise_for_status()
-        data = resp.json()
+    )
 
-    try:
-        return data["choices"][0]["message"]["content"]
-    except Exception as e:
-        raise RuntimeError(f"Unexpected LLM response format: {e}")
+    result = parse_response(
+        completion_text(response), InsurancePremiumResponse, "insurance-premium-calculator",
+        response.get("model") or PPLX_MODEL, api_key=PPLX_API_KEY
+    )
+    return result, bool(response.get("stale"))
 
 
 def build_prompt(form_values: Dict[str, Any]) -> str:
@@ -197,47 +177,52 @@ def main() -> None:
 
         with st.spinner("Contacting insurance planning assistant..."):
             try:
-                result = call_llm(prompt)
+                result, stale = call_llm(prompt)
+            except DeadlineExceeded:
+                st.warning("The insurance planning assistant is taking longer than usual. Please try again in a minute.")
+                return
             except Exception as e:
                 st.error(f"Error while calling LLM: {e}")
                 return
 
         st.subheader("Premium Estimates & Recommendations")
+        if stale:
+            st.caption("⏱️ The assistant timed out, so this is a recent cached estimate for the same profile.")
 
-        if result.get("risk_summary"):
+        if result.risk_summary:
             st.markdown("### Risk Summary")
-            st.write(result["risk_summary"])
+            st.write(result.risk_summary)
 
-        if result.get("recommended_products"):
+        if result.recommended_products:
             st.markdown("### Recommended Products")
-            for idx, prod in enumerate(result["recommended_products"], start=1):
-                with st.expander(f"{idx}. {prod['type']} - Indicative Premium"):
-                    st.write(f"**Coverage amount:** ₹{prod['coverage_amount']:,.0f}")
-                    st.write(f"**Annual premium (approx):** ₹{prod['annual_premium']:,.0f}")
-                    st.write(f"**Monthly premium (approx):** ₹{prod['monthly_premium']:,.0f}")
+            for idx, prod in enumerate(result.recommended_products, start=1):
+                with st.expander(f"{idx}. {prod.type} - Indicative Premium"):
+                    st.write(f"**Coverage amount:** ₹{prod.coverage_amount:,.0f}")
+                    st.write(f"**Annual premium (approx):** ₹{prod.annual_premium:,.0f}")
+                    st.write(f"**Monthly premium (approx):** ₹{prod.monthly_premium:,.0f}")
 
                     st.write("**Key features:**")
-                    for f in prod.get("key_features", []):
+                    for f in prod.key_features:
                         st.write(f"- {f}")
 
-                    if prod.get("notes"):
+                    if prod.notes:
                         st.write("**Notes:**")
-                        st.write(prod["notes"])
+                        st.write(prod.notes)
 
-        tax = result.get("tax_benefits", {})
+        tax = result.tax_benefits
         st.markdown("### Indicative Tax Benefits")
         col1, col2 = st.columns(2)
         with col1:
-            st.metric("Section 80D (Health)", f"₹{tax.get('section_80d_deduction', 0):,.0f}")
+            st.metric("Section 80D (Health)", f"₹{tax.section_80d_deduction:,.0f}")
         with col2:
-            st.metric("Section 80C (Life/Term)", f"₹{tax.get('section_80c_deduction', 0):,.0f}")
+            st.metric("Section 80C (Life/Term)", f"₹{tax.section_80c_deduction:,.0f}")
 
-        if tax.get("notes"):
-            st.write(tax["notes"])
+        if tax.notes:
+            st.write(tax.notes)
 
-        if result.get("irda_compliance_notes"):
+        if result.irda_compliance_notes:
             st.markdown("### IRDA & Regulatory Notes")
-            st.write(result["irda_compliance_notes"])
+            st.write(result.irda_compliance_notes)
 
         st.info(
             "This tool is build by Ankit Saxena which provides indicative estimates for learning and planning only. "
@@ -248,3 +233,4 @@ def main() -> None:
 
 if __name__ == "__main__":
     main()
+    render_diagnostics("insurance-premium-calculator")
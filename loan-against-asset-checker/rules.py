@@ -0,0 +1,220 @@
+"""RBI loan-against-asset rules.
+
+``validate_gold``, ``validate_property`` and ``validate_shares`` check one
+loan for the app. ``validate_book`` applies the same RBI_RULES to a whole
+DataFrame of mixed loans as vectorized NumPy operations, for re-validating
+a collateral book.
+"""
+import numpy as np
+import pandas as pd
+
+# RBI Compliance Rules
+RBI_RULES = {
+    "gold_loan": {
+        "max_ltv_urban": 0.75,
+        "max_ltv_rural": 0.70,
+        "purity_min": 18,
+        "max_loan_amount": 10000000,
+    },
+    "property_mortgage": {
+        "max_ltv": 0.80,
+        "circle_rate_tolerance": 0.10,
+        "max_loan_amount": 50000000,
+    },
+    "share_pledge": {
+        "max_ltv_nifty50": 0.50,
+        "max_ltv_nifty100": 0.45,
+        "max_ltv_other": 0.40,
+        "max_loan_amount": 5000000,
+    },
+}
+
+# Validation Functions
+def validate_gold(asset_value, loan_amount, location, purity):
+    errors = []
+    rules = RBI_RULES["gold_loan"]
+    
+    if purity < rules["purity_min"]:
+        errors.append(f"Gold purity {purity}C below RBI minimum of {rules['purity_min']}C")
+    
+    ltv_limit = rules["max_ltv_urban"] if location == "Urban" else rules["max_ltv_rural"]
+    ltv_used = (loan_amount / asset_value * 100) if asset_value > 0 else 0
+    max_eligible = asset_value * ltv_limit
+    
+    if loan_amount > max_eligible:
+        errors.append(f"Loan exceeds LTV limit of {ltv_limit*100:.0f}%")
+    
+    if loan_amount > rules["max_loan_amount"]:
+        errors.append(f"Exceeds RBI maximum of ₹{rules['max_loan_amount']:,}")
+    
+    approved = len(errors) == 0
+    ltv_limit_str = f"{ltv_limit*100:.0f}%"
+    
+    return approved, max_eligible, ltv_used, errors, ltv_limit_str
+
+def validate_property(asset_value, loan_amount, circle_rate):
+    errors = []
+    rules = RBI_RULES["property_mortgage"]
+    
+    if asset_value > 0:
+        variance = abs(asset_value - circle_rate) / circle_rate
+        if variance > rules["circle_rate_tolerance"]:
+            errors.append(f"Property variance exceeds {rules['circle_rate_tolerance']*100:.0f}%")
+    
+    ltv_limit = rules["max_ltv"]
+    ltv_used = (loan_amount / asset_value * 100) if asset_value > 0 else 0
+    max_eligible = asset_value * ltv_limit
+    
+    if loan_amount > max_eligible:
+        errors.append(f"Loan exceeds LTV limit of {ltv_limit*100:.0f}%")
+    
+    if loan_amount > rules["max_loan_amount"]:
+        errors.append(f"Exceeds RBI maximum of ₹{rules['max_loan_amount']:,}")
+    
+    approved = len(errors) == 0
+    ltv_limit_str = f"{ltv_limit*100:.0f}%"
+    
+    return approved, max_eligible, ltv_used, errors, ltv_limit_str
+
+def validate_shares(asset_value, loan_amount, share_index):
+    errors = []
+    rules = RBI_RULES["share_pledge"]
+    
+    if share_index == "NIFTY50":
+        ltv_limit = rules["max_ltv_nifty50"]
+    elif share_index == "NIFTY100":
+        ltv_limit = rules["max_ltv_nifty100"]
+    else:
+        ltv_limit = rules["max_ltv_other"]
+    
+    ltv_used = (loan_amount / asset_value * 100) if asset_value > 0 else 0
+    max_eligible = asset_value * ltv_limit
+    
+    if loan_amount > max_eligible:
+        errors.append(f"Loan exceeds {share_index} LTV limit of {ltv_limit*100:.0f}%")
+    
+    if loan_amount > rules["max_loan_amount"]:
+        errors.append(f"Exceeds RBI maximum of ₹{rules['max_loan_amount']:,}")
+    
+    approved = len(errors) == 0
+    ltv_limit_str = f"{ltv_limit*100:.0f}%"
+    
+    return approved, max_eligible, ltv_used, errors, ltv_limit_str
+
+# UI labels for each asset type; validate_book accepts either form
+ASSET_TYPES = {
+    "Gold Loan": "gold_loan",
+    "Property Mortgage": "property_mortgage",
+    "Share Pledge": "share_pledge",
+}
+
+# Bit order matches the order the scalar validators report errors in
+VIOLATION_CODES = {
+    "PURITY_BELOW_MIN": "Gold purity below the RBI minimum",
+    "CIRCLE_RATE_VARIANCE": "Property value deviates from the circle rate beyond tolerance",
+    "LTV_EXCEEDED": "Loan exceeds the LTV limit",
+    "MAX_LOAN_EXCEEDED": "Loan exceeds the RBI maximum amount",
+}
+
+def _compile_rules():
+    """Compile RBI_RULES into lookup arrays indexed by [asset type, LTV variant].
+
+    Variants are Urban/Rural for gold and NIFTY50/NIFTY100/Other for shares;
+    property has a single LTV.
+    """
+    gold = RBI_RULES["gold_loan"]
+    prop = RBI_RULES["property_mortgage"]
+    shares = RBI_RULES["share_pledge"]
+    types = list(ASSET_TYPES.values())
+    ltv = np.array([
+        [gold["max_ltv_urban"], gold["max_ltv_rural"], np.nan],
+        [prop["max_ltv"]] * 3,
+        [shares["max_ltv_nifty50"], shares["max_ltv_nifty100"], shares["max_ltv_other"]],
+    ])
+    return {
+        "types": types,
+        "ltv": ltv,
+        "ltv_label": np.array([[f"{x*100:.0f}%" if x == x else "" for x in row] for row in ltv], dtype=object),
+        "max_loan_amount": np.array([RBI_RULES[t]["max_loan_amount"] for t in types], dtype=float),
+        "purity_min": gold["purity_min"],
+        "circle_rate_tolerance": prop["circle_rate_tolerance"],
+    }
+
+def _violation_labels():
+    """Lookup of ';'-joined violation codes for every violation bitmask."""
+    codes = list(VIOLATION_CODES)
+    return np.array([
+        ";".join(code for bit, code in enumerate(codes) if mask >> bit & 1)
+        for mask in range(1 << len(codes))
+    ], dtype=object)
+
+def _factorized_lookup(df, name, table, default):
+    """Map column ``name`` through ``table`` per distinct value instead of per row."""
+    if name not in df.columns:
+        return np.full(len(df), default)
+    codes, uniques = pd.factorize(df[name])
+    # The trailing default catches missing values, which factorize codes as -1
+    return np.array([table.get(value, default) for value in uniques] + [default])[codes]
+
+def _numeric(df, name):
+    if name not in df.columns:
+        return np.full(len(df), np.nan)
+    return df[name].to_numpy(dtype=float, na_value=np.nan)
+
+def validate_book(df):
+    """Vectorized validate_gold/validate_property/validate_shares over a loan book.
+
+    ``df`` needs ``asset_type`` (a UI label such as ``Gold Loan`` or a
+    RBI_RULES key such as ``gold_loan``), ``asset_value`` and
+    ``loan_amount``, plus the inputs its asset types use: ``location`` and
+    ``purity`` for gold, ``circle_rate`` for property and ``share_index``
+    for shares. Returns ``approved``, ``max_eligible``, ``ltv_used``,
+    ``ltv_limit`` and ``violations`` (';'-joined VIOLATION_CODES) per row,
+    matching what the app shows for the same loan.
+    """
+    rules = _compile_rules()
+    codes = list(VIOLATION_CODES)
+
+    type_lookup = {key: i for i, key in enumerate(rules["types"])}
+    type_lookup.update({label: type_lookup[key] for label, key in ASSET_TYPES.items()})
+    type_idx = _factorized_lookup(df, "asset_type", type_lookup, -1)
+    if (type_idx < 0).any():
+        unknown = sorted(set(df["asset_type"][type_idx < 0].astype(str)))
+        raise ValueError(f"Unknown asset_type values: {', '.join(unknown)}")
+    gold = type_idx == 0
+    prop = type_idx == 1
+
+    asset_value = _numeric(df, "asset_value")
+    loan_amount = _numeric(df, "loan_amount")
+
+    # Gold: Urban=0, anything else=1. Shares: NIFTY50=0, NIFTY100=1, other=2.
+    variant = np.zeros(len(df), dtype=np.int64)
+    variant[gold] = _factorized_lookup(df, "location", {"Urban": 0}, 1)[gold]
+    shares = type_idx == 2
+    variant[shares] = _factorized_lookup(df, "share_index", {"NIFTY50": 0, "NIFTY100": 1}, 2)[shares]
+
+    ltv_limit = rules["ltv"][type_idx, variant]
+    max_eligible = asset_value * ltv_limit
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ltv_used = np.where(asset_value > 0, loan_amount / asset_value * 100, 0.0)
+        circle_rate = _numeric(df, "circle_rate")
+        variance = np.abs(asset_value - circle_rate) / circle_rate
+
+    failed = {
+        "PURITY_BELOW_MIN": gold & (_numeric(df, "purity") < rules["purity_min"]),
+        # A zero circle rate gives an infinite variance, which fails the check
+        "CIRCLE_RATE_VARIANCE": prop & (asset_value > 0) & (variance > rules["circle_rate_tolerance"]),
+        "LTV_EXCEEDED": loan_amount > max_eligible,
+        "MAX_LOAN_EXCEEDED": loan_amount > rules["max_loan_amount"][type_idx],
+    }
+    mask = np.zeros(len(df), dtype=np.int64)
+    for bit, code in enumerate(codes):
+        mask |= failed[code].astype(np.int64) << bit
+
+    return pd.DataFrame({
+        "approved": mask == 0,
+        "max_eligible": max_eligible,
+        "ltv_used": ltv_used,
+        "ltv_limit": rules["ltv_label"][type_idx, variant],
+        "violations": _violation_labels()[mask],
+    }, index=df.index)
@@ -1,7 +1,14 @@
 import streamlit as st
 import os
+import sys
 from datetime import datetime
-from openai import OpenAI
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from common.llm_gateway import FirstTokenTimeout, chat_completion, completion_text, stream_chat_completion
+from common.telemetry import render_diagnostics
+from rules import validate_gold, validate_property, validate_shares
 
 # Page config
 st.set_page_config(page_title="LAA Checker", page_icon="🏠", layout="wide")
@@ -19,122 +26,78 @@ h3 { font-size: 18px; font-weight: 600; }
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize Perplexity client
-client = OpenAI(
-    api_key=os.getenv("PERPLEXITY_API_KEY", ""),
-    base_url="https://api.perplexity.ai"
-)
-
-# RBI Compliance Rules
-RBI_RULES = {
-    "gold_loan": {
-        "max_ltv_urban": 0.75,
-        "max_ltv_rural": 0.70,
-        "purity_min": 18,
-        "max_loan_amount": 10000000,
-    },
-    "property_mortgage": {
-        "max_ltv": 0.80,
-        "circle_rate_tolerance": 0.10,
-        "max_loan_amount": 50000000,
-    },
-    "share_pledge": {
-        "max_ltv_nifty50": 0.50,
-        "max_ltv_nifty100": 0.45,
-        "max_ltv_other": 0.40,
-        "max_loan_amount": 5000000,
-    },
-}
+PERPLEXITY_API_KEY = os.getenv("PERPLEXITY_API_KEY", "")
 
-# Validation Functions
-def validate_gold(asset_value, loan_amount, location, purity):
-    errors = []
-    rules = RBI_RULES["gold_loan"]
-    
-    if purity < rules["purity_min"]:
-        errors.append(f"Gold purity {purity}C below RBI minimum of {rules['purity_min']}C")
-    
-    ltv_limit = rules["max_ltv_urban"] if location == "Urban" else rules["max_ltv_rural"]
-    ltv_used = (loan_amount / asset_value * 100) if asset_value > 0 else 0
-    max_eligible = asset_value * ltv_limit
-    
-    if loan_amount > max_eligible:
-        errors.append(f"Loan exceeds LTV limit of {ltv_limit*100:.0f}%")
-    
-    if loan_amount > rules["max_loan_amount"]:
-        errors.append(f"Exceeds RBI maximum of ₹{rules['max_loan_amount']:,}")
-    
-    approved = len(errors) == 0
-    ltv_limit_str = f"{ltv_limit*100:.0f}%"
-    
-    return approved, max_eligible, ltv_used, errors, ltv_limit_str
+# Stream the AI analysis token by token; fall back to the RBI validation
+# results if no content arrives within the first-token timeout.
+STREAM_ANALYSIS = os.getenv("LAA_STREAM_ANALYSIS", "1") != "0"
+FIRST_TOKEN_TIMEOUT = float(os.getenv("LAA_FIRST_TOKEN_TIMEOUT", "4"))
 
-def validate_property(asset_value, loan_amount, circle_rate):
-    errors = []
-    rules = RBI_RULES["property_mortgage"]
-    
-    if asset_value > 0:
-        variance = abs(asset_value - circle_rate) / circle_rate
-        if variance > rules["circle_rate_tolerance"]:
-            errors.append(f"Property variance exceeds {rules['circle_rate_tolerance']*100:.0f}%")
-    
-    ltv_limit = rules["max_ltv"]
-    ltv_used = (loan_amount / asset_value * 100) if asset_value > 0 else 0
-    max_eligible = asset_value * ltv_limit
-    
-    if loan_amount > max_eligible:
-        errors.append(f"Loan exceeds LTV limit of {ltv_limit*100:.0f}%")
-    
-    if loan_amount > rules["max_loan_amount"]:
-        errors.append(f"Exceeds RBI maximum of ₹{rules['max_loan_amount']:,}")
-    
-    approved = len(errors) == 0
-    ltv_limit_str = f"{ltv_limit*100:.0f}%"
-    
-    return approved, max_eligible, ltv_used, errors, ltv_limit_str
+# Finished analyses are memoized per (asset_type, params) in the session, so
+# reruns of the results view never call the LLM again. Across sessions the
+# gateway's response cache (CACHE_TTLS) serves identical loans.
 
-def validate_shares(asset_value, loan_amount, share_index):
-    errors = []
-    rules = RBI_RULES["share_pledge"]
-    
-    if share_index == "NIFTY50":
-        ltv_limit = rules["max_ltv_nifty50"]
-    elif share_index == "NIFTY100":
-        ltv_limit = rules["max_ltv_nifty100"]
-    else:
-        ltv_limit = rules["max_ltv_other"]
-    
-    ltv_used = (loan_amount / asset_value * 100) if asset_value > 0 else 0
-    max_eligible = asset_value * ltv_limit
-    
-    if loan_amount > max_eligible:
-        errors.append(f"Loan exceeds {share_index} LTV limit of {ltv_limit*100:.0f}%")
-    
-    if loan_amount > rules["max_loan_amount"]:
-        errors.append(f"Exceeds RBI maximum of ₹{rules['max_loan_amount']:,}")
-    
-    approved = len(errors) == 0
-    ltv_limit_str = f"{ltv_limit*100:.0f}%"
-    
-    return approved, max_eligible, ltv_used, errors, ltv_limit_str
+def analysis_key(asset_type, params):
+    return (asset_type, tuple(sorted(params.items())))
+
+def lookup_analysis(key):
+    """Return the session's memoized analysis for ``key``, or None."""
+    memo = st.session_state.get("analysis")
+    if memo and memo[0] == key:
+        return memo[1]
+    return None
+
+def remember_analysis(key, text):
+    st.session_state.analysis = (key, text)
+    st.session_state.refresh_analysis = False
 
-def get_llm_analysis(asset_type, params):
-    try:
-        prompt = f"""Analyze this {asset_type} against RBI regulations:
+def reset_analysis(asset_type, params):
+    """Drop the session memo on submit; resubmitting the loan just analysed also bypasses the shared cache."""
+    memo = st.session_state.pop("analysis", None)
+    st.session_state.refresh_analysis = memo is not None and memo[0] == analysis_key(asset_type, params)
+
+def build_analysis_prompt(asset_type, params):
+    return f"""Analyze this {asset_type} against RBI regulations:
 - Asset Value: ₹{params.get('asset_value', 0):,}
 - Loan Amount: ₹{params.get('loan_amount', 0):,}
 - LTV Used: {params.get('ltv_used', 0):.1f}%
 
 Provide RBI guidelines, compliance status, and recommendations."""
-        
-        response = client.chat.completions.create(
-            model="sonar",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=500
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        return f"Error: {str(e)}. Ensure PERPLEXITY_API_KEY is set."
+
+def get_llm_analysis(asset_type, params, refresh=False):
+    response = chat_completion(
+        [{"role": "user", "content": build_analysis_prompt(asset_type, params)}],
+        model="sonar",
+        app="loan-against-asset-checker",
+        api_key=PERPLEXITY_API_KEY,
+        max_tokens=500,
+        refresh=refresh
+    )
+    return completion_text(response)
+
+def stream_llm_analysis(asset_type, params, refresh=False):
+    return stream_chat_completion(
+        [{"role": "user", "content": build_analysis_prompt(asset_type, params)}],
+        model="sonar",
+        app="loan-against-asset-checker",
+        api_key=PERPLEXITY_API_KEY,
+        max_tokens=500,
+        first_token_timeout=FIRST_TOKEN_TIMEOUT,
+        refresh=refresh
+    )
+
+def format_validation_summary(approved, max_eligible, ltv_used, ltv_limit, errors):
+    lines = [
+        f"**Status:** {'✅ APPROVED' if approved else '❌ REJECTED'}",
+        f"**Max Eligible:** ₹{int(max_eligible):,}",
+        f"**LTV Used:** {ltv_used:.1f}% (limit {ltv_limit})",
+    ]
+    if errors:
+        lines.append("**RBI Violations:**")
+        lines.extend(f"- {error}" for error in errors)
+    else:
+        lines.append("No RBI violations found.")
+    return "\n\n".join(lines)
 
 # UI
 st.markdown("# 🏦 Loan Against Asset Checker")
@@ -167,6 +130,7 @@ if not st.session_state.results_tab:
                 st.session_state.errors = errors
                 st.session_state.ltv_limit = ltv_limit
                 st.session_state.params = {'asset_value': asset_value, 'loan_amount': loan_amount, 'location': location, 'purity': purity, 'ltv_used': ltv_used}
+                reset_analysis(asset_type, st.session_state.params)
                 st.session_state.results_tab = True
                 st.rerun()
     
@@ -186,6 +150,7 @@ if not st.session_state.results_tab:
                 st.session_state.errors = errors
                 st.session_state.ltv_limit = ltv_limit
                 st.session_state.params = {'asset_value': asset_value, 'loan_amount': loan_amount, 'circle_rate': circle_rate, 'ltv_used': ltv_used}
+                reset_analysis(asset_type, st.session_state.params)
                 st.session_state.results_tab = True
                 st.rerun()
     
@@ -205,6 +170,7 @@ if not st.session_state.results_tab:
                 st.session_state.errors = errors
                 st.session_state.ltv_limit = ltv_limit
                 st.session_state.params = {'asset_value': asset_value, 'loan_amount': loan_amount, 'share_index': share_index, 'ltv_used': ltv_used}
+                reset_analysis(asset_type, st.session_state.params)
                 st.session_state.results_tab = True
                 st.rerun()
 
@@ -246,10 +212,44 @@ else:
     
     st.markdown("---")
     st.markdown("#### 🤖 AI Analysis")
-    with st.spinner("Analyzing..."):
-        llm_response = get_llm_analysis(st.session_state.asset_type, st.session_state.params)
-    with st.expander("📜 Full Analysis", expanded=True):
-        st.markdown(llm_response)
+    key = analysis_key(st.session_state.asset_type, st.session_state.params)
+    cached_analysis = lookup_analysis(key)
+    if cached_analysis is not None:
+        with st.expander("📜 Full Analysis", expanded=True):
+            st.markdown(cached_analysis)
+    elif STREAM_ANALYSIS:
+        with st.expander("📜 Full Analysis", expanded=True):
+            try:
+                llm_response = st.write_stream(stream_llm_analysis(
+                    st.session_state.asset_type, st.session_state.params,
+                    refresh=st.session_state.get("refresh_analysis", False),
+                ))
+                remember_analysis(key, llm_response)
+            except FirstTokenTimeout:
+                st.info("AI analysis is taking longer than usual. Showing the RBI validation results instead.")
+                st.markdown(format_validation_summary(
+                    st.session_state.approved,
+                    st.session_state.max_eligible,
+                    st.session_state.ltv_used,
+                    st.session_state.ltv_limit,
+                    st.session_state.errors,
+                ))
+            except Exception as e:
+                st.markdown(f"Error: {str(e)}. Ensure PERPLEXITY_API_KEY is set.")
+    else:
+        try:
+            with st.spinner("Analyzing..."):
+                llm_response = get_llm_analysis(
+                    st.session_state.asset_type, st.session_state.params,
+                    refresh=st.session_state.get("refresh_analysis", False),
+                )
+            remember_analysis(key, llm_response)
+        except Exception as e:
+            llm_response = f"Error: {str(e)}. Ensure PERPLEXITY_API_KEY is set."
+        with st.expander("📜 Full Analysis", expanded=True):
+            st.markdown(llm_response)
 
 st.markdown(f"---")
 st.markdown(f"Built with 🧡 by Ankit Saxena · {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+
+render_diagnostics("loan-against-asset-checker")
@@ -3,9 +3,20 @@ import yfinance as yf
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import json
+import sys
 import warnings
-from openai import OpenAI
+from pathlib import Path
+from typing import Dict, List
+
+from pydantic import BaseModel
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from common.price_store import load_histories
+from common.model_router import AUTO_MODEL
+from common.prompt_encoding import Table, render_prompt
+from common.structured_output import structured_completion
+from common.telemetry import render_diagnostics
 
 warnings.filterwarnings('ignore')
 
@@ -42,13 +53,8 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize LLM client
-@st.cache_resource
-def get_llm_client():
-    return OpenAI(
-        api_key=st.secrets.get("PERPLEXITY_API_KEY", ""),
-        base_url="https://api.perplexity.ai"
-    )
+def get_api_key():
+    return st.secrets.get("PERPLEXITY_API_KEY", "")
 
 # Sector data (NSE stocks)
 SECTOR_STOCKS = {
@@ -63,64 +69,97 @@ SECTOR_STOCKS = {
 }
 
 def fetch_sector_data():
-    """Fetch real-time sector momentum and metrics"""
+    """Fetch sector momentum and metrics, equal-weight daily sector returns, and the tickers that could not be fetched"""
+    # Tickers shared by several sectors (NTPC.NS) are read once; only bars newer than the local store are downloaded
+    fetched = load_histories([stock for stocks in SECTOR_STOCKS.values() for stock in stocks], period="1y")
     sector_data = {}
+    sector_returns = {}
     
     for sector, stocks in SECTOR_STOCKS.items():
-        try:
-            momentums = []
-            rsis = []
-            yields = []
-            
-            for stock in stocks:
-                data = yf.download(stock, period="1y", progress=False)
-                if len(data) > 0:
-                    # Momentum (52-week return)
-                    momentum = ((data['Close'].iloc[-1] - data['Close'].iloc[0]) / data['Close'].iloc[0]) * 100
-                    momentums.append(momentum)
-                    
-                    # RSI calculation
-                    delta = data['Close'].diff()
-                    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-                    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-                    rs = gain / loss
-                    rsi = 100 - (100 / (1 + rs))
-                    rsis.append(rsi.iloc[-1])
+        momentums = []
+        rsis = []
+        daily_returns = []
+        
+        for stock in stocks:
+            data = fetched.prices.get(stock)
+            if data is None or len(data) < 2:
+                continue
+            daily_returns.append(data['Close'].pct_change().rename(stock))
+            # Momentum (52-week return)
+            momentum = ((data['Close'].iloc[-1] - data['Close'].iloc[0]) / data['Close'].iloc[0]) * 100
+            momentums.append(momentum)
             
-            if momentums:
-                sector_data[sector] = {
-                    "momentum": np.mean(momentums),
-                    "rsi": np.mean(rsis) if rsis else 50,
-                    "volatility": np.std(momentums)
-                }
-        except:
-            sector_data[sector] = {"momentum": 0, "rsi": 50, "volatility": 0}
+            # RSI calculation
+            delta = data['Close'].diff()
+            gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
+            loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+            rs = gain / loss
+            rsi = 100 - (100 / (1 + rs))
+            if pd.notna(rsi.iloc[-1]):
+                rsis.append(rsi.iloc[-1])
+        
+        if momentums:
+            sector_data[sector] = {
+                "momentum": np.mean(momentums),
+                "rsi": np.mean(rsis) if rsis else 50,
+                "volatility": np.std(momentums)
+            }
+            sector_returns[sector] = pd.concat(daily_returns, axis=1).mean(axis=1)
     
-    return sector_data
+    return sector_data, pd.DataFrame(sector_returns), fetched.errors
+
+def calculate_correlations(sector_returns):
+    """Pairwise correlation of daily sector returns, for diversification.
 
-def calculate_correlations(sector_data):
-    """Calculate sector correlations for diversification"""
+    Computed from the stored histories, so identical clicks build identical
+    prompts and share one LLM call.
+    """
     correlations = {}
-    sectors = list(sector_data.keys())
+    matrix = sector_returns.corr()
+    sectors = list(sector_returns.columns)
     
     for i, s1 in enumerate(sectors):
         for s2 in sectors[i+1:]:
-            # Simulate correlation (in real app, fetch actual stock correlations)
-            corr = np.random.uniform(0.3, 0.9)
-            correlations[f"{s1}-{s2}"] = round(corr, 2)
+            corr = matrix.at[s1, s2]
+            if pd.notna(corr):
+                correlations[f"{s1}-{s2}"] = round(float(corr), 2)
     
     return correlations
 
+class RotationReasoning(BaseModel):
+    momentum_analysis: str
+    valuation_insight: str
+    risk_consideration: str
+
+class RotationRecommendation(BaseModel):
+    """The rotation recommendation the LLM must return."""
+    primary_rotation: str
+    reasoning: RotationReasoning
+    overweight_sectors: List[str]
+    underweight_sectors: List[str]
+    recommended_stocks: Dict[str, List[str]] = {}
+    confidence_score: str = "N/A"
+    key_risks: List[str] = []
+    alternative_scenario: str = "N/A"
+
 def get_llm_rotation_recommendation(market_condition, risk_profile, sector_data, correlations):
     """Get AI-powered rotation recommendation from LLM"""
     
-    client = get_llm_client()
-    
-    # Format market data for LLM
-    sector_summary = json.dumps(sector_data, indent=2)
-    corr_summary = json.dumps(correlations, indent=2)
+    # Compact CSV-like tables instead of indented JSON; over the token budget,
+    # the weakest-momentum sectors and least-correlated pairs are summarized
+    sector_table = Table(
+        ["sector", "momentum", "rsi", "volatility"],
+        [{"sector": sector, **metrics} for sector, metrics in sector_data.items()],
+        digits=1,
+        priority=lambda row: abs(row["momentum"]),
+    )
+    corr_table = Table(
+        ["pair", "corr"],
+        [{"pair": pair, "corr": corr} for pair, corr in correlations.items()],
+        priority=lambda row: row["corr"],
+    )
     
-    prompt = f"""You are an expert portfolio strategist. Analyze this sector data and provide rotation recommendations.
+    prompt = render_prompt("sector-rotation-screener", """You are an expert portfolio strategist. Analyze this sector data and provide rotation recommendations.
 
 MARKET CONDITION: {market_condition}
 RISK PROFILE: {risk_profile}
@@ -146,25 +185,20 @@ Provide JSON response:
   "key_risks": [...],
   "alternative_scenario": "..."
 }}
-"""
+""", {"sector_summary": sector_table, "corr_summary": corr_table}, market_condition=market_condition, risk_profile=risk_profile)
     
     try:
-        response = client.chat.completions.create(
-            model="sonar",
-            messages=[
+        return structured_completion(
+            [
                 {"role": "user", "content": prompt}
             ],
+            model=AUTO_MODEL,
+            response_model=RotationRecommendation,
+            app="sector-rotation-screener",
+            api_key=get_api_key(),
             temperature=0.7,
             max_tokens=1000
         )
-        
-        # Parse response
-        response_text = response.choices[0].message.content
-        # Extract JSON from response
-        start = response_text.find('{')
-        end = response_text.rfind('}') + 1
-        if start != -1 and end > start:
-            return json.loads(response_text[start:end])
     except Exception as e:
         st.warning(f"LLM Error: {str(e)}. Showing technical analysis only.")
     
@@ -199,10 +233,17 @@ with st.sidebar:
 # Main content
 if analyze_btn:
     with st.spinner("Fetching sector data..."):
-        sector_data = fetch_sector_data()
+        sector_data, sector_returns, fetch_errors = fetch_sector_data()
+    
+    if fetch_errors:
+        missing_sectors = [sector for sector in SECTOR_STOCKS if sector not in sector_data]
+        with st.expander(f"⚠️ {len(fetch_errors)} ticker(s) could not be fetched"
+                         + (f"; no data for {', '.join(missing_sectors)}" if missing_sectors else "")):
+            for ticker, error in sorted(fetch_errors.items()):
+                st.caption(f"**{ticker}**: {error}")
     
     with st.spinner("Analyzing with AI..."):
-        correlations = calculate_correlations(sector_data)
+        correlations = calculate_correlations(sector_returns)
         ai_recommendation = get_llm_rotation_recommendation(
             market_condition, risk_profile, sector_data, correlations
         )
@@ -214,12 +255,11 @@ if analyze_btn:
         col1, col2 = st.columns([2, 1])
         with col1:
             st.markdown(
-                f"<div class='rotation-card'>{ai_recommendation.get('primary_rotation', 'N/A')}</div>",
+                f"<div class='rotation-card'>{ai_recommendation.primary_rotation}</div>",
                 unsafe_allow_html=True
             )
         with col2:
-            confidence = ai_recommendation.get('confidence_score', 'N/A')
-            st.metric("Confidence", confidence)
+            st.metric("Confidence", ai_recommendation.confidence_score)
         
         # Sector Recommendations
         st.markdown("---")
@@ -227,56 +267,48 @@ if analyze_btn:
         
         with col1:
             st.markdown("### 📈 OVERWEIGHT SECTORS")
-            for sector in ai_recommendation.get('overweight_sectors', []):
+            for sector in ai_recommendation.overweight_sectors:
                 st.markdown(f"<div class='overweight'>✅ {sector}</div>", unsafe_allow_html=True)
         
         with col2:
             st.markdown("### 📉 UNDERWEIGHT SECTORS")
-            for sector in ai_recommendation.get('underweight_sectors', []):
+            for sector in ai_recommendation.underweight_sectors:
                 st.markdown(f"<div class='underweight'>❌ {sector}</div>", unsafe_allow_html=True)
         
         # Reasoning
         st.markdown("---")
         st.markdown("### 💡 AI Reasoning")
-        reasoning = ai_recommendation.get('reasoning', {})
+        reasoning = ai_recommendation.reasoning
         
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.write(f"**Momentum Analysis:**\n{reasoning.get('momentum_analysis', 'N/A')}")
+            st.write(f"**Momentum Analysis:**\n{reasoning.momentum_analysis}")
         with col2:
-            st.write(f"**Valuation Insight:**\n{reasoning.get('valuation_insight', 'N/A')}")
+            st.write(f"**Valuation Insight:**\n{reasoning.valuation_insight}")
         with col3:
-            st.write(f"**Risk Consideration:**\n{reasoning.get('risk_consideration', 'N/A')}")
+            st.write(f"**Risk Consideration:**\n{reasoning.risk_consideration}")
         
         # Stock Picks
         st.markdown("---")
         st.markdown("### 📈 Recommended Stocks")
-        stock_picks = ai_recommendation.get('recommended_stocks', {})
-        for sector, stocks in stock_picks.items():
+        for sector, stocks in ai_recommendation.recommended_stocks.items():
             st.write(f"**{sector}:** {', '.join(stocks)}")
         
         # Risks
         st.markdown("---")
         st.markdown("### ⚠️ Key Risks")
-        for risk in ai_recommendation.get('key_risks', []):
+        for risk in ai_recommendation.key_risks:
             st.warning(risk)
         
         # Alternative Scenario
         st.markdown("---")
-feat: Add Sector Rotation Screener with AI/LLM recommendations        st.info(ai_recommendation.get('alternative_scenario', 'N/A'))
+        st.info(ai_recommendation.alternative_scenario)
     
     else:
         # Technical Analysis Fallback
         st.markdown("### 📊 Sector Momentum Analysis")
         
-        df = pd.DataFrame.from_dict(sector_data, orient='index')AI-powered dynamic sector allocation tool featuring:
-- Market condition analysis (Bull/Bear/Sideways)
-- Sector momentum and RSI calculations
-- LLM-based rotation recommendations
-- Correlation matrix for diversification
-- Stock picks with confidence scoring
-- Technical analysis fallback
-- Risk warning system
+        df = pd.DataFrame.from_dict(sector_data, orient='index')
         df = df.sort_values('momentum', ascending=False)
         
         col1, col2 = st.columns(2)
@@ -297,3 +329,5 @@ st.markdown("""
 - AI recommendations for learning purposes
 - Test with small amounts before deploying
 """)
+
+render_diagnostics("sector-rotation-screener")
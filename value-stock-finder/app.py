@@ -3,9 +3,27 @@ import yfinance as yf
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+import sys
 import warnings
+from pathlib import Path
 warnings.filterwarnings('ignore')
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from common.market_data import fetch_infos
+from common.price_store import load_histories
+from screener import fundamentals_frame, score_universe, screen
+
+# info carries the live quote, so it expires quickly; history only gains a bar a day
+INFO_TTL = 15 * 60
+HISTORY_TTL = 60 * 60
+CACHE_ENTRIES = 128
+# A universe takes minutes to fetch, so its fundamentals are kept longer
+UNIVERSE_TTL = 60 * 60
+UNIVERSE_LIST_TTL = 24 * 60 * 60
+NIFTY_500_URL = "https://archives.nseindia.com/content/indices/ind_nifty500list.csv"
+PAGE_SIZE = 25
+
 # Page configuration
 st.set_page_config(
     page_title="Value Stock Finder",
@@ -50,15 +68,21 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Helper functions
-@st.cache_data
-def get_stock_data(ticker, period="5y"):
-    """Fetch stock data from yfinance"""
-    try:
-        stock = yf.Ticker(ticker)
-        hist = stock.history(period=period)
-        return stock.info, hist
-    except:
-        return None, None
+@st.cache_data(ttl=INFO_TTL, max_entries=CACHE_ENTRIES, show_spinner=False)
+def get_stock_info(ticker):
+    """Fetch quote and fundamentals from yfinance; raises on failure, so errors are not cached"""
+    info = yf.Ticker(ticker).info
+    if not info or not (info.get('currentPrice') or info.get('regularMarketPrice')):
+        raise ValueError(f"No quote data for {ticker}")
+    return info
+
+@st.cache_data(ttl=HISTORY_TTL, max_entries=CACHE_ENTRIES, show_spinner=False)
+def get_price_history(ticker, period="5y"):
+    """Fetch daily price history, only for views that chart it"""
+    histories = load_histories([ticker], period=period)
+    if ticker not in histories.prices:
+        raise ValueError(histories.errors.get(ticker, f"No price history for {ticker}"))
+    return histories.prices[ticker]
 
 def calculate_graham_number(eps, book_value_per_share, growth_rate=15):
     """Calculate Graham Number (Intrinsic Value)"""
@@ -91,8 +115,9 @@ def calculate_valuation_metrics(info, current_price):
     # ROA
     metrics['roa'] = info.get('returnOnAssets', None)
     
-    # Debt to Equity
-    metrics['debt_to_equity'] = info.get('debtToEquity', None)
+    # Debt to Equity (yfinance reports it in percent, e.g. 36.5 for 0.365x)
+    debt_to_equity = info.get('debtToEquity', None)
+    metrics['debt_to_equity'] = debt_to_equity / 100 if debt_to_equity is not None else None
     
     return metrics
 
@@ -137,6 +162,34 @@ def get_valuation_score(metrics, current_price, graham_number=None):
     
     return min(max(score, 0), 100)
 
+@st.cache_data(ttl=INFO_TTL, max_entries=CACHE_ENTRIES, show_spinner=False)
+def get_valuation(ticker):
+    """Valuation metrics, Graham Number and score for a ticker; none of them depend on the sliders"""
+    info = get_stock_info(ticker)
+    current_price = info.get('currentPrice', info.get('regularMarketPrice', 0))
+    metrics = calculate_valuation_metrics(info, current_price)
+    eps = metrics['eps']
+    book_value = info.get('bookValue', None)
+    graham_number = calculate_graham_number(eps, book_value) if eps and book_value else None
+    return {
+        'current_price': current_price,
+        'metrics': metrics,
+        'graham_number': graham_number,
+        'valuation_score': get_valuation_score(metrics, current_price, graham_number),
+    }
+
+@st.cache_data(ttl=UNIVERSE_LIST_TTL, show_spinner=False)
+def get_nifty_500():
+    """Current Nifty 500 constituents from NSE, as yfinance tickers"""
+    constituents = pd.read_csv(NIFTY_500_URL, storage_options={"User-Agent": "Mozilla/5.0"})
+    return tuple(f"{symbol.strip()}.NS" for symbol in constituents['Symbol'].dropna())
+
+@st.cache_data(ttl=UNIVERSE_TTL, max_entries=4, show_spinner=False)
+def get_universe_valuations(tickers):
+    """Scored fundamentals for a whole universe; the sliders only filter this frame"""
+    result = fetch_infos(tickers)
+    return score_universe(fundamentals_frame(result.infos)), result.errors
+
 # Title
 st.title("📈 Value Stock Finder")
 st.markdown("### Discover Undervalued Stocks Using Financial Metrics")
@@ -151,11 +204,22 @@ st.warning("⚠️ **Disclaimer**: This is an educational demo. Always conduct t
 with st.sidebar:
     st.header("🔍 Filter Criteria")
     
-    stock_ticker = st.text_input(
-        "Stock Ticker (e.g., RELIANCE.NS, TCS.NS)",
-        value="RELIANCE.NS",
-        help="NSE stocks use .NS suffix. E.g., INFY.NS, WIPRO.NS"
-    )
+    mode = st.radio("Mode", ["Single Stock", "Universe Screener"], horizontal=True)
+    
+    if mode == "Single Stock":
+        stock_ticker = st.text_input(
+            "Stock Ticker (e.g., RELIANCE.NS, TCS.NS)",
+            value="RELIANCE.NS",
+            help="NSE stocks use .NS suffix. E.g., INFY.NS, WIPRO.NS"
+        )
+    else:
+        universe = st.selectbox("Universe", ["Nifty 500", "Custom List"])
+        if universe == "Custom List":
+            custom_tickers = st.text_area(
+                "Tickers (comma or newline separated)",
+                value="RELIANCE.NS, TCS.NS, INFY.NS, HDFCBANK.NS, ITC.NS",
+                help="NSE stocks use .NS suffix"
+            )
     
     max_pe = st.slider(
         "Maximum P/E Ratio",
@@ -183,28 +247,88 @@ with st.sidebar:
         help="Lower is safer - less financial risk"
     )
     
-    analyze_btn = st.button("🔎 Analyze Stock", use_container_width=True)
+    if mode == "Single Stock":
+        show_history = st.checkbox("📉 Show 5-Year Price History", value=False)
+        analyze_btn = st.button("🔎 Analyze Stock", use_container_width=True)
+    else:
+        screen_btn = st.button("🔎 Screen Universe", use_container_width=True)
+
+# Universe screener
+if mode == "Universe Screener":
+    if universe == "Nifty 500":
+        try:
+            tickers = get_nifty_500()
+        except Exception as e:
+            tickers = ()
+            st.error(f"❌ Could not load the Nifty 500 list from NSE: {e}. Try a custom list instead.")
+    else:
+        tickers = tuple(dict.fromkeys(
+            t.strip().upper() for t in custom_tickers.replace("\n", ",").split(",") if t.strip()
+        ))
+    
+    if tickers and (screen_btn or st.session_state.get('screened') == tickers):
+        # Remember the screened universe so slider moves re-filter without another click
+        st.session_state['screened'] = tickers
+        with st.spinner(f"Fetching fundamentals for {len(tickers)} stocks (cached for an hour)..."):
+            scored, errors = get_universe_valuations(tickers)
+        
+        # Vectorized over the cached frame, so this is all a slider move re-runs
+        results = screen(scored, max_pe, min_roe, max_debt_equity)
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Stocks Screened", len(scored))
+        with col2:
+            st.metric("Passing Filters", len(results))
+        with col3:
+            st.metric("Undervalued (70+)", int((results['valuation_score'] >= 70).sum()))
+        
+        if results.empty:
+            st.info("No stocks pass the current filters. Try relaxing them.")
+        else:
+            pages = (len(results) - 1) // PAGE_SIZE + 1
+            page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1)
+            page_rows = results.iloc[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+            table = pd.DataFrame({
+                "Name": page_rows['name'],
+                "Sector": page_rows['sector'],
+                "Price (₹)": page_rows['price'].round(2),
+                "P/E": page_rows['pe_ratio'].round(2),
+                "P/B": page_rows['pb_ratio'].round(2),
+                "P/S": page_rows['ps_ratio'].round(2),
+                "ROE (%)": (page_rows['roe'] * 100).round(2),
+                "D/E": page_rows['debt_to_equity'].round(2),
+                "Graham Number (₹)": page_rows['graham_number'].round(2),
+                "Discount (%)": page_rows['discount_pct'].round(2),
+                "Valuation Score": page_rows['valuation_score'],
+            })
+            st.dataframe(table, use_container_width=True)
+        
+        if errors:
+            with st.expander(f"⚠️ {len(errors)} tickers could not be fetched"):
+                st.dataframe(
+                    pd.DataFrame({"Ticker": list(errors), "Reason": list(errors.values())}),
+                    use_container_width=True
+                )
+    elif tickers:
+        st.info(f"Click **Screen Universe** to fetch and rank {len(tickers)} stocks.")
 
 # Main analysis
-if analyze_btn or stock_ticker:
+elif analyze_btn or stock_ticker:
     with st.spinner(f"Analyzing {stock_ticker}..."):
-        info, hist = get_stock_data(stock_ticker)
+        # Cached per ticker: slider moves only re-run the insight checks below
+        try:
+            valuation = get_valuation(stock_ticker)
+        except Exception:
+            valuation = None
         
-        if info is None:
+        if valuation is None:
             st.error(f"❌ Could not fetch data for {stock_ticker}. Please check the ticker symbol.")
         else:
-            current_price = info.get('currentPrice', info.get('regularMarketPrice', 0))
-            
-            # Calculate metrics
-            metrics = calculate_valuation_metrics(info, current_price)
-            
-            # Calculate Graham Number
-            eps = metrics['eps']
-            book_value = info.get('bookValue', None)
-            graham_number = calculate_graham_number(eps, book_value) if eps and book_value else None
-            
-            # Get valuation score
-            valuation_score = get_valuation_score(metrics, current_price, graham_number)
+            current_price = valuation['current_price']
+            metrics = valuation['metrics']
+            graham_number = valuation['graham_number']
+            valuation_score = valuation['valuation_score']
             
             # Display results
             col1, col2, col3, col4 = st.columns(4)
@@ -308,6 +432,15 @@ if analyze_btn or stock_ticker:
             
             for insight in insights:
                 st.write(insight)
+            
+            # Price history is only downloaded when this view is switched on
+            if show_history:
+                st.markdown("---")
+                st.subheader("📉 5-Year Price History")
+                try:
+                    st.line_chart(get_price_history(stock_ticker)['Close'])
+                except Exception as e:
+                    st.info(f"Price history unavailable: {e}")
 
 # Footer
 st.markdown("---")
@@ -316,7 +449,7 @@ st.markdown("""
 Always conduct thorough due diligence and consult with a financial advisor before making investment decisions.
 
 **How it works**:
-1. Enter a stock ticker (NSE tickers use .NS suffix)
+1. Enter a stock ticker (NSE tickers use .NS suffix), or switch to Universe Screener to rank the Nifty 500 or your own list
 2. Adjust filter criteria based on your investment preferences
 3. Review valuation metrics and insights
 4. Cross-reference with other research sources
@@ -0,0 +1,91 @@
+"""Universe-wide value screening as vectorized DataFrame operations.
+
+``fundamentals_frame`` turns yfinance ``info`` dicts into one row per
+ticker. ``score_universe`` then computes P/E, P/B, P/S, the Graham Number
+and the valuation score for every row at once. It follows the same rules
+as the single-stock ``calculate_valuation_metrics`` and
+``get_valuation_score`` in app.py, so a ticker scores the same in both
+views. ``screen`` applies the sidebar thresholds and ranks what is left.
+"""
+import numpy as np
+import pandas as pd
+
+# yfinance info key -> column
+FUNDAMENTAL_FIELDS = {
+    "shortName": "name",
+    "sector": "sector",
+    "currentPrice": "price",
+    "regularMarketPrice": "market_price",
+    "trailingEps": "eps",
+    "bookValue": "book_value",
+    "priceToBook": "pb_ratio",
+    "marketCap": "market_cap",
+    "totalRevenue": "revenue",
+    "returnOnEquity": "roe",
+    "returnOnAssets": "roa",
+    "debtToEquity": "debt_to_equity",
+}
+
+NUMERIC_COLUMNS = [
+    "price", "market_price", "eps", "book_value", "pb_ratio",
+    "market_cap", "revenue", "roe", "roa", "debt_to_equity",
+]
+
+
+def fundamentals_frame(infos):
+    """One row per ticker from ``{ticker: info}``; missing or non-numeric fields become NaN."""
+    rows = [{"ticker": ticker, **{col: info.get(key) for key, col in FUNDAMENTAL_FIELDS.items()}}
+            for ticker, info in infos.items()]
+    df = pd.DataFrame(rows, columns=["ticker", *FUNDAMENTAL_FIELDS.values()]).set_index("ticker")
+    df[NUMERIC_COLUMNS] = df[NUMERIC_COLUMNS].apply(pd.to_numeric, errors="coerce")
+    # info reports the quote under either key, as the single-stock view also allows
+    df["price"] = df["price"].fillna(df.pop("market_price")).fillna(0.0)
+    # yfinance reports debtToEquity in percent; the slider and scoring use a ratio
+    df["debt_to_equity"] = df["debt_to_equity"] / 100
+    return df
+
+
+def _present(series):
+    """Where the scalar code's ``if value:`` holds: not missing and not zero."""
+    return series.notna() & (series != 0)
+
+
+def score_universe(df):
+    """Add valuation metrics, Graham Number, discount and score columns to a fundamentals frame."""
+    out = df.copy()
+    price, eps, book_value = out["price"], out["eps"], out["book_value"]
+
+    out["pe_ratio"] = (price / eps).where(_present(eps))
+    out["ps_ratio"] = (out["market_cap"].fillna(0) / out["revenue"]).where(out["revenue"] > 0)
+    valid_graham = (eps > 0) & (book_value > 0)
+    out["graham_number"] = np.sqrt((22.5 * eps * book_value).where(valid_graham))
+    out["discount_pct"] = (out["graham_number"] - price) / out["graham_number"] * 100
+
+    pe, pb, roe, de = out["pe_ratio"], out["pb_ratio"], out["roe"], out["debt_to_equity"]
+    has_pe, has_pb = _present(pe), _present(pb)
+    undervalued = out["graham_number"].notna() & (price < out["graham_number"])
+    score = (
+        50
+        + np.select([has_pe & (pe < 15), has_pe & (pe < 20), has_pe & (pe > 30)], [20, 10, -15], 0)
+        + np.select([has_pb & (pb < 1), has_pb & (pb < 1.5)], [15, 8], 0)
+        + np.select([undervalued & (out["discount_pct"] > 20), undervalued & (out["discount_pct"] > 10)], [15, 8], 0)
+        + np.select([roe > 0.15, roe > 0.10], [10, 5], 0)
+        + np.where(_present(de) & (de < 1), 5, 0)
+    )
+    out["valuation_score"] = np.clip(score, 0, 100).astype(int)
+    return out
+
+
+def screen(scored, max_pe, min_roe, max_debt_equity):
+    """Rows that pass the sidebar thresholds, best valuation score first.
+
+    A ticker needs a positive P/E below ``max_pe``, ROE above ``min_roe``
+    percent and debt-to-equity below ``max_debt_equity``. Missing values
+    fail their filter.
+    """
+    keep = (
+        (scored["pe_ratio"] > 0) & (scored["pe_ratio"] < max_pe)
+        & (scored["roe"] * 100 > min_roe)
+        & (scored["debt_to_equity"] < max_debt_equity)
+    )
+    return scored[keep].sort_values(["valuation_score", "discount_pct"], ascending=[False, False])